@@ -1,20 +1,47 @@
+import time
 from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from ..core.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.database import get_async_db
 from ..core.security import verify_token
 from ..models import User
+from ..services.quote_cache import QuoteCache
+from ..services.versions import user_versions
 
 security = HTTPBearer()
 
+# Authenticated principals keyed by bearer token, so the hot path skips both the
+# JWT decode and the users query. Entries carry the user's version stamp, which
+# every committed update/delete of that user replaces; with Redis configured the
+# stamp is shared, so a user deactivated through any worker is dropped by all.
+principal_cache = QuoteCache(max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES)
 
-def get_current_user(
-    db: Session = Depends(get_db),
+
+def _detached_copy(user: User) -> User:
+    """Session-free copy of a user's column values, safe to share across requests"""
+    return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Get current authenticated user"""
-    token = credentials.credentials
+    return await authenticate_token(db, credentials.credentials)
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> User:
+    """Resolve a bearer token to an active user, using the principal cache"""
+    found, cached = principal_cache.get(token)
+    if found:
+        user, version = cached
+        if user_versions.get(user.id) == version:
+            return user
+        principal_cache.invalidate(token)
+    
     payload = verify_token(token)
     
     if payload is None:
@@ -32,7 +59,12 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.username == username).first()
+    # Read the stamp before the row: an update committed in between then leaves the
+    # entry stale instead of caching the old row under the new stamp
+    user_id = payload.get("uid")
+    version = user_versions.get(user_id) if user_id is not None else None
+    
+    user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -46,7 +78,17 @@ def get_current_user(
             detail="Inactive user"
         )
     
-    return user
+    # Never cache a principal past its token expiry
+    ttl = settings.PRINCIPAL_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    # Hits and misses both hand out the detached copy, never a session-bound user
+    principal = _detached_copy(user)
+    # Tokens issued without the user id claim are re-checked on every request until they expire
+    if user.id == user_id:
+        principal_cache.set(token, (principal, version), ttl)
+    
+    return principal
 
 
 def get_current_active_superuser(
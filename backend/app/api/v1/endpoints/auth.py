@@ -2,27 +2,45 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ....core.database import get_db
-from ....core.security import create_access_token, verify_password, get_password_hash
+from ....core.database import get_async_db
+from ....core.security import (
+    HashingOverloadedError,
+    create_access_token,
+    password_hasher,
+    password_needs_rehash,
+)
 from ....core.config import settings
-from ...deps import get_current_user
+from ...deps import get_current_user, principal_cache
 from ....models import User
 from ....schemas import Token, User as UserSchema, UserCreate
 
 router = APIRouter()
 
 
+HASHING_OVERLOADED = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many authentication requests, try again shortly",
+    headers={"Retry-After": "1"},
+)
+
+
 @router.post("/login", response_model=Token)
-def login_for_access_token(
-    db: Session = Depends(get_db),
+async def login_for_access_token(
+    db: AsyncSession = Depends(get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """OAuth2 compatible token login, get an access token for future requests"""
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalar_one_or_none()
+    
+    try:
+        password_ok = bool(user) and await password_hasher.verify(form_data.password, user.hashed_password)
+    except HashingOverloadedError:
+        raise HASHING_OVERLOADED
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -35,9 +53,17 @@ def login_for_access_token(
             detail="Inactive user"
         )
     
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if password_needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_hasher.hash(form_data.password)
+            await db.commit()
+        except HashingOverloadedError:
+            pass
+    
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     
     return {
@@ -47,16 +73,16 @@ def login_for_access_token(
 
 
 @router.post("/register", response_model=UserSchema)
-def register_user(
+async def register_user(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_in: UserCreate,
 ) -> Any:
     """Create new user"""
     # Check if user already exists
-    user = db.query(User).filter(
+    user = (await db.execute(select(User).where(
         (User.email == user_in.email) | (User.username == user_in.username)
-    ).first()
+    ))).scalars().first()
     
     if user:
         raise HTTPException(
@@ -65,7 +91,10 @@ def register_user(
         )
     
     # Create user
-    hashed_password = get_password_hash(user_in.password)
+    try:
+        hashed_password = await password_hasher.hash(user_in.password)
+    except HashingOverloadedError:
+        raise HASHING_OVERLOADED
     user = User(
         email=user_in.email,
         username=user_in.username,
@@ -75,15 +104,31 @@ def register_user(
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_profile(
+async def get_current_user_profile(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get current user profile information"""
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+@router.get("/cache/stats")
+async def get_principal_cache_stats(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get authenticated principal cache hit/miss counters"""
+    return {"principal_cache": principal_cache.stats()}
+
+
+@router.get("/hashing/stats")
+async def get_hashing_stats(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get password hashing queue depth and latency"""
+    return {"password_hashing": password_hasher.stats()}
@@ -1,5 +1,6 @@
 from typing import Any, List, Dict
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from decimal import Decimal
 
 from ....services.market_data import market_service
@@ -8,55 +9,68 @@ from ...deps import get_current_user
 
 router = APIRouter()
 
+MARKET_DATA_TIMEOUT_DETAIL = "Market data provider timed out"
+
 
 @router.get("/symbols/search")
 def search_symbols(
     market: str = Query(..., description="Market (BR or US)"),
     query: str = Query("", description="Search query"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of suggestions"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Search for symbol suggestions"""
-    suggestions = market_service.get_symbol_suggestions(market, query)
+    suggestions = market_service.get_symbol_suggestions(market, query, limit)
     return {"symbols": suggestions}
 
 
 @router.get("/symbols/validate/{symbol}")
-def validate_symbol(
+async def validate_symbol(
     symbol: str,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Validate a symbol and get current info"""
-    is_valid, company_name, current_price = market_service.validate_symbol(symbol)
+    try:
+        is_valid, company_name, current_price = await market_service.validate_symbol_async(symbol)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=MARKET_DATA_TIMEOUT_DETAIL)
     
     if not is_valid:
         raise HTTPException(status_code=400, detail=company_name)
     
-    return {
+    result = {
         "symbol": symbol,
         "company_name": company_name,
         "current_price": current_price,
         "is_valid": True
     }
+    info = market_service.get_symbol_info(symbol)
+    if info is not None:
+        result.update(market=info.market, currency=info.currency, sector=info.sector, lot_size=info.lot_size)
+    return result
 
 
 @router.post("/prices/current")
-def get_current_prices(
+async def get_current_prices(
     symbols: List[str],
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get current prices for multiple symbols"""
-    prices = market_service.get_current_prices(symbols)
+    prices = await market_service.get_current_prices_async(symbols)
     return {"prices": prices}
 
 
 @router.get("/prices/historical/{symbol}")
-def get_historical_prices(
+async def get_historical_prices(
     symbol: str,
     period: str = Query("6mo", description="Period (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get historical price data for a symbol"""
-    data = market_service.get_historical_data(symbol, period)
+    try:
+        data = await market_service.get_historical_data_async(symbol, period)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=MARKET_DATA_TIMEOUT_DETAIL)
     
     if not data:
         raise HTTPException(
@@ -68,11 +82,11 @@ def get_historical_prices(
 
 
 @router.get("/market/summary")
-def get_market_summary(
+async def get_market_summary(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get market summary for major indices"""
-    summary = market_service.get_market_summary()
+    summary = await market_service.get_market_summary_async()
     return {"market_summary": summary}
 
 
@@ -82,8 +96,18 @@ def get_popular_symbols(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get popular symbols for a market"""
-    if market not in market_service.popular_symbols:
+    symbols = market_service.get_popular_symbols(market)
+    if symbols is None:
         raise HTTPException(status_code=400, detail="Invalid market")
     
-    symbols = market_service.popular_symbols[market]
-    return {"symbols": symbols}
\ No newline at end of file
+    return {"symbols": symbols}
+
+@router.get("/cache/stats")
+def get_cache_stats(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get quote cache hit/miss/eviction counters"""
+    return {
+        "quote_cache": market_service.cache.stats(),
+        "shared_cache": market_service.shared_cache.stats(),
+    }
@@ -1,63 +1,105 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from ....core.database import get_db
+from ....core.config import settings
+from ....core.database import AsyncSessionLocal, get_async_db, get_db
 from ....models import User, Portfolio
 from ....schemas import (
     Portfolio as PortfolioSchema,
     PortfolioCreate,
     PortfolioUpdate,
-    PortfolioWithStats
+    PortfolioValuation,
+    PortfolioWithStats,
+    PositionLots,
+    PositionValuation,
+    StreamTicket
 )
+from ....services.live_valuation import live_valuation_hub, stream_tickets
 from ....services.portfolio_calculator import portfolio_calculator
-from ...deps import get_current_user
+from ....services.price_refresher import price_refresher
+from ....services.response_cache import etag_matches, portfolio_response_cache
+from ....services.versions import mark_changed
+from ...deps import authenticate_token, get_current_user
 
 router = APIRouter()
 
 
+async def _get_owned_portfolio(db: AsyncSession, portfolio_id: int, owner_id: int, *options) -> Portfolio:
+    """Load a portfolio of `owner_id` or raise 404"""
+    portfolio = (await db.execute(
+        select(Portfolio).options(*options).where(
+            Portfolio.id == portfolio_id,
+            Portfolio.owner_id == owner_id
+        )
+    )).scalar_one_or_none()
+    
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found"
+        )
+    return portfolio
+
+
+async def _unset_defaults(db: AsyncSession, owner_id: int, keep_id: Optional[int] = None):
+    """Clear is_default on the owner's other portfolios, recording them as changed"""
+    conditions = [Portfolio.owner_id == owner_id, Portfolio.is_default == True]
+    if keep_id is not None:
+        conditions.append(Portfolio.id != keep_id)
+    for previous_id in (await db.execute(select(Portfolio.id).where(*conditions))).scalars():
+        mark_changed(db.sync_session, previous_id)
+    await db.execute(
+        update(Portfolio).where(*conditions).values(is_default=False).execution_options(synchronize_session=False)
+    )
+
+
 @router.get("/", response_model=List[PortfolioWithStats])
-def get_portfolios(
-    db: Session = Depends(get_db),
+async def get_portfolios(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
     skip: int = 0,
     limit: int = 100,
 ) -> Any:
     """Retrieve portfolios for current user"""
-    portfolios = db.query(Portfolio).filter(
-        Portfolio.owner_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    
-    # Calculate stats for each portfolio
-    portfolios_with_stats = []
-    for portfolio in portfolios:
-        portfolio_stats = portfolio_calculator.calculate_portfolio_stats(portfolio)
-        portfolios_with_stats.append(portfolio_stats)
+    # Positions for every portfolio are loaded in one extra query
+    portfolios = (await db.execute(
+        select(Portfolio).options(selectinload(Portfolio.positions)).where(
+            Portfolio.owner_id == current_user.id
+        ).order_by(Portfolio.id).offset(skip).limit(limit)
+    )).scalars().all()
     
-    return portfolios_with_stats
+    # Price the union of symbols once and share it across portfolios
+    symbols = list(dict.fromkeys(
+        position.symbol for portfolio in portfolios for position in portfolio.positions
+    ))
+    prices = await price_refresher.get_prices_async(symbols) if symbols else {}
+    return portfolio_calculator.calculate_portfolios_stats(portfolios, prices)
 
 
 @router.post("/", response_model=PortfolioSchema)
-def create_portfolio(
+async def create_portfolio(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     portfolio_in: PortfolioCreate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Create new portfolio"""
     # If this is the first portfolio, make it default
-    existing_portfolios = db.query(Portfolio).filter(
-        Portfolio.owner_id == current_user.id
-    ).count()
+    existing_portfolios = (await db.execute(
+        select(func.count(Portfolio.id)).where(Portfolio.owner_id == current_user.id)
+    )).scalar_one()
     
     is_default = portfolio_in.is_default or existing_portfolios == 0
     
     # If setting as default, unset other defaults
     if is_default:
-        db.query(Portfolio).filter(
-            Portfolio.owner_id == current_user.id,
-            Portfolio.is_default == True
-        ).update({"is_default": False})
+        await _unset_defaults(db, current_user.id)
     
     portfolio = Portfolio(
         name=portfolio_in.name,
@@ -67,20 +109,108 @@ def create_portfolio(
     )
     
     db.add(portfolio)
-    db.commit()
-    db.refresh(portfolio)
+    await db.commit()
     
-    return portfolio
+    # Reload server-generated columns and positions for the response
+    return await _get_owned_portfolio(db, portfolio.id, current_user.id, selectinload(Portfolio.positions))
 
 
 @router.get("/{portfolio_id}", response_model=PortfolioWithStats)
-def get_portfolio(
+async def get_portfolio(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     portfolio_id: int,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Get portfolio by ID"""
+    # Stamp first: a write landing after this point only makes the ETag conservative
+    etag = portfolio_response_cache.etag("portfolio", portfolio_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    cache_key = ("portfolio", portfolio_id)
+    
+    owner_verified, body = portfolio_response_cache.get(cache_key, etag, current_user.id)
+    if owner_verified:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    portfolio = await _get_owned_portfolio(db, portfolio_id, current_user.id, selectinload(Portfolio.positions))
+    
+    # Ownership is known now; skip pricing when the client already has this version
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    prices = await price_refresher.get_prices_async([position.symbol for position in portfolio.positions])
+    stats = portfolio_calculator.calculate_portfolio_stats(portfolio, prices)
+    response = JSONResponse(content=jsonable_encoder(stats), headers=headers)
+    portfolio_response_cache.set(cache_key, etag, current_user.id, response.body)
+    return response
+
+
+POSITION_VALUATION_FIELDS = set(PositionValuation.model_fields)
+
+
+@router.get("/{portfolio_id}/positions/valuation", response_model=PortfolioValuation)
+async def get_positions_valuation(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    portfolio_id: int,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated position fields to return, e.g. symbol,current_value,weight"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get current price, value, P&L and weight of every position"""
+    selected = None
+    if fields:
+        selected = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = selected - POSITION_VALUATION_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+        selected.add("symbol")
+    
+    # Not comma-joined: If-None-Match lists ETags separated by commas
+    variant = "-" + "+".join(sorted(selected)) if selected else ""
+    etag = portfolio_response_cache.etag("valuation", portfolio_id, variant)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    cache_key = ("valuation", portfolio_id, variant)
+    
+    owner_verified, body = portfolio_response_cache.get(cache_key, etag, current_user.id)
+    if owner_verified:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    portfolio = await _get_owned_portfolio(db, portfolio_id, current_user.id, selectinload(Portfolio.positions))
+    
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    prices = await price_refresher.get_prices_async([position.symbol for position in portfolio.positions])
+    valuation = portfolio_calculator.calculate_positions_valuation(portfolio, prices)
+    exclude = None
+    if selected:
+        exclude = {"positions": {"__all__": POSITION_VALUATION_FIELDS - selected}}
+    response = JSONResponse(content=jsonable_encoder(valuation, exclude=exclude), headers=headers)
+    portfolio_response_cache.set(cache_key, etag, current_user.id, response.body)
+    return response
+
+
+# Sync on purpose: history backfills and the numpy pass are blocking work for the threadpool
+@router.get("/{portfolio_id}/performance")
+def get_portfolio_performance(
+    *,
+    db: Session = Depends(get_db),
+    portfolio_id: int,
+    period: str = Query("1y", description="Period (1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get daily value, cash flows and time-weighted returns for a portfolio"""
     portfolio = db.query(Portfolio).filter(
         Portfolio.id == portfolio_id,
         Portfolio.owner_id == current_user.id
@@ -92,71 +222,130 @@ def get_portfolio(
             detail="Portfolio not found"
         )
     
-    return portfolio_calculator.calculate_portfolio_stats(portfolio)
+    try:
+        return portfolio_calculator.get_portfolio_performance_history(db, portfolio_id, period)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period: {period}"
+        )
 
 
-@router.put("/{portfolio_id}", response_model=PortfolioSchema)
-def update_portfolio(
+@router.get("/{portfolio_id}/positions/{symbol}/lots", response_model=PositionLots)
+async def get_position_lots(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     portfolio_id: int,
-    portfolio_in: PortfolioUpdate,
+    symbol: str,
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    """Update portfolio"""
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
+    """Get open tax lots, realized and unrealized P&L of a position"""
+    await _get_owned_portfolio(db, portfolio_id, current_user.id)
     
-    if not portfolio:
+    current_price = (await price_refresher.get_prices_async([symbol])).get(symbol)
+    lots = await db.run_sync(portfolio_calculator.get_position_lots, portfolio_id, symbol, current_price)
+    if lots is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
+            detail="Position not found"
+        )
+    
+    return lots
+
+
+@router.post("/{portfolio_id}/stream/ticket", response_model=StreamTicket)
+async def create_stream_ticket(
+    portfolio_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Issue a single-use ticket for opening the stream from clients that cannot send headers (EventSource)"""
+    await _get_owned_portfolio(db, portfolio_id, current_user.id)
+    return {
+        "ticket": stream_tickets.issue(current_user.id, portfolio_id),
+        "expires_in": settings.LIVE_STREAM_TICKET_TTL_SECONDS,
+    }
+
+
+@router.get("/{portfolio_id}/stream")
+async def stream_portfolio_valuation(
+    portfolio_id: int,
+    ticket: Optional[str] = Query(None, description="Single-use ticket from POST /{portfolio_id}/stream/ticket"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+) -> Any:
+    """Stream live valuation as server-sent events: a snapshot, then only changed fields"""
+    if credentials is None and not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    if credentials is None:
+        # The ticket was issued for an owner of this portfolio, so no ownership query
+        if stream_tickets.redeem(ticket, portfolio_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired stream ticket",
+            )
+    else:
+        # A short-lived session, so an open stream never pins a pooled connection
+        async with AsyncSessionLocal() as db:
+            current_user = await authenticate_token(db, credentials.credentials)
+            await _get_owned_portfolio(db, portfolio_id, current_user.id)
+    
+    if live_valuation_hub.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live streams, try again later"
         )
     
+    return StreamingResponse(
+        live_valuation_hub.stream(portfolio_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.put("/{portfolio_id}", response_model=PortfolioSchema)
+async def update_portfolio(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    portfolio_id: int,
+    portfolio_in: PortfolioUpdate,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Update portfolio"""
+    portfolio = await _get_owned_portfolio(db, portfolio_id, current_user.id)
+    
     # If setting as default, unset other defaults
     if portfolio_in.is_default:
-        db.query(Portfolio).filter(
-            Portfolio.owner_id == current_user.id,
-            Portfolio.id != portfolio_id,
-            Portfolio.is_default == True
-        ).update({"is_default": False})
+        await _unset_defaults(db, current_user.id, keep_id=portfolio_id)
     
     # Update portfolio
     update_data = portfolio_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(portfolio, field, value)
     
-    db.commit()
-    db.refresh(portfolio)
+    await db.commit()
     
-    return portfolio
+    return await _get_owned_portfolio(db, portfolio_id, current_user.id, selectinload(Portfolio.positions))
 
 
 @router.delete("/{portfolio_id}")
-def delete_portfolio(
+async def delete_portfolio(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     portfolio_id: int,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Delete portfolio"""
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
+    portfolio = await _get_owned_portfolio(db, portfolio_id, current_user.id)
     
     # Don't allow deleting if it's the only portfolio
-    portfolio_count = db.query(Portfolio).filter(
-        Portfolio.owner_id == current_user.id
-    ).count()
+    portfolio_count = (await db.execute(
+        select(func.count(Portfolio.id)).where(Portfolio.owner_id == current_user.id)
+    )).scalar_one()
     
     if portfolio_count <= 1:
         raise HTTPException(
@@ -164,7 +353,7 @@ def delete_portfolio(
             detail="Cannot delete the last portfolio"
         )
     
-    db.delete(portfolio)
-    db.commit()
+    await db.delete(portfolio)
+    await db.commit()
     
     return {"message": "Portfolio deleted successfully"}
\ No newline at end of file
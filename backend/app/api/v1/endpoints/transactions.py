@@ -1,9 +1,20 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import base64
+import csv
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ....core.database import get_db
-from ....models import User, Portfolio, Transaction
+from ....core.config import settings
+from ....core.database import get_async_db, get_db
+from ....models import User, Portfolio, Transaction, TransactionType
 from ....schemas import (
     Transaction as TransactionSchema,
     TransactionCreate,
@@ -11,69 +22,159 @@ from ....schemas import (
 )
 from ....services.portfolio_calculator import portfolio_calculator
 from ....services.market_data import market_service
+from ....services.snapshots import snapshot_service
+from ....services.transaction_import import transaction_importer
 from ...deps import get_current_user
+from .market_data import MARKET_DATA_TIMEOUT_DETAIL
 
 router = APIRouter()
 
 
+async def _check_portfolio_owner(db: AsyncSession, portfolio_id: int, owner_id: int):
+    owned = (await db.execute(
+        select(Portfolio.id).where(Portfolio.id == portfolio_id, Portfolio.owner_id == owner_id)
+    )).first()
+    
+    if not owned:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found"
+        )
+
+
+async def _get_owned_transaction(db: AsyncSession, transaction_id: int, owner_id: int) -> Transaction:
+    """Load a transaction in one of `owner_id`'s portfolios or raise 404"""
+    transaction = (await db.execute(
+        select(Transaction).join(Portfolio, Portfolio.id == Transaction.portfolio_id).where(
+            Transaction.id == transaction_id,
+            Portfolio.owner_id == owner_id
+        )
+    )).scalar_one_or_none()
+    
+    if not transaction:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Transaction not found"
+        )
+    return transaction
+
+
+_CURSOR_SIGNATURE_BYTES = 16
+
+
+def _sign_cursor(raw: bytes) -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode(), raw, hashlib.sha256).digest()[:_CURSOR_SIGNATURE_BYTES]
+
+
+def _encode_cursor(transaction: Transaction) -> str:
+    """Opaque, signed keyset cursor for the (transaction_date, id) position of a row"""
+    raw = json.dumps([transaction.transaction_date.isoformat(), transaction.id]).encode()
+    return base64.urlsafe_b64encode(_sign_cursor(raw) + raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        signature, raw = data[:_CURSOR_SIGNATURE_BYTES], data[_CURSOR_SIGNATURE_BYTES:]
+        if not hmac.compare_digest(signature, _sign_cursor(raw)):
+            raise ValueError("cursor signature mismatch")
+        transaction_date, transaction_id = json.loads(raw)
+        return datetime.fromisoformat(transaction_date), int(transaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
 @router.get("/", response_model=List[TransactionSchema])
-def get_transactions(
+async def get_transactions(
     portfolio_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    symbol: Optional[str] = None,
+    transaction_type: Optional[TransactionType] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
 ) -> Any:
-    """Retrieve transactions for a portfolio"""
+    """Retrieve transactions for a portfolio, newest first
+
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
     # Verify portfolio ownership
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
+    await _check_portfolio_owner(db, portfolio_id, current_user.id)
     
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
+    # Every filter is a prefix of one of the (portfolio_id, ..., transaction_date, id) indexes
+    query = select(Transaction).where(Transaction.portfolio_id == portfolio_id)
+    if symbol:
+        query = query.where(Transaction.symbol == symbol)
+    if transaction_type:
+        query = query.where(Transaction.transaction_type == transaction_type)
+    if date_from:
+        query = query.where(Transaction.transaction_date >= date_from)
+    if date_to:
+        query = query.where(Transaction.transaction_date <= date_to)
+    
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Transaction.transaction_date < cursor_date,
+            and_(Transaction.transaction_date == cursor_date, Transaction.id < cursor_id)
+        ))
+    elif skip:
+        # Offset paging is kept for existing clients; deep pages should use the cursor
+        query = query.offset(skip)
     
-    transactions = db.query(Transaction).filter(
-        Transaction.portfolio_id == portfolio_id
-    ).order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit).all()
+    transactions = (await db.execute(query.order_by(
+        Transaction.transaction_date.desc(), Transaction.id.desc()
+    ).limit(limit + 1))).scalars().all()
+    
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(transactions[-1])
     
     return transactions
 
 
 @router.post("/", response_model=TransactionSchema)
-def create_transaction(
+async def create_transaction(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     transaction_in: TransactionCreate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Create new transaction"""
     # Verify portfolio ownership
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == transaction_in.portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
+    await _check_portfolio_owner(db, transaction_in.portfolio_id, current_user.id)
     
     # Validate symbol if company name not provided
     if not transaction_in.company_name:
-        is_valid, company_name, _ = market_service.validate_symbol(transaction_in.symbol)
-        if not is_valid:
+        try:
+            company_name = await market_service.run_in_executor(
+                market_service.get_company_name, transaction_in.symbol
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=MARKET_DATA_TIMEOUT_DETAIL
+            )
+        if company_name is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid symbol: {transaction_in.symbol}"
             )
         transaction_in.company_name = company_name
     
+    if transaction_in.transaction_type == TransactionType.SPLIT and transaction_in.quantity <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Split ratio (quantity) must be positive"
+        )
+    
     # Calculate total amount
     total_amount = transaction_in.quantity * transaction_in.price
     
@@ -83,78 +184,90 @@ def create_transaction(
     )
     
     db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
+    await db.run_sync(
+        snapshot_service.mark_restated, transaction.portfolio_id, transaction.symbol,
+        transaction.transaction_type, transaction.transaction_date.date()
+    )
+    await db.commit()
+    await db.refresh(transaction)
     
-    # Update portfolio positions
-    portfolio_calculator.update_portfolio_positions(db, transaction_in.portfolio_id)
+    # Update the affected position incrementally; position services share the sync Session API
+    await db.run_sync(portfolio_calculator.apply_new_transaction, transaction)
     
     return transaction
 
 
-@router.get("/{transaction_id}", response_model=TransactionSchema)
-def get_transaction(
+@router.post("/import")
+def import_transactions(
     *,
     db: Session = Depends(get_db),
-    transaction_id: int,
+    portfolio_id: int,
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", description="csv or ofx (defaults to the file extension)"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
-    """Get transaction by ID"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id
+    """Import a broker history file, returning a row-level error report"""
+    # Verify portfolio ownership
+    portfolio = db.query(Portfolio).filter(
+        Portfolio.id == portfolio_id,
+        Portfolio.owner_id == current_user.id
     ).first()
     
-    if not transaction:
+    if not portfolio:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
+            detail="Portfolio not found"
         )
     
-    # Verify ownership through portfolio
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == transaction.portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
+    if not file_format:
+        file_format = os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+        if file_format == "qfx":
+            file_format = "ofx"
     
-    if not portfolio:
+    if file_format not in ("csv", "ofx"):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported file format, use csv or ofx"
         )
     
-    return transaction
+    try:
+        return transaction_importer.import_file(db, portfolio_id, file.file, file_format)
+    except (csv.Error, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not parse file: {str(e)}"
+        )
+
+
+@router.get("/{transaction_id}", response_model=TransactionSchema)
+async def get_transaction(
+    *,
+    db: AsyncSession = Depends(get_async_db),
+    transaction_id: int,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """Get transaction by ID"""
+    # Ownership is checked through the portfolio in the same query
+    return await _get_owned_transaction(db, transaction_id, current_user.id)
 
 
 @router.put("/{transaction_id}", response_model=TransactionSchema)
-def update_transaction(
+async def update_transaction(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     transaction_id: int,
     transaction_in: TransactionUpdate,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Update transaction"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id
-    ).first()
-    
-    if not transaction:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
-        )
-    
-    # Verify ownership through portfolio
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == transaction.portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
+    transaction = await _get_owned_transaction(db, transaction_id, current_user.id)
     
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
-        )
+    previous_symbol = transaction.symbol
+    previous_restated_from = await db.run_sync(
+        snapshot_service.restated_from, transaction.portfolio_id, transaction.symbol,
+        transaction.transaction_type, transaction.transaction_date.date()
+    )
     
     # Update transaction
     update_data = transaction_in.dict(exclude_unset=True)
@@ -165,50 +278,51 @@ def update_transaction(
     if 'quantity' in update_data or 'price' in update_data:
         transaction.total_amount = transaction.quantity * transaction.price
     
-    db.commit()
-    db.refresh(transaction)
+    if transaction.transaction_type == TransactionType.SPLIT and transaction.quantity <= 0:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Split ratio (quantity) must be positive"
+        )
+    
+    restated_from = await db.run_sync(
+        snapshot_service.restated_from, transaction.portfolio_id, transaction.symbol,
+        transaction.transaction_type, transaction.transaction_date.date()
+    )
+    await db.run_sync(
+        snapshot_service.mark_dirty, transaction.portfolio_id, min(previous_restated_from, restated_from)
+    )
+    await db.commit()
+    await db.refresh(transaction)
     
-    # Update portfolio positions
-    portfolio_calculator.update_portfolio_positions(db, transaction.portfolio_id)
+    # Replay only the symbols touched by the edit
+    await db.run_sync(
+        portfolio_calculator.update_symbol_positions, transaction.portfolio_id, [previous_symbol, transaction.symbol]
+    )
     
     return transaction
 
 
 @router.delete("/{transaction_id}")
-def delete_transaction(
+async def delete_transaction(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     transaction_id: int,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """Delete transaction"""
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id
-    ).first()
-    
-    if not transaction:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
-        )
-    
-    # Verify ownership through portfolio
-    portfolio = db.query(Portfolio).filter(
-        Portfolio.id == transaction.portfolio_id,
-        Portfolio.owner_id == current_user.id
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transaction not found"
-        )
+    transaction = await _get_owned_transaction(db, transaction_id, current_user.id)
     
     portfolio_id = transaction.portfolio_id
-    db.delete(transaction)
-    db.commit()
+    symbol = transaction.symbol
+    await db.run_sync(
+        snapshot_service.mark_restated, portfolio_id, symbol,
+        transaction.transaction_type, transaction.transaction_date.date()
+    )
+    await db.delete(transaction)
+    await db.commit()
     
-    # Update portfolio positions
-    portfolio_calculator.update_portfolio_positions(db, portfolio_id)
+    # Replay only the deleted transaction's symbol
+    await db.run_sync(portfolio_calculator.update_symbol_positions, portfolio_id, [symbol])
     
     return {"message": "Transaction deleted successfully"}
\ No newline at end of file
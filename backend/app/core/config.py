@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -11,11 +11,36 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./portfolio.db"
+    ASYNC_DATABASE_URL: Optional[str] = None  # defaults to DATABASE_URL with its async driver
+    # Request-path pool (async engine); the sync engine only serves threadpool endpoints and jobs
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_SYNC_POOL_SIZE: int = 5
+    DB_SYNC_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # PostgreSQL statement_timeout; 0 disables
+    DB_CREATE_SCHEMA_ON_STARTUP: bool = True  # Disable when `python -m app.init_db` runs at deploy
+    
+    # SQLite connection pragmas (ignored for other databases)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Password hashing (bcrypt cost factor, process pool size and queue cap)
+    BCRYPT_ROUNDS: int = 12
+    HASHING_MAX_WORKERS: int = 2
+    HASHING_MAX_QUEUE: int = 64
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:5173", "http://localhost:5174", "http://localhost:5175", "http://localhost:5176", "http://localhost:5177", "http://localhost:5178", "http://localhost:5179"]
@@ -24,8 +49,67 @@ class Settings(BaseSettings):
     ALPHA_VANTAGE_API_KEY: Optional[str] = None
     FINNHUB_API_KEY: Optional[str] = None
     
-    # Redis (for future caching)
-    REDIS_URL: str = "redis://localhost:6379/0"
+    # Market data
+    MARKET_DATA_PROVIDER: str = "yfinance"  # yfinance or fake (offline)
+    QUOTE_BATCH_SIZE: int = 50
+    MARKET_DATA_MAX_WORKERS: int = 8
+    MARKET_DATA_TIMEOUT_SECONDS: float = 10.0
+    
+    # Quote cache (seconds per market, see market_for_symbol)
+    QUOTE_CACHE_MAX_ENTRIES: int = 5000
+    QUOTE_CACHE_TTL_SECONDS: Dict[str, int] = {"BR": 60, "US": 30}
+    QUOTE_CACHE_DEFAULT_TTL_SECONDS: int = 30
+    SYMBOL_VALIDATION_TTL_SECONDS: int = 3600
+    
+    # Background price refresh (seconds per market)
+    PRICE_REFRESH_ENABLED: bool = True
+    PRICE_REFRESH_INTERVAL_SECONDS: Dict[str, int] = {"BR": 60, "US": 30}
+    PRICE_REFRESH_DEFAULT_INTERVAL_SECONDS: int = 60
+    PRICE_REFRESH_JITTER: float = 0.1
+    PRICE_REFRESH_MAX_BACKOFF_SECONDS: int = 600
+    PRICE_SNAPSHOT_MAX_AGE_SECONDS: int = 300
+    
+    # Live valuation stream (server-sent events fed by one shared poller)
+    LIVE_STREAM_INTERVAL_SECONDS: float = 2.0
+    LIVE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    LIVE_STREAM_MAX_SUBSCRIBERS: int = 5000
+    LIVE_STREAM_TICKET_TTL_SECONDS: int = 30
+    
+    # Conditional GET / response cache for portfolio reads
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_MAX_AGE_SECONDS: int = 60
+    
+    # End-of-day portfolio snapshots
+    SNAPSHOT_JOB_ENABLED: bool = True
+    SNAPSHOT_JOB_HOUR_UTC: int = 22
+    SNAPSHOT_MAX_LAG_DAYS: int = 4
+    # Snapshot days follow the market's calendar, not the server's local date
+    MARKET_TIMEZONE: str = "America/New_York"
+    MARKET_CLOSE_HOUR: int = 16
+    
+    # Position cost basis: fifo, lifo or average (changing it rebuilds lots on the next write)
+    COST_BASIS_METHOD: str = "average"
+    
+    # Bulk transaction import
+    IMPORT_CHUNK_SIZE: int = 1000
+    IMPORT_MAX_ERRORS: int = 1000
+    
+    # Redis shared market data cache (in-process only when unset or unreachable)
+    REDIS_URL: Optional[str] = None
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 0.5
+    SHARED_CACHE_PREFIX: str = "pt:"
+    SHARED_CACHE_LOCK_SECONDS: float = 5.0
+    HISTORICAL_CACHE_TTL_SECONDS: int = 3600
+    
+    # Local daily OHLCV store
+    HISTORY_DB_PATH: str = "./price_history.db"
+    HISTORY_PROVIDER: str = "yfinance"  # yfinance or fixtures (offline CSV files)
+    HISTORY_FIXTURES_DIR: str = "./fixtures/history"
+    HISTORY_REFRESH_SECONDS: int = 3600
+    
+    # Symbol catalog (CSV or .csv.gz with symbol,name,market,currency,sector,lot_size,popular;
+    # empty uses the bundled app/data/symbols.csv)
+    SYMBOL_CATALOG_PATH: str = ""
     
     class Config:
         env_file = ".env"
@@ -1,25 +1,131 @@
-from sqlalchemy import create_engine
+from typing import Any, AsyncGenerator, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+
+def async_database_url(database_url: str) -> str:
+    """`database_url` with the async driver of its backend, e.g. sqlite+aiosqlite"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}, set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def engine_options(database_url: str, pool_size: int, max_overflow: int) -> Dict[str, Any]:
+    """create_engine keyword arguments for the pool and driver of `database_url`"""
+    url = make_url(database_url)
+    options: Dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if url.get_backend_name() == "sqlite":
+        # The driver waits on a locked database for `timeout` seconds instead of failing at once
+        options["connect_args"] = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            return options
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; NORMAL only syncs at checkpoints in WAL mode
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        # A negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    finally:
+        cursor.close()
+
+
+def _set_statement_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"SET statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+    finally:
+        cursor.close()
+    # Keep the SET out of the first transaction the pool hands out
+    dbapi_connection.commit()
+
+
+def configure_connections(engine: Engine):
+    """Apply per-connection settings as the pool opens each connection"""
+    backend = engine.url.get_backend_name()
+    if backend == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    elif backend == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        event.listen(engine, "connect", _set_statement_timeout)
+
+
 # Create SQLAlchemy engine
+# Both engines reach the same database, so their pools are sized apart rather than each at full size
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    **engine_options(settings.DATABASE_URL, settings.DB_SYNC_POOL_SIZE, settings.DB_SYNC_MAX_OVERFLOW),
 )
+configure_connections(engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for endpoints that await the database instead of holding a worker thread
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+)
+configure_connections(async_engine.sync_engine)
+
+# Objects stay loaded after commit: an AsyncSession cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class for models
 Base = declarative_base()
 
 
+def create_missing_indexes():
+    """Create indexes added to models after their tables already existed"""
+    # create_all skips existing tables entirely, including their new indexes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def init_db():
+    """Create missing tables and indexes
+
+    Run at startup when DB_CREATE_SCHEMA_ON_STARTUP is set, or once per deploy
+    with `python -m app.init_db` so workers do not race on DDL.
+    """
+    # Register every model on Base.metadata
+    from .. import models
+    Base.metadata.create_all(bind=engine)
+    create_missing_indexes()
+
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
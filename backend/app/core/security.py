@@ -1,11 +1,111 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Union
+from typing import Any, Callable, Dict, Optional, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from .config import settings
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; pinning min/max rounds makes hashes with any other cost "need update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+class HashingOverloadedError(Exception):
+    """Raised when too many hashing jobs are already queued"""
+
+
+def _process_context():
+    """forkserver where available: forking the multithreaded app could copy locks held mid-acquire"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # The server imports this module once; workers fork from it instead of re-importing
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _ready() -> bool:
+    return True
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated, size-capped process pool instead of the request threadpool"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_process_context())
+            return self._executor
+
+    def start(self):
+        """Bring up every worker process now rather than on the first login"""
+        pool = self._pool()
+        # Workers are spawned on demand, one per submission that finds none idle
+        for future in [pool.submit(_ready) for _ in range(self.max_workers)]:
+            future.result()
+
+    async def _submit(self, func: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise HashingOverloadedError()
+            self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "rounds": settings.BCRYPT_ROUNDS,
+                "queue_depth": self.pending,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_latency_ms": self.total_seconds / self.completed * 1000 if self.completed else 0.0,
+                "max_latency_ms": self.max_seconds * 1000,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -18,6 +118,11 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a hash was made with a different scheme or cost than configured"""
+    return pwd_context.needs_update(hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -37,4 +142,8 @@ def verify_token(token: str) -> Optional[dict]:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+# Global instance
+password_hasher = PasswordHasher(settings.HASHING_MAX_WORKERS, settings.HASHING_MAX_QUEUE)
@@ -0,0 +1,5 @@
+"""Create missing tables and indexes: python -m app.init_db"""
+from .core.database import init_db
+
+if __name__ == "__main__":
+    init_db()
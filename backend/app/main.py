@@ -1,19 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
 
 from .core.config import settings
-from .core.database import Base, engine
+from .core.database import init_db
+from .core.security import password_hasher
 from .api.v1.api import api_router
+from .services.live_valuation import live_valuation_hub
+from .services.market_data import market_service
+from .services.price_refresher import price_refresher
+from .services.snapshots import snapshot_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the schema, then start and stop background services"""
+    if settings.DB_CREATE_SCHEMA_ON_STARTUP:
+        init_db()
+    # Spawning the hashing workers blocks, so keep it off the event loop
+    await asyncio.to_thread(password_hasher.start)
+    if settings.PRICE_REFRESH_ENABLED:
+        price_refresher.start()
+    if settings.SNAPSHOT_JOB_ENABLED:
+        snapshot_service.start()
+    yield
+    await snapshot_service.stop()
+    await live_valuation_hub.stop()
+    await price_refresher.stop()
+    market_service.shutdown()
+    password_hasher.shutdown()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description=settings.DESCRIPTION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set up CORS middleware
@@ -1,5 +1,7 @@
 from .user import User
 from .portfolio import Portfolio, Position
 from .transaction import Transaction, TransactionType
+from .snapshot import PortfolioDailySnapshot, SnapshotJobRun
+from .lot import PositionLotState
 
-__all__ = ["User", "Portfolio", "Position", "Transaction", "TransactionType"]
\ No newline at end of file
+__all__ = ["User", "Portfolio", "Position", "Transaction", "TransactionType", "PortfolioDailySnapshot", "SnapshotJobRun", "PositionLotState"]
\ No newline at end of file
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class PositionLotState(Base):
+    __tablename__ = "position_lot_states"
+    __table_args__ = (
+        UniqueConstraint("portfolio_id", "symbol", name="uq_position_lot_state_symbol"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    cost_basis_method = Column(String, nullable=False)  # fifo, lifo or average
+    book = Column(Text, nullable=False)  # Base64 little-endian int64 array: realized P&L, dividends, open lots; see services/lots.py
+    # Last transaction applied, in (transaction_date, id) replay order
+    last_transaction_date = Column(DateTime(timezone=True), nullable=False)
+    last_transaction_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships
+    portfolio = relationship("Portfolio", back_populates="lot_states")
@@ -19,6 +19,8 @@ class Portfolio(Base):
     owner = relationship("User", back_populates="portfolios")
     transactions = relationship("Transaction", back_populates="portfolio", cascade="all, delete-orphan")
     positions = relationship("Position", back_populates="portfolio", cascade="all, delete-orphan")
+    snapshots = relationship("PortfolioDailySnapshot", back_populates="portfolio", cascade="all, delete-orphan")
+    lot_states = relationship("PositionLotState", back_populates="portfolio", cascade="all, delete-orphan")
 
 
 class Position(Base):
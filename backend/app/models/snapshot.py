@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, Date, DateTime, Boolean, ForeignKey, Numeric, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..core.database import Base
+
+
+class PortfolioDailySnapshot(Base):
+    __tablename__ = "portfolio_daily_snapshots"
+    __table_args__ = (
+        # Serves the (portfolio_id, snapshot_date) range scans of the history endpoints
+        UniqueConstraint("portfolio_id", "snapshot_date", name="uq_portfolio_snapshot_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    value = Column(Numeric(precision=15, scale=2), nullable=False, default=0)
+    invested = Column(Numeric(precision=15, scale=2), nullable=False, default=0)
+    pnl = Column(Numeric(precision=15, scale=2), nullable=False, default=0)
+    cash_flow = Column(Numeric(precision=15, scale=2), nullable=False, default=0)
+    is_dirty = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    portfolio = relationship("Portfolio", back_populates="snapshots")
+
+
+class SnapshotJobRun(Base):
+    """One row per end-of-day run; the primary key lets a single worker claim each day"""
+
+    __tablename__ = "snapshot_job_runs"
+
+    run_date = Column(Date, primary_key=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Numeric, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -14,6 +14,12 @@ class TransactionType(str, Enum):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Keyset pagination and position replays walk (transaction_date, id) within a portfolio
+        Index("ix_transactions_portfolio_date_id", "portfolio_id", "transaction_date", "id"),
+        Index("ix_transactions_portfolio_symbol_date_id", "portfolio_id", "symbol", "transaction_date", "id"),
+        Index("ix_transactions_portfolio_type_date_id", "portfolio_id", "transaction_type", "transaction_date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, nullable=False, index=True)
@@ -1,9 +1,13 @@
 from .user import User, UserCreate, UserUpdate, Token, TokenData
-from .portfolio import Portfolio, PortfolioCreate, PortfolioUpdate, Position, PortfolioWithStats
+from .portfolio import (
+    Portfolio, PortfolioCreate, PortfolioUpdate, Position, PortfolioWithStats,
+    PositionValuation, PortfolioValuation, TaxLot, PositionLots, StreamTicket
+)
 from .transaction import Transaction, TransactionCreate, TransactionUpdate
 
 __all__ = [
     "User", "UserCreate", "UserUpdate", "Token", "TokenData",
     "Portfolio", "PortfolioCreate", "PortfolioUpdate", "Position", "PortfolioWithStats",
+    "PositionValuation", "PortfolioValuation", "TaxLot", "PositionLots", "StreamTicket",
     "Transaction", "TransactionCreate", "TransactionUpdate"
 ]
\ No newline at end of file
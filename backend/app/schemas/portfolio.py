@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 
 
@@ -58,4 +58,54 @@ class PortfolioWithStats(Portfolio):
     total_invested: Decimal
     total_pnl: Decimal
     total_pnl_percentage: Decimal
-    positions_count: int
\ No newline at end of file
+    positions_count: int
+
+
+class PositionValuation(BaseModel):
+    symbol: str
+    company_name: Optional[str] = None
+    market: Optional[str] = None
+    quantity: Optional[Decimal] = None
+    average_price: Optional[Decimal] = None
+    total_invested: Optional[Decimal] = None
+    current_price: Optional[Decimal] = None
+    current_value: Optional[Decimal] = None
+    pnl: Optional[Decimal] = None
+    pnl_percentage: Optional[Decimal] = None
+    weight: Optional[Decimal] = None
+
+
+class PortfolioValuation(BaseModel):
+    portfolio_id: int
+    total_value: Decimal
+    total_invested: Decimal
+    total_pnl: Decimal
+    total_pnl_percentage: Decimal
+    positions: List[PositionValuation] = []
+
+
+class TaxLot(BaseModel):
+    quantity: Decimal
+    cost: Decimal
+    unit_cost: Decimal
+    acquired_date: date
+    transaction_id: Optional[int] = None
+    unrealized_pnl: Optional[Decimal] = None
+
+
+class PositionLots(BaseModel):
+    symbol: str
+    cost_basis_method: str
+    quantity: Decimal
+    average_price: Decimal
+    total_invested: Decimal
+    realized_pnl: Decimal
+    dividends: Decimal
+    current_price: Optional[Decimal] = None
+    unrealized_pnl: Optional[Decimal] = None
+    lots: List[TaxLot] = []
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
@@ -0,0 +1,186 @@
+import threading
+import uuid
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from fractions import Fraction
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..models import Transaction, TransactionType
+from .market_data import market_service
+from .quote_cache import QuoteCache
+from .shared_cache import SharedCache
+
+CORPORATE_ACTIONS_MAX_ENTRIES = 20000
+# Entries stay until an action for their symbol changes; the TTL only bounds stale memory
+FACTORS_TTL_SECONDS = 24 * 3600
+
+
+class SplitFactors:
+    """Cumulative split adjustment of one symbol
+
+    For a trade day d, factor(d) is the product of the ratios of every split after
+    d: how many of today's shares one share held on d has become. Quantities and
+    prices recorded before a split are brought to today's basis with one multiply
+    (or divide) instead of a replay of the splits in between.
+    """
+
+    __slots__ = ("days", "ratios", "_cumulative", "_days_axis", "_cumulative_floats")
+
+    def __init__(self, splits: Sequence[Tuple[date, Decimal]] = ()):
+        splits = sorted(splits, key=lambda split: split[0])
+        self.days: List[int] = [day.toordinal() for day, _ in splits]
+        self.ratios: List[Fraction] = [Fraction(ratio) for _, ratio in splits]
+
+        # _cumulative[i] = product of ratios[i:], so a bisect gives the factor directly
+        cumulative = [Fraction(1)]
+        for ratio in reversed(self.ratios):
+            cumulative.append(cumulative[-1] * ratio)
+        self._cumulative = cumulative[::-1]
+        self._days_axis = np.array([day for day, _ in splits], dtype="datetime64[D]")
+        self._cumulative_floats = np.array([float(factor) for factor in self._cumulative])
+
+    def __bool__(self) -> bool:
+        return bool(self.days)
+
+    def factor(self, day: date) -> Fraction:
+        """Exact factor for holdings on `day`; a split on `day` itself is already in effect"""
+        return self._cumulative[bisect_right(self.days, day.toordinal())]
+
+    def factors(self, days: np.ndarray) -> np.ndarray:
+        """Float factors for a datetime64[D] array of days"""
+        return self._cumulative_floats[np.searchsorted(self._days_axis, days, side="right")]
+
+    def adjust_quantity(self, quantity: Decimal, day: date) -> Decimal:
+        factor = self.factor(day)
+        return quantity * factor.numerator / factor.denominator
+
+    def adjust_price(self, price: Decimal, day: date) -> Decimal:
+        factor = self.factor(day)
+        return price * factor.denominator / factor.numerator
+
+
+NO_SPLITS = SplitFactors()
+
+
+class CorporateActionService:
+    """Per-portfolio, per-symbol split factor tables, built once and cached
+
+    SPLIT transactions record the ratio in `quantity` (new shares per old share,
+    2 for a 2-for-1, 0.1 for a 1-for-10 reverse split). A table is rebuilt only
+    after a committed write touches a SPLIT of its symbol; with Redis configured
+    the invalidation reaches every worker through a shared stamp.
+    """
+
+    def __init__(self, shared_cache: SharedCache, max_entries: int = CORPORATE_ACTIONS_MAX_ENTRIES):
+        self.shared_cache = shared_cache
+        self.cache = QuoteCache(max_entries=max_entries)
+        self._generations: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+
+    def _stamp_key(self, portfolio_id: int, symbol: str) -> str:
+        return f"version:actions:{portfolio_id}:{symbol}"
+
+    def _load(self, db: Session, portfolio_id: int, symbols: List[str]) -> Dict[str, SplitFactors]:
+        rows = db.query(Transaction.symbol, Transaction.transaction_date, Transaction.quantity).filter(
+            Transaction.portfolio_id == portfolio_id,
+            Transaction.transaction_type == TransactionType.SPLIT,
+            Transaction.symbol.in_(symbols)
+        ).all()
+        splits: Dict[str, List[Tuple[date, Decimal]]] = {}
+        for symbol, transaction_date, ratio in rows:
+            if ratio and ratio > 0:
+                splits.setdefault(symbol, []).append((transaction_date.date(), ratio))
+        return {symbol: SplitFactors(splits[symbol]) if symbol in splits else NO_SPLITS for symbol in symbols}
+
+    def split_factors(self, db: Session, portfolio_id: int, symbols: Iterable[str]) -> Dict[str, SplitFactors]:
+        """Split factors of a portfolio's symbols, one query for all that are not cached"""
+        symbols = list(dict.fromkeys(symbols))
+        stamps: Dict[str, str] = {}
+        if self.shared_cache.enabled and symbols:
+            stamps = self.shared_cache.get_many([self._stamp_key(portfolio_id, symbol) for symbol in symbols])
+
+        result: Dict[str, SplitFactors] = {}
+        missing: List[str] = []
+        for symbol in symbols:
+            found, entry = self.cache.get((portfolio_id, symbol))
+            if found and entry[0] == stamps.get(self._stamp_key(portfolio_id, symbol)):
+                result[symbol] = entry[1]
+            else:
+                missing.append(symbol)
+        if not missing:
+            return result
+
+        with self._lock:
+            generations = {symbol: self._generations.get((portfolio_id, symbol), 0) for symbol in missing}
+        loaded = self._load(db, portfolio_id, missing)
+        with self._lock:
+            for symbol, factors in loaded.items():
+                # Skip storing a table invalidated while it was being read
+                if self._generations.get((portfolio_id, symbol), 0) == generations[symbol]:
+                    stamp = stamps.get(self._stamp_key(portfolio_id, symbol))
+                    self.cache.set((portfolio_id, symbol), (stamp, factors), FACTORS_TTL_SECONDS)
+        result.update(loaded)
+        return result
+
+    def invalidate(self, keys: Iterable[Tuple[int, str]]):
+        """Drop the tables of (portfolio_id, symbol) pairs here and, through Redis, in other workers"""
+        keys = set(keys)
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self.cache.invalidate(key)
+        if self.shared_cache.enabled and keys:
+            self.shared_cache.set_many({
+                self._stamp_key(portfolio_id, symbol): (uuid.uuid4().hex, FACTORS_TTL_SECONDS)
+                for portfolio_id, symbol in keys
+            })
+
+
+def _split_keys(instance: Transaction) -> Set[Tuple[int, str]]:
+    """(portfolio_id, symbol) pairs whose splits change with this row, before and after an edit"""
+    state = inspect(instance)
+    types = {instance.transaction_type, *state.attrs.transaction_type.history.deleted}
+    if TransactionType.SPLIT not in types:
+        return set()
+    portfolio_ids = {instance.portfolio_id, *state.attrs.portfolio_id.history.deleted}
+    symbols = {instance.symbol, *state.attrs.symbol.history.deleted}
+    return {(portfolio_id, symbol) for portfolio_id in portfolio_ids for symbol in symbols}
+
+
+def _collect_actions(session: Session, flush_context):
+    changed = session.info.setdefault("changed_splits", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Transaction):
+            changed.update(_split_keys(instance))
+
+
+def _publish_actions(session: Session):
+    changed = session.info.pop("changed_splits", None)
+    if changed:
+        corporate_actions.invalidate(changed)
+        # Closes are split-adjusted: have the next read re-check the stored series for a new basis
+        market_service.history_store.expire({symbol for _, symbol in changed})
+
+
+def _discard_actions(session: Session):
+    session.info.pop("changed_splits", None)
+
+
+# Same unit-of-work hooks as versions.py; bulk inserts call mark_splits_changed
+event.listen(Session, "after_flush", _collect_actions)
+event.listen(Session, "after_commit", _publish_actions)
+event.listen(Session, "after_rollback", _discard_actions)
+
+
+def mark_splits_changed(db: Session, portfolio_id: int, symbols: Iterable[str]):
+    """Record splits written with a bulk statement, invalidated when `db` commits"""
+    db.info.setdefault("changed_splits", set()).update((portfolio_id, symbol) for symbol in symbols)
+
+
+# Global instance
+corporate_actions = CorporateActionService(market_service.shared_cache)
@@ -0,0 +1,347 @@
+import csv
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Bar(NamedTuple):
+    day: str  # ISO date, YYYY-MM-DD
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
+
+def _months_ago(today: date, months: int) -> date:
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    month += 1
+    # Clamp the day for shorter months
+    for day in (today.day, 30, 29, 28):
+        try:
+            return date(year, month, day)
+        except ValueError:
+            continue
+    return date(year, month, 28)
+
+
+def period_start(period: str, today: Optional[date] = None) -> Optional[date]:
+    """Translate a yfinance-style period into a start date; None means full history"""
+    today = today or date.today()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return date(today.year, 1, 1)
+    if period.endswith("mo"):
+        return _months_ago(today, int(period[:-2]))
+    if period.endswith("d"):
+        return today - timedelta(days=int(period[:-1]))
+    if period.endswith("y"):
+        return _months_ago(today, 12 * int(period[:-1]))
+    raise ValueError(f"Invalid period: {period}")
+
+
+class HistoryProvider:
+    """Base class for daily OHLCV history sources"""
+
+    name = "base"
+
+    def fetch_bars(self, symbol: str, start: Optional[date], end: date) -> List[Bar]:
+        """Fetch daily bars in [start, end]; start None means from the first available day"""
+        raise NotImplementedError
+
+
+class YFinanceHistoryProvider(HistoryProvider):
+    """History provider backed by yfinance"""
+
+    name = "yfinance"
+
+    def fetch_bars(self, symbol: str, start: Optional[date], end: date) -> List[Bar]:
+        # Deferred: yfinance pulls in pandas, the bulk of the API's cold start
+        import yfinance as yf
+        ticker = yf.Ticker(symbol)
+        # yfinance treats `end` as exclusive
+        if start is None:
+            hist = ticker.history(period="max")
+        else:
+            hist = ticker.history(start=start.isoformat(), end=(end + timedelta(days=1)).isoformat())
+        if hist.empty:
+            return []
+
+        days = hist.index.strftime('%Y-%m-%d').tolist()
+        return [
+            Bar(day, float(o), float(h), float(l), float(c), int(v))
+            for day, o, h, l, c, v in zip(
+                days,
+                hist['Open'].tolist(),
+                hist['High'].tolist(),
+                hist['Low'].tolist(),
+                hist['Close'].tolist(),
+                hist['Volume'].tolist(),
+            )
+        ]
+
+
+class FixtureHistoryProvider(HistoryProvider):
+    """Offline provider reading <SYMBOL>.csv files (Date,Open,High,Low,Close,Volume)"""
+
+    name = "fixtures"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch_bars(self, symbol: str, start: Optional[date], end: date) -> List[Bar]:
+        path = os.path.join(self.directory, f"{symbol}.csv")
+        if not os.path.exists(path):
+            return []
+
+        start_day = start.isoformat() if start else ""
+        end_day = end.isoformat()
+        bars = []
+        with open(path, newline="") as fixture:
+            for row in csv.DictReader(fixture):
+                day = row["Date"][:10]
+                if start_day <= day <= end_day:
+                    bars.append(Bar(
+                        day,
+                        float(row["Open"]),
+                        float(row["High"]),
+                        float(row["Low"]),
+                        float(row["Close"]),
+                        int(float(row["Volume"] or 0)),
+                    ))
+        bars.sort()
+        return bars
+
+
+def get_history_provider(name: str, fixtures_dir: str = "") -> HistoryProvider:
+    """Build the history provider configured by name"""
+    if name == FixtureHistoryProvider.name:
+        return FixtureHistoryProvider(fixtures_dir)
+    if name == YFinanceHistoryProvider.name:
+        return YFinanceHistoryProvider()
+    raise ValueError(f"Unknown history provider: {name}")
+
+
+def _matches(bars: List[Bar], stored: Tuple[str, float]) -> bool:
+    """Whether a fetch still has the stored (day, close) bar, i.e. closes are on the same basis"""
+    day, close = stored
+    for bar in bars:
+        if bar.day == day:
+            return math.isclose(bar.close, close, rel_tol=1e-6)
+    return False
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_bars (
+    symbol TEXT NOT NULL,
+    day TEXT NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume INTEGER NOT NULL,
+    PRIMARY KEY (symbol, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_coverage (
+    symbol TEXT PRIMARY KEY,
+    first_day TEXT NOT NULL,
+    last_day TEXT NOT NULL,
+    full_history INTEGER NOT NULL DEFAULT 0,
+    checked_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """Persistent daily OHLCV store that only fetches days it does not hold yet
+
+    Bars live in a WITHOUT ROWID table clustered on (symbol, day), so a range query
+    is a contiguous index slice and never loads the rest of a symbol's series.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        provider: HistoryProvider,
+        refresh_seconds: int = 3600,
+        mmap_size: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.provider = provider
+        self.refresh_seconds = refresh_seconds
+        self.mmap_size = mmap_size
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._rebase_listeners: List[Callable[[str], None]] = []
+
+    def add_rebase_listener(self, listener: Callable[[str], None]):
+        """Call `listener` with a symbol whose stored closes were replaced on a new basis"""
+        self._rebase_listeners.append(listener)
+
+    def expire(self, symbols: Iterable[str]):
+        """Re-check these symbols on their next read, e.g. after a split was recorded for them"""
+        symbols = list(symbols)
+        if not symbols:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "UPDATE price_coverage SET checked_at = 0 WHERE symbol = ?", [(symbol,) for symbol in symbols]
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller must hold self._lock; the file is only opened on first use
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _coverage(self, symbol: str) -> Optional[tuple]:
+        """Coverage row plus the first stored bar and the last final one, or None when no bars are stored"""
+        with self._lock:
+            conn = self._connection()
+            coverage = conn.execute(
+                "SELECT first_day, last_day, full_history, checked_at FROM price_coverage WHERE symbol = ?",
+                (symbol,),
+            ).fetchone()
+            if coverage is None:
+                return None
+            first_bar = conn.execute(
+                "SELECT day, close FROM price_bars WHERE symbol = ? ORDER BY day LIMIT 1", (symbol,)
+            ).fetchone()
+            # The last bar may have been stored intraday; the one before it is final
+            last_bars = conn.execute(
+                "SELECT day, close FROM price_bars WHERE symbol = ? ORDER BY day DESC LIMIT 2", (symbol,)
+            ).fetchall()
+        if first_bar is None:
+            return None
+        return (*coverage, first_bar, last_bars[-1])
+
+    def _save(
+        self,
+        symbol: str,
+        bars: List[Bar],
+        first_day: str,
+        last_day: str,
+        full_history: bool,
+        replace: bool = False,
+    ):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM price_bars WHERE symbol = ?", (symbol,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO price_bars (symbol, day, open, high, low, close, volume) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(symbol, *bar) for bar in bars],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO price_coverage (symbol, first_day, last_day, full_history, checked_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (symbol, first_day, last_day, int(full_history), time.time()),
+                )
+
+    def _rebuild(self, symbol: str, start: Optional[date], end: date, rebased: bool = False):
+        """Replace everything stored for a symbol with a single fetch of [start, end]
+
+        `rebased` means the stored closes were on a stale basis; listeners are told
+        once the new series is saved, so values computed from the old one can be redone.
+        """
+        bars = self.provider.fetch_bars(symbol, start, end)
+        if not bars:
+            # Nothing learned (yfinance answers errors with no bars): keep what is stored, retry next call
+            return
+        first_day = start.isoformat() if start is not None else bars[0].day
+        self._save(symbol, bars, first_day, end.isoformat(), start is None, replace=True)
+        if rebased:
+            for listener in self._rebase_listeners:
+                listener(symbol)
+
+    def ensure_range(self, symbol: str, start: Optional[date], end: Optional[date] = None):
+        """Fetch only the leading and trailing days missing for [start, end]
+
+        Each gap fetch overlaps a stored bar, so a provider that answers at all
+        returns at least that bar: an empty answer is a failure and leaves coverage
+        unchanged for the next call to retry. Providers adjust past closes for later
+        splits and dividends; when the overlapping bar no longer matches what is
+        stored, the stored series is on a stale basis and is fetched again whole.
+        """
+        end = end or date.today()
+        coverage = self._coverage(symbol)
+
+        if coverage is None:
+            self._rebuild(symbol, start, end)
+            return
+
+        first_day, last_day, full_history, checked_at, first_bar, last_bar = coverage
+        full_history = bool(full_history)
+        # Range to fetch again if the basis changed: what is stored plus what was asked for
+        rebuild_start = None if full_history or start is None else min(start, date.fromisoformat(first_day))
+        bars: List[Bar] = []
+
+        # Leading gap: the request reaches further back than what is stored
+        if not full_history and (start is None or start.isoformat() < first_day):
+            leading = self.provider.fetch_bars(symbol, start, date.fromisoformat(first_bar[0]))
+            if leading:
+                if not _matches(leading, first_bar):
+                    self._rebuild(symbol, rebuild_start, end, rebased=True)
+                    return
+                bars.extend(leading)
+                if start is None:
+                    full_history = True
+                    first_day = leading[0].day
+                else:
+                    first_day = start.isoformat()
+
+        # Trailing gap: re-read from the last final bar, since the newest may have been intraday
+        stale = time.time() - checked_at >= self.refresh_seconds
+        if last_day < end.isoformat() or stale:
+            trailing = self.provider.fetch_bars(symbol, date.fromisoformat(last_bar[0]), end)
+            if trailing:
+                if not _matches(trailing, last_bar):
+                    self._rebuild(symbol, rebuild_start, end, rebased=True)
+                    return
+                bars.extend(trailing)
+                last_day = max(last_day, end.isoformat())
+
+        if bars:
+            self._save(symbol, bars, first_day, last_day, full_history)
+
+    def get_bars(self, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Bar]:
+        """Read stored bars in [start, end] without contacting the provider"""
+        query = "SELECT day, open, high, low, close, volume FROM price_bars WHERE symbol = ?"
+        params: list = [symbol]
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND day <= ?"
+            params.append(end.isoformat())
+        query += " ORDER BY day"
+        with self._lock:
+            return [Bar(*row) for row in self._connection().execute(query, params)]
+
+    def get_series(self, symbol: str, period: str = "6mo") -> Optional[Dict]:
+        """Serve a period of history from disk, gap-filling from the provider first"""
+        start = period_start(period)
+        self.ensure_range(symbol, start)
+        bars = self.get_bars(symbol, start)
+        if not bars:
+            return None
+
+        return {
+            "dates": [bar.day for bar in bars],
+            "prices": [bar.close for bar in bars],
+            "volumes": [bar.volume for bar in bars]
+        }
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import logging
+import secrets
+import threading
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import Position
+from .market_data import MarketDataService, market_service
+from .price_refresher import PriceRefreshScheduler, price_refresher
+from .quote_cache import QuoteCache
+from .shared_cache import SharedCache
+from .valuation import from_cents, from_percentage, value_holdings
+from .versions import PortfolioVersions, portfolio_versions
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSubscription:
+    """One open dashboard: its positions, the last state sent and a wake-up flag"""
+
+    __slots__ = ("portfolio_id", "positions", "sent", "changed")
+
+    def __init__(self, portfolio_id: int, positions: Dict[str, Tuple[Decimal, Decimal]]):
+        self.portfolio_id = portfolio_id
+        self.positions = positions  # symbol -> (quantity, total_invested)
+        self.sent: Dict[str, Any] = {}
+        # An Event rather than a queue: a slow consumer wakes once and gets one merged delta
+        self.changed = asyncio.Event()
+
+
+def _format(value: Optional[Decimal]) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class LiveValuationHub:
+    """Streams portfolio valuations from one shared price poll per tick
+
+    Every tick prices the union of subscribed symbols once (snapshot first, then
+    the batched, cached quote path) and wakes only subscribers holding a symbol
+    whose price moved, or whose positions were changed by a committed write.
+    Writes in this process arrive through the version listener; writes in other
+    workers are seen by comparing the subscribed portfolios' shared stamps.
+    """
+
+    def __init__(
+        self,
+        service: MarketDataService,
+        refresher: PriceRefreshScheduler,
+        versions: PortfolioVersions,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.service = service
+        self.refresher = refresher
+        self.session_factory = session_factory
+        self.versions = versions
+        # Portfolios changed by committed writes, drained by the poller
+        self._changed: Set[int] = set()
+        self._changed_lock = threading.Lock()
+        versions.add_listener(self._mark_changed)
+        # Last version stamp seen per subscribed portfolio
+        self._stamps: Dict[int, str] = {}
+        self._by_portfolio: Dict[int, Set[LiveSubscription]] = {}
+        self._by_symbol: Dict[str, Set[LiveSubscription]] = {}
+        self._prices: Dict[str, Optional[Decimal]] = {}
+        self._subscribers = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _load_positions(self, portfolio_ids: Iterable[int]) -> Dict[int, Dict[str, Tuple[Decimal, Decimal]]]:
+        db = self.session_factory()
+        try:
+            rows = db.query(
+                Position.portfolio_id, Position.symbol, Position.quantity, Position.total_invested
+            ).filter(Position.portfolio_id.in_(list(portfolio_ids))).all()
+        finally:
+            db.close()
+
+        positions: Dict[int, Dict[str, Tuple[Decimal, Decimal]]] = {}
+        for portfolio_id, symbol, quantity, total_invested in rows:
+            positions.setdefault(portfolio_id, {})[symbol] = (quantity, total_invested)
+        return positions
+
+    def _mark_changed(self, portfolio_ids: Set[int]):
+        # Called from whichever thread committed the write
+        with self._changed_lock:
+            self._changed.update(portfolio_ids)
+
+    def _watch(self, subscription: LiveSubscription):
+        for symbol in subscription.positions:
+            self._by_symbol.setdefault(symbol, set()).add(subscription)
+
+    def _unwatch(self, subscription: LiveSubscription):
+        for symbol in subscription.positions:
+            watchers = self._by_symbol.get(symbol)
+            if watchers is not None:
+                watchers.discard(subscription)
+                if not watchers:
+                    del self._by_symbol[symbol]
+                    self._prices.pop(symbol, None)
+
+    async def _price_missing(self, symbols: Iterable[str]):
+        missing = [symbol for symbol in symbols if symbol not in self._prices]
+        if missing:
+            self._prices.update(await self.service.run_in_executor(self.refresher.get_prices, missing))
+
+    def is_full(self) -> bool:
+        return self._subscribers >= settings.LIVE_STREAM_MAX_SUBSCRIBERS
+
+    async def subscribe(self, portfolio_id: int) -> LiveSubscription:
+        """Register a dashboard; its first wake-up sends the full valuation"""
+        # Read the stamp before the positions, so a write in between shows up as a change
+        stamp = await self.service.run_in_executor(self.versions.get, portfolio_id)
+        positions = await self.service.run_in_executor(self._load_positions, [portfolio_id])
+        subscription = LiveSubscription(portfolio_id, positions.get(portfolio_id, {}))
+
+        self._subscribers += 1
+        self._stamps.setdefault(portfolio_id, stamp)
+        self._by_portfolio.setdefault(portfolio_id, set()).add(subscription)
+        self._watch(subscription)
+        try:
+            await self._price_missing(subscription.positions)
+        except Exception:
+            # The poller fills these in on its next tick
+            logger.exception("Initial pricing failed for portfolio %s", portfolio_id)
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        subscription.changed.set()
+        return subscription
+
+    def unsubscribe(self, subscription: LiveSubscription):
+        subscribers = self._by_portfolio.get(subscription.portfolio_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._by_portfolio[subscription.portfolio_id]
+            self._stamps.pop(subscription.portfolio_id, None)
+        self._unwatch(subscription)
+        self._subscribers -= 1
+
+    async def _reload_changed(self):
+        with self._changed_lock:
+            changed = self._changed & self._by_portfolio.keys()
+            self._changed.clear()
+        if self._by_portfolio and self.versions.shared_cache.enabled:
+            stamps = await self.service.run_in_executor(self.versions.get_many, list(self._by_portfolio))
+            for portfolio_id, stamp in stamps.items():
+                if portfolio_id in self._by_portfolio:
+                    if self._stamps.get(portfolio_id, stamp) != stamp:
+                        changed.add(portfolio_id)
+                    self._stamps[portfolio_id] = stamp
+        if not changed:
+            return
+
+        positions = await self.service.run_in_executor(self._load_positions, changed)
+        for portfolio_id in changed:
+            for subscription in self._by_portfolio.get(portfolio_id, ()):
+                self._unwatch(subscription)
+                subscription.positions = positions.get(portfolio_id, {})
+                self._watch(subscription)
+                subscription.changed.set()
+        await self._price_missing(self._by_symbol)
+
+    async def tick(self):
+        """Reload changed portfolios, price every watched symbol once and wake affected subscribers"""
+        await self._reload_changed()
+        symbols = list(self._by_symbol)
+        if not symbols:
+            return
+
+        prices = await self.service.run_in_executor(self.refresher.get_prices, symbols)
+        for symbol, price in prices.items():
+            if price is None or price == self._prices.get(symbol):
+                continue
+            self._prices[symbol] = price
+            for subscription in self._by_symbol.get(symbol, ()):
+                subscription.changed.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live valuation tick failed")
+            await asyncio.sleep(settings.LIVE_STREAM_INTERVAL_SECONDS)
+
+    def valuation(self, subscription: LiveSubscription) -> Dict[str, Any]:
+        """Current valuation of a subscription's positions from the shared prices"""
+        symbols = list(subscription.positions)
+        holdings = [subscription.positions[symbol] for symbol in symbols]
+        prices = [self._prices.get(symbol) for symbol in symbols]
+        valuation = value_holdings(
+            [quantity for quantity, _ in holdings], prices, [invested for _, invested in holdings]
+        )
+
+        # A position without a price has no value, pnl or weight yet, rather than a 100% loss
+        positions = {
+            symbol: {
+                "quantity": str(quantity),
+                "current_price": _format(price),
+                "current_value": None if price is None else str(from_cents(valuation.value[index])),
+                "pnl": None if price is None else str(from_cents(valuation.pnl[index])),
+                "pnl_percentage": None if price is None else str(from_percentage(valuation.pnl_percentage[index])),
+                "weight": None if price is None else str(from_percentage(valuation.weight[index])),
+            }
+            for index, (symbol, (quantity, _), price) in enumerate(zip(symbols, holdings, prices))
+        }
+        return {
+            "portfolio_id": subscription.portfolio_id,
+            "total_value": str(from_cents(valuation.total_value[0])),
+            "total_invested": str(from_cents(valuation.total_invested[0])),
+            "total_pnl": str(from_cents(valuation.total_pnl[0])),
+            "total_pnl_percentage": str(from_percentage(valuation.total_pnl_percentage[0])),
+            "positions": positions,
+        }
+
+    def delta(self, previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+        """Only the totals and position fields that differ from what was last sent"""
+        changes = {
+            key: value for key, value in current.items()
+            if key != "positions" and previous.get(key) != value
+        }
+        sent_positions = previous.get("positions", {})
+        positions = {}
+        for symbol, fields in current["positions"].items():
+            sent = sent_positions.get(symbol, {})
+            changed = {key: value for key, value in fields.items() if sent.get(key) != value}
+            if changed:
+                positions[symbol] = changed
+        if positions:
+            changes["positions"] = positions
+        removed = [symbol for symbol in sent_positions if symbol not in current["positions"]]
+        if removed:
+            changes["removed"] = removed
+        return changes
+
+    async def stream(self, portfolio_id: int) -> AsyncIterator[str]:
+        """Server-sent events: one `snapshot`, then `delta` events and keep-alive comments"""
+        # Subscribing inside the generator ties registration to the response lifetime
+        subscription = await self.subscribe(portfolio_id)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.changed.wait(), settings.LIVE_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                subscription.changed.clear()
+
+                current = self.valuation(subscription)
+                if subscription.sent:
+                    name, payload = "delta", self.delta(subscription.sent, current)
+                    if not payload:
+                        continue
+                else:
+                    name, payload = "snapshot", current
+                subscription.sent = current
+                yield f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    async def stop(self):
+        """Cancel the shared poller"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class StreamTickets:
+    """Single-use, short-lived tickets for opening a stream without an Authorization header
+
+    EventSource cannot send headers. A ticket stands in for the bearer token in the
+    query string: it names one user and portfolio, is consumed by the first stream
+    that presents it and expires within seconds, so access logs never hold a
+    reusable credential. Tickets go through the shared tier, since the stream may
+    land on another worker than the one that issued it; while Redis is unreachable
+    they are kept by the issuing worker instead.
+    """
+
+    def __init__(self, shared_cache: SharedCache):
+        self.shared_cache = shared_cache
+        self.local = QuoteCache(max_entries=settings.LIVE_STREAM_MAX_SUBSCRIBERS)
+
+    def _key(self, ticket: str) -> str:
+        return f"stream-ticket:{ticket}"
+
+    def issue(self, user_id: int, portfolio_id: int) -> str:
+        ticket = secrets.token_urlsafe(24)
+        owner = [user_id, portfolio_id]
+        ttl = settings.LIVE_STREAM_TICKET_TTL_SECONDS
+        if self.shared_cache.enabled and self.shared_cache.set(self._key(ticket), owner, ttl):
+            return ticket
+        if self.shared_cache.enabled:
+            # Still redeemable when the stream lands on this worker
+            logger.warning("Shared cache unavailable, keeping stream ticket in this worker only")
+        self.local.set(ticket, owner, ttl)
+        return ticket
+
+    def redeem(self, ticket: str, portfolio_id: int) -> Optional[int]:
+        """Consume a ticket, returning its user id if it was issued for `portfolio_id`"""
+        # Each ticket is stored in exactly one place, and the shared pop is atomic, so it is single-use
+        owner = self.shared_cache.pop(self._key(ticket)) if self.shared_cache.enabled else None
+        if owner is None:
+            _, owner = self.local.get(ticket)
+            self.local.invalidate(ticket)
+        if owner is None or owner[1] != portfolio_id:
+            return None
+        return owner[0]
+
+
+# Global instances
+live_valuation_hub = LiveValuationHub(market_service, price_refresher, portfolio_versions)
+stream_tickets = StreamTickets(market_service.shared_cache)
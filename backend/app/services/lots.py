@@ -0,0 +1,199 @@
+import base64
+import sys
+from array import array
+from collections import deque
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from fractions import Fraction
+from itertools import chain
+from typing import Deque, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from ..models import Transaction, TransactionType
+from .valuation import QUANTITY_SCALE
+
+# Lot cost is kept to the micro-unit so splitting it across partial sells never drifts from the cents paid
+COST_SCALE = 1_000_000
+CENT = Decimal("0.01")
+# Stored books are little-endian whatever host wrote them
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+class CostBasisMethod(str, Enum):
+    FIFO = "fifo"
+    LIFO = "lifo"
+    AVERAGE = "average"
+
+
+class Lot(NamedTuple):
+    """An open tax lot: quantity in 1/QUANTITY_SCALE units, cost in 1/COST_SCALE currency units"""
+
+    quantity: int
+    cost: int
+    acquired: int  # date.toordinal() of the buy
+    transaction_id: int  # 0 when unknown
+
+
+LOT_FIELDS = len(Lot._fields)
+
+
+def _scaled(value: Optional[Decimal], scale: int) -> int:
+    if value is None:
+        return 0
+    return int((Decimal(value) * scale).to_integral_value())
+
+
+def _divide(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded half-even, for a positive denominator"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+class LotBook:
+    """Open lots and realized P&L of one position
+
+    FIFO sells consume the oldest lots, LIFO the newest; average cost keeps a single
+    pooled lot. A split rescales open quantities at unchanged cost; dividends are
+    accumulated as income. Quantities and costs are integers, so a sell that splits a lot
+    leaves cost that still adds up exactly to what was paid. Lots are plain
+    tuples in Lot field order and persist as one packed int64 array.
+    """
+
+    __slots__ = ("method", "lots", "quantity", "cost", "realized", "dividends")
+
+    def __init__(
+        self,
+        method: str,
+        lots: Iterable[Tuple[int, int, int, int]] = (),
+        realized: int = 0,
+        dividends: int = 0,
+    ):
+        self.method = CostBasisMethod(method)
+        self.lots: Deque[Tuple[int, int, int, int]] = deque(lots)
+        self.quantity = sum(lot[0] for lot in self.lots)
+        self.cost = sum(lot[1] for lot in self.lots)
+        self.realized = realized  # COST_SCALE units
+        self.dividends = dividends  # COST_SCALE units
+
+    def buy(self, quantity: int, cost: int, acquired: int, transaction_id: int = 0):
+        if self.method == CostBasisMethod.AVERAGE and self.lots:
+            pooled_quantity, pooled_cost, pooled_acquired, pooled_id = self.lots[0]
+            self.lots[0] = (pooled_quantity + quantity, pooled_cost + cost, pooled_acquired, pooled_id)
+        else:
+            self.lots.append((quantity, cost, acquired, transaction_id))
+        self.quantity += quantity
+        self.cost += cost
+
+    def sell(self, quantity: int, proceeds: int) -> int:
+        """Match a sell against open lots, returning the quantity left unmatched"""
+        newest_first = self.method == CostBasisMethod.LIFO
+        remaining = quantity
+        cost_removed = 0
+        while remaining > 0 and self.lots:
+            lot_quantity, lot_cost, acquired, transaction_id = self.lots[-1] if newest_first else self.lots[0]
+            if lot_quantity <= remaining:
+                if newest_first:
+                    self.lots.pop()
+                else:
+                    self.lots.popleft()
+                remaining -= lot_quantity
+                cost_removed += lot_cost
+                continue
+            cost = _divide(lot_cost * remaining, lot_quantity)
+            partial = (lot_quantity - remaining, lot_cost - cost, acquired, transaction_id)
+            if newest_first:
+                self.lots[-1] = partial
+            else:
+                self.lots[0] = partial
+            cost_removed += cost
+            remaining = 0
+
+        matched = quantity - remaining
+        if matched:
+            matched_proceeds = proceeds if not remaining else _divide(proceeds * matched, quantity)
+            self.realized += matched_proceeds - cost_removed
+            self.quantity -= matched
+            self.cost -= cost_removed
+        return remaining
+
+    def split(self, ratio: Fraction):
+        """Multiply every open quantity by `ratio` (new shares per old share); cost is unchanged"""
+        self.lots = deque(
+            (_divide(quantity * ratio.numerator, ratio.denominator), cost, acquired, transaction_id)
+            for quantity, cost, acquired, transaction_id in self.lots
+        )
+        self.quantity = sum(lot[0] for lot in self.lots)
+
+    def apply(self, transaction: Transaction) -> int:
+        """Apply a transaction, returning the sold quantity that found no open lot
+
+        SPLIT rows carry the ratio in `quantity`; DIVIDEND rows the cash received in `total_amount`.
+        """
+        if transaction.transaction_type == TransactionType.SPLIT:
+            if transaction.quantity and transaction.quantity > 0:
+                self.split(Fraction(transaction.quantity))
+            return 0
+
+        amount = _scaled(transaction.total_amount, COST_SCALE)
+        if transaction.transaction_type == TransactionType.DIVIDEND:
+            self.dividends += amount
+            return 0
+
+        quantity = _scaled(transaction.quantity, QUANTITY_SCALE)
+        if transaction.transaction_type == TransactionType.BUY:
+            self.buy(quantity, amount, transaction.transaction_date.toordinal(), transaction.id or 0)
+        elif transaction.transaction_type == TransactionType.SELL:
+            return self.sell(quantity, amount)
+        return 0
+
+    @property
+    def total_quantity(self) -> Decimal:
+        return Decimal(self.quantity).scaleb(-4)
+
+    @property
+    def total_invested(self) -> Decimal:
+        return Decimal(self.cost).scaleb(-6).quantize(CENT)
+
+    @property
+    def average_price(self) -> Decimal:
+        if self.quantity <= 0:
+            return Decimal('0')
+        return Decimal(self.cost).scaleb(-6) / self.total_quantity
+
+    @property
+    def realized_pnl(self) -> Decimal:
+        return Decimal(self.realized).scaleb(-6).quantize(CENT)
+
+    @property
+    def dividends_received(self) -> Decimal:
+        return Decimal(self.dividends).scaleb(-6).quantize(CENT)
+
+    def open_lots(self) -> Iterator[Tuple[Decimal, Decimal, Decimal, date, Optional[int]]]:
+        """Yield (quantity, cost, cost per unit, acquired date, transaction id) per open lot"""
+        for lot in map(Lot._make, self.lots):
+            quantity = Decimal(lot.quantity).scaleb(-4)
+            cost = Decimal(lot.cost).scaleb(-6)
+            yield (
+                quantity, cost.quantize(CENT), cost / quantity,
+                date.fromordinal(lot.acquired), lot.transaction_id or None
+            )
+
+    def dumps(self) -> str:
+        """Realized P&L and dividends followed by the flattened lots, as base64 of a little-endian int64 array"""
+        packed = array("q", [self.realized, self.dividends])
+        packed.extend(chain.from_iterable(self.lots))
+        if _BIG_ENDIAN:
+            packed.byteswap()
+        return base64.b64encode(packed.tobytes()).decode("ascii")
+
+    @classmethod
+    def loads(cls, method: str, data: str) -> "LotBook":
+        packed = array("q")
+        packed.frombytes(base64.b64decode(data))
+        if _BIG_ENDIAN:
+            packed.byteswap()
+        fields = [packed[2 + index::LOT_FIELDS] for index in range(LOT_FIELDS)]
+        return cls(method, zip(*fields), packed[0], packed[1])
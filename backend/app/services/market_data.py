@@ -1,91 +1,140 @@
-import yfinance as yf
-from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from decimal import Decimal
 from datetime import datetime, timedelta
 
+from ..core.config import settings
+from .history_store import HistoryStore, get_history_provider
+from .quote_cache import QuoteCache
+from .quote_providers import QuoteProvider, chunked, get_quote_provider
+from .shared_cache import SharedCache, get_shared_cache
+from .symbol_catalog import SymbolCatalog, SymbolInfo
+from .symbol_search import SymbolSearchIndex
+
+
+def market_for_symbol(symbol: str) -> str:
+    """Infer the market of a symbol from its exchange suffix"""
+    return "BR" if symbol.upper().endswith(".SA") else "US"
+
+
+def quote_ttl(symbol: str) -> int:
+    """Cache TTL for a symbol's quote, per market"""
+    return settings.QUOTE_CACHE_TTL_SECONDS.get(
+        market_for_symbol(symbol), settings.QUOTE_CACHE_DEFAULT_TTL_SECONDS
+    )
+
+
+MARKET_INDICES = {
+    "BR": "^BVSP",  # Bovespa
+    "US": "^GSPC"   # S&P 500
+}
+
 
 class MarketDataService:
     """Service to fetch market data from various sources"""
     
-    def __init__(self):
-        self.popular_symbols = {
-            "BR": {
-                "PETR4.SA": "Petróleo Brasileiro S.A. - Petrobras",
-                "VALE3.SA": "Vale S.A.",
-                "ITUB4.SA": "Itaú Unibanco Holding S.A.",
-                "BBDC4.SA": "Banco Bradesco S.A.",
-                "ABEV3.SA": "Ambev S.A.",
-                "WEGE3.SA": "WEG S.A.",
-                "RENT3.SA": "Localiza Rent a Car S.A.",
-                "LREN3.SA": "Lojas Renner S.A.",
-                "MGLU3.SA": "Magazine Luiza S.A.",
-                "JBSS3.SA": "JBS S.A.",
-                "BBAS3.SA": "Banco do Brasil S.A.",
-                "SUZB3.SA": "Suzano S.A.",
-                "RAIL3.SA": "Rumo S.A.",
-                "VIVT3.SA": "Telefônica Brasil S.A.",
-                "GGBR4.SA": "Gerdau S.A.",
-                "USIM5.SA": "Usinas Siderúrgicas de Minas Gerais S.A.",
-                "CCRO3.SA": "CCR S.A.",
-                "CIEL3.SA": "Cielo S.A.",
-                "HAPV3.SA": "Hapvida Participações e Investimentos S.A.",
-                "RADL3.SA": "Raia Drogasil S.A.",
-                "PCAR3.SA": "P.A.C. Participações S.A.",
-                "KLBN11.SA": "Klabin S.A.",
-                "EMBR3.SA": "Embraer S.A.",
-                "CSAN3.SA": "Cosan S.A.",
-                "NTCO3.SA": "Natura &Co Holding S.A."
-            },
-            "US": {
-                "AAPL": "Apple Inc.",
-                "MSFT": "Microsoft Corporation",
-                "GOOGL": "Alphabet Inc.",
-                "AMZN": "Amazon.com Inc.",
-                "TSLA": "Tesla Inc.",
-                "META": "Meta Platforms Inc.",
-                "NVDA": "NVIDIA Corporation",
-                "NFLX": "Netflix Inc.",
-                "AMD": "Advanced Micro Devices Inc.",
-                "INTC": "Intel Corporation",
-                "CRM": "Salesforce Inc.",
-                "ORCL": "Oracle Corporation",
-                "ADBE": "Adobe Inc.",
-                "PYPL": "PayPal Holdings Inc.",
-                "DIS": "The Walt Disney Company",
-                "UBER": "Uber Technologies Inc.",
-                "SPOT": "Spotify Technology S.A.",
-                "ZOOM": "Zoom Video Communications Inc.",
-                "SQ": "Block Inc.",
-                "TWTR": "Twitter Inc.",
-                "SNAP": "Snap Inc.",
-                "ROKU": "Roku Inc.",
-                "SHOP": "Shopify Inc.",
-                "COIN": "Coinbase Global Inc.",
-                "RBLX": "Roblox Corporation"
-            }
-        }
+    def __init__(
+        self,
+        provider: Optional[QuoteProvider] = None,
+        batch_size: Optional[int] = None,
+        cache: Optional[QuoteCache] = None,
+        shared_cache: Optional[SharedCache] = None,
+        history_store: Optional[HistoryStore] = None,
+        catalog: Optional[SymbolCatalog] = None,
+    ):
+        self.provider = provider or get_quote_provider(settings.MARKET_DATA_PROVIDER)
+        self.batch_size = batch_size or settings.QUOTE_BATCH_SIZE
+        self.cache = cache or QuoteCache(max_entries=settings.QUOTE_CACHE_MAX_ENTRIES)
+        self.shared_cache = shared_cache or get_shared_cache()
+        self.history_store = history_store or HistoryStore(
+            settings.HISTORY_DB_PATH,
+            get_history_provider(settings.HISTORY_PROVIDER, settings.HISTORY_FIXTURES_DIR),
+            refresh_seconds=settings.HISTORY_REFRESH_SECONDS,
+        )
+        # Reference data is read from disk on first lookup
+        self.catalog = catalog or SymbolCatalog(settings.SYMBOL_CATALOG_PATH or None)
+        # Dedicated, bounded pool so slow upstream calls never starve the request threadpool
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.MARKET_DATA_MAX_WORKERS,
+            thread_name_prefix="market-data",
+        )
+        self._symbol_index: Optional[SymbolSearchIndex] = None
+        self._symbol_index_lock = threading.Lock()
+
+    @property
+    def symbol_index(self) -> SymbolSearchIndex:
+        """Search index over the symbol catalog, built on first use"""
+        if self._symbol_index is None:
+            with self._symbol_index_lock:
+                if self._symbol_index is None:
+                    self._symbol_index = SymbolSearchIndex(self.catalog.entries())
+        return self._symbol_index
 
-    def get_symbol_suggestions(self, market: str, query: str = "") -> List[str]:
-        """Get symbol suggestions based on market and query"""
-        if market not in self.popular_symbols:
+    def get_popular_symbols(self, market: str) -> Optional[Dict[str, str]]:
+        """Popular symbols of a market with company names, or None for an unknown market"""
+        if market not in self.catalog.markets():
+            return None
+        return self.catalog.popular(market)
+
+    def get_symbol_info(self, symbol: str) -> Optional[SymbolInfo]:
+        """Reference data (name, market, currency, sector, lot size) from the catalog"""
+        return self.catalog.get(symbol)
+
+    def get_company_name(self, symbol: str) -> Optional[str]:
+        """Company name from the catalog, falling back to upstream validation"""
+        info = self.catalog.get(symbol)
+        if info is not None:
+            return info.name
+        is_valid, company_name, _ = self.validate_symbol(symbol)
+        return company_name if is_valid else None
+
+    def get_symbol_suggestions(self, market: str, query: str = "", limit: int = 20) -> List[str]:
+        """Get ranked symbol suggestions for a market from the catalog index"""
+        if market not in self.catalog.markets():
             return []
         
-        symbols = self.popular_symbols[market]
         if not query:
-            return list(symbols.keys())
-        
-        query = query.upper()
-        matches = []
+            return list(self.catalog.popular(market))[:limit]
         
-        for symbol, name in symbols.items():
-            if query in symbol.upper() or query in name.upper():
-                matches.append(symbol)
-        
-        return matches
+        return self.symbol_index.search(market, query, limit)
 
     def validate_symbol(self, symbol: str) -> Tuple[bool, str, Optional[Decimal]]:
         """Validate symbol and get current price"""
+        result = self.cache.get_or_load(
+            ("validate", symbol),
+            lambda: self._load_validation(symbol),
+            settings.SYMBOL_VALIDATION_TTL_SECONDS,
+            cache_if=lambda result: result[0],
+        )
+        is_valid, company_name, _ = result
+        if not is_valid:
+            return result
+        # Company names are long-lived, prices follow the quote TTL
+        return is_valid, company_name, self.get_current_prices([symbol]).get(symbol)
+
+    def _load_validation(self, symbol: str) -> Tuple[bool, str, Optional[Decimal]]:
+        info = self.catalog.get(symbol)
+        if info is not None:
+            return True, info.name, None
+
+        key = f"name:{symbol}"
+        company_name = self.shared_cache.get(key)
+        if company_name is not None:
+            return True, company_name, None
+
+        result = self._validate_symbol_upstream(symbol)
+        if result[0]:
+            self.shared_cache.set(key, result[1], settings.SYMBOL_VALIDATION_TTL_SECONDS)
+        return result
+
+    def _validate_symbol_upstream(self, symbol: str) -> Tuple[bool, str, Optional[Decimal]]:
         try:
+            # Deferred: yfinance pulls in pandas, the bulk of the API's cold start
+            import yfinance as yf
             ticker = yf.Ticker(symbol)
             
             # Get historical data first (faster)
@@ -94,6 +143,7 @@ class MarketDataService:
                 return False, "Símbolo não encontrado ou sem dados de cotação", None
             
             current_price = Decimal(str(hist['Close'].iloc[-1]))
+            self.cache.set(("price", symbol), current_price, quote_ttl(symbol))
             
             # Try to get company info (may be slower)
             try:
@@ -108,75 +158,160 @@ class MarketDataService:
             return False, f"Erro ao validar símbolo: {str(e)}", None
 
     def get_current_prices(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
-        """Get current prices for multiple symbols"""
+        """Get current prices for multiple symbols using the cache and batched provider calls"""
+        cached = self.cache.get_many_or_load(
+            [("price", symbol) for symbol in symbols],
+            self._load_prices,
+            lambda key: quote_ttl(key[1]),
+            cache_if=lambda price: price is not None,
+        )
+        return {key[1]: price for key, price in cached.items()}
+
+    def refresh_prices(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
+        """Fetch prices for symbols past the in-process cache and store the results"""
+        prices = self._shared_fetch_many(
+            "quote", list(dict.fromkeys(symbols)), self._fetch_prices_upstream, quote_ttl
+        )
+        for symbol, price in prices.items():
+            if price is not None:
+                self.cache.set(("price", symbol), price, quote_ttl(symbol))
+        return prices
+
+    def _load_prices(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Decimal]]:
+        symbols = [symbol for _, symbol in keys]
+        prices = self._shared_fetch_many("quote", symbols, self._fetch_prices_upstream, quote_ttl)
+        return {("price", symbol): prices.get(symbol) for symbol in symbols}
+
+    def _fetch_prices_upstream(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
         prices = {}
-        for symbol in symbols:
+        for batch in chunked(symbols, self.batch_size):
             try:
-                ticker = yf.Ticker(symbol)
-                data = ticker.history(period="1d")
-                if not data.empty:
-                    prices[symbol] = Decimal(str(data['Close'].iloc[-1]))
-                else:
-                    prices[symbol] = None
-            except:
-                prices[symbol] = None
+                prices.update(self.provider.fetch_quotes(batch))
+            except Exception:
+                prices.update({symbol: None for symbol in batch})
         return prices
 
+    def _shared_fetch_many(
+        self,
+        kind: str,
+        symbols: List[str],
+        fetch: Callable[[List[str]], Dict[str, Optional[Decimal]]],
+        ttl_for: Callable[[str], int],
+    ) -> Dict[str, Optional[Decimal]]:
+        """Read symbols through the shared tier so only one worker fetches each miss upstream"""
+        keys = {symbol: f"{kind}:{symbol}" for symbol in symbols}
+        found = self.shared_cache.get_many(keys.values())
+        values = {symbol: found[key] for symbol, key in keys.items() if key in found}
+        missing = [symbol for symbol in symbols if symbol not in values]
+        if not missing:
+            return values
+
+        lock_ttl = settings.SHARED_CACHE_LOCK_SECONDS
+        owned = [symbol for symbol in missing if self.shared_cache.acquire_lock(keys[symbol], lock_ttl)]
+        waiting = [symbol for symbol in missing if symbol not in owned]
+
+        if owned:
+            try:
+                fetched = fetch(owned)
+                values.update({symbol: fetched.get(symbol) for symbol in owned})
+                self.shared_cache.set_many({
+                    keys[symbol]: (value, ttl_for(symbol))
+                    for symbol, value in fetched.items()
+                    if value is not None and symbol in keys
+                })
+            finally:
+                for symbol in owned:
+                    self.shared_cache.release_lock(keys[symbol])
+
+        # Another worker is fetching these; poll the shared tier before falling back
+        deadline = time.monotonic() + lock_ttl
+        while waiting and time.monotonic() < deadline:
+            time.sleep(0.05)
+            # Locks before values: the owner stores its result before it releases the lock
+            held = self.shared_cache.held_locks(keys[symbol] for symbol in waiting)
+            found = self.shared_cache.get_many(keys[symbol] for symbol in waiting)
+            for symbol in waiting:
+                if keys[symbol] in found:
+                    values[symbol] = found[keys[symbol]]
+            # A lock released without a value: stop waiting and fetch it here
+            waiting = [symbol for symbol in waiting if symbol not in values and keys[symbol] in held]
+        missing = [symbol for symbol in missing if symbol not in values]
+        if missing:
+            values.update(fetch(missing))
+
+        return values
+
     def get_historical_data(self, symbol: str, period: str = "6mo") -> Optional[Dict]:
         """Get historical price data for a symbol"""
+        return self.cache.get_or_load(
+            ("history", symbol, period),
+            lambda: self._load_historical_data(symbol, period),
+            settings.HISTORICAL_CACHE_TTL_SECONDS,
+            cache_if=lambda data: data is not None,
+        )
+
+    def _load_historical_data(self, symbol: str, period: str) -> Optional[Dict]:
+        key = f"history:{symbol}:{period}"
+        data = self.shared_cache.get(key)
+        if data is not None:
+            return data
+
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period=period)
-            
-            if hist.empty:
-                return None
-            
-            return {
-                "dates": hist.index.strftime('%Y-%m-%d').tolist(),
-                "prices": hist['Close'].tolist(),
-                "volumes": hist['Volume'].tolist()
-            }
+            data = self.history_store.get_series(symbol, period)
         except Exception:
             return None
+        if data is not None:
+            self.shared_cache.set(key, data, settings.HISTORICAL_CACHE_TTL_SECONDS)
+        return data
 
     def get_market_summary(self) -> Dict[str, Dict]:
         """Get market summary for major indices"""
-        indices = {
-            "BR": "^BVSP",  # Bovespa
-            "US": "^GSPC"   # S&P 500
-        }
-        
         summary = {}
-        for market, index_symbol in indices.items():
-            try:
-                ticker = yf.Ticker(index_symbol)
-                hist = ticker.history(period="2d")
+        for market, index_symbol in MARKET_INDICES.items():
+            index_summary = self._index_summary(index_symbol)
+            if index_summary is not None:
+                summary[market] = index_summary
+        return summary
+
+    def _index_summary(self, index_symbol: str) -> Optional[Dict]:
+        try:
+            import yfinance as yf
+            ticker = yf.Ticker(index_symbol)
+            hist = ticker.history(period="2d")
+            
+            if len(hist) >= 2:
+                current = hist['Close'].iloc[-1]
+                previous = hist['Close'].iloc[-2]
+                change = current - previous
+                change_pct = (change / previous) * 100
                 
-                if len(hist) >= 2:
-                    current = hist['Close'].iloc[-1]
-                    previous = hist['Close'].iloc[-2]
-                    change = current - previous
-                    change_pct = (change / previous) * 100
-                    
-                    summary[market] = {
-                        "current": float(current),
-                        "change": float(change),
-                        "change_percentage": float(change_pct)
-                    }
-            except:
-                summary[market] = {
-                    "current": 0,
-                    "change": 0,
-                    "change_percentage": 0
+                return {
+                    "current": float(current),
+                    "change": float(change),
+                    "change_percentage": float(change_pct)
                 }
-        
-        return summary
+        except:
+            return {
+                "current": 0,
+                "change": 0,
+                "change_percentage": 0
+            }
+        return None
 
-    async def get_real_time_price(self, symbol: str) -> Optional[Decimal]:
-        """Get real-time price for a symbol (async)"""
+    def get_real_time_price_sync(self, symbol: str) -> Optional[Decimal]:
+        """Get real-time price for a symbol (blocking)"""
         # This would be implemented with a real-time data provider
         # For now, using yfinance as fallback
+        return self.cache.get_or_load(
+            ("realtime", symbol),
+            lambda: self._real_time_price_upstream(symbol),
+            quote_ttl(symbol),
+            cache_if=lambda price: price is not None,
+        )
+
+    def _real_time_price_upstream(self, symbol: str) -> Optional[Decimal]:
         try:
+            import yfinance as yf
             ticker = yf.Ticker(symbol)
             data = ticker.history(period="1d", interval="1m")
             if not data.empty:
@@ -186,5 +321,70 @@ class MarketDataService:
         return None
 
 
+    # Async API: blocking calls run on the dedicated executor with per-call timeouts.
+    # A timed-out or cancelled call stops being awaited; its worker thread finishes in
+    # the background and the pool size bounds how many such calls can pile up.
+
+    async def run_in_executor(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """Run a blocking callable on the market data executor, bounded by a timeout"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        return await asyncio.wait_for(future, timeout or settings.MARKET_DATA_TIMEOUT_SECONDS)
+
+    async def validate_symbol_async(self, symbol: str) -> Tuple[bool, str, Optional[Decimal]]:
+        """Async variant of validate_symbol"""
+        return await self.run_in_executor(self.validate_symbol, symbol)
+
+    async def get_current_prices_async(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
+        """Async variant of get_current_prices, fanning batches out concurrently"""
+        unique_symbols = list(dict.fromkeys(symbols))
+        batches = list(chunked(unique_symbols, self.batch_size))
+        results = await asyncio.gather(
+            *(self.run_in_executor(self.get_current_prices, batch) for batch in batches),
+            return_exceptions=True,
+        )
+
+        prices: Dict[str, Optional[Decimal]] = {}
+        for batch, result in zip(batches, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                # Timed out or failed batches degrade to unknown prices
+                prices.update({symbol: None for symbol in batch})
+            else:
+                prices.update(result)
+        return prices
+
+    async def get_historical_data_async(self, symbol: str, period: str = "6mo") -> Optional[Dict]:
+        """Async variant of get_historical_data"""
+        return await self.run_in_executor(self.get_historical_data, symbol, period)
+
+    async def get_market_summary_async(self) -> Dict[str, Dict]:
+        """Async variant of get_market_summary, querying indices concurrently"""
+        markets = list(MARKET_INDICES)
+        results = await asyncio.gather(
+            *(self.run_in_executor(self._index_summary, MARKET_INDICES[market]) for market in markets),
+            return_exceptions=True,
+        )
+
+        summary = {}
+        for market, result in zip(markets, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                result = {"current": 0, "change": 0, "change_percentage": 0}
+            if result is not None:
+                summary[market] = result
+        return summary
+
+    async def get_real_time_price(self, symbol: str) -> Optional[Decimal]:
+        """Get real-time price for a symbol (async)"""
+        return await self.run_in_executor(self.get_real_time_price_sync, symbol)
+
+    def shutdown(self):
+        """Stop the market data executor without waiting for in-flight calls"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
 # Global instance
 market_service = MarketDataService()
\ No newline at end of file
@@ -0,0 +1,148 @@
+from datetime import date
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from ..models import Transaction, TransactionType
+from .corporate_actions import SplitFactors
+from .history_store import Bar, HistoryStore
+
+
+def align_closes(dates: np.ndarray, series: Sequence[Sequence[Bar]]) -> np.ndarray:
+    """Build a days x symbols close matrix on `dates`, forward-filling gaps (0 before the first close)"""
+    closes = np.full((len(dates), len(series)), np.nan)
+    for column, bars in enumerate(series):
+        if not bars:
+            continue
+        bar_days = np.array([bar.day for bar in bars], dtype="datetime64[D]")
+        rows = np.searchsorted(dates, bar_days)
+        on_axis = rows < len(dates)
+        on_axis[on_axis] = dates[rows[on_axis]] == bar_days[on_axis]
+        closes[rows[on_axis], column] = np.array([bar.close for bar in bars])[on_axis]
+
+    # Vectorized forward fill: carry the index of the last observed row down each column
+    observed = ~np.isnan(closes)
+    last_row = np.where(observed, np.arange(len(dates))[:, None], 0)
+    np.maximum.accumulate(last_row, axis=0, out=last_row)
+    filled = closes[last_row, np.arange(len(series))]
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def compute_performance(
+    dates: np.ndarray,
+    symbols: List[str],
+    transactions: Sequence[Transaction],
+    closes: np.ndarray,
+    split_factors: Optional[Mapping[str, SplitFactors]] = None,
+) -> Dict[str, List]:
+    """Compute daily value, cash flows and time-weighted returns in one pass over dense arrays
+
+    `dates` is a sorted datetime64[D] axis and `closes` a matching days x symbols matrix.
+    Trades before the first date form the opening holdings; trades on non-trading
+    days apply on the next available date. Closes are split-adjusted, so quantities
+    traded before a split are scaled by its cumulative factor. The history store
+    re-checks a symbol's basis once a split is recorded for it and restates the
+    snapshots built on the old closes.
+    """
+    days, width = closes.shape
+    if days == 0:
+        return performance_payload(dates, np.zeros(0), np.zeros(0), np.zeros(0))
+
+    column = {symbol: index for index, symbol in enumerate(symbols)}
+    trades = [
+        t for t in transactions
+        if t.transaction_type in (TransactionType.BUY, TransactionType.SELL) and t.symbol in column
+    ]
+
+    sign = np.array([1.0 if t.transaction_type == TransactionType.BUY else -1.0 for t in trades])
+    quantity = np.array([float(t.quantity) for t in trades]) * sign
+    amount = np.array([float(t.total_amount) for t in trades]) * sign
+    columns = np.array([column[t.symbol] for t in trades], dtype=np.intp)
+    trade_days = np.array([t.transaction_date.date() for t in trades], dtype="datetime64[D]")
+
+    for symbol, factors in (split_factors or {}).items():
+        if factors and symbol in column:
+            traded = columns == column[symbol]
+            quantity[traded] *= factors.factors(trade_days[traded])
+
+    rows = np.searchsorted(dates, trade_days, side="left")
+    before_start = trade_days < dates[0]
+    in_range = rows < days
+
+    # Dense holdings matrix: per-day quantity deltas, cumulated down each symbol column
+    deltas = np.zeros((days, width))
+    np.add.at(deltas, (rows[in_range], columns[in_range]), quantity[in_range])
+    holdings = np.cumsum(deltas, axis=0)
+
+    flows = np.zeros(days)
+    counted = in_range & ~before_start
+    np.add.at(flows, rows[counted], amount[counted])
+    opening_invested = amount[before_start].sum()
+
+    values = np.einsum("ij,ij->i", holdings, closes)
+    invested = opening_invested + np.cumsum(flows)
+    return performance_payload(dates, values, invested, flows)
+
+
+def time_weighted_returns(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """Cumulative time-weighted return (fraction) for daily values and same-day cash flows"""
+    if len(values) == 0:
+        return np.zeros(0)
+    # Strip each day's flow before comparing to the prior value
+    previous = np.concatenate(([values[0] - flows[0]], values[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(previous > 0, (values - flows) / previous - 1.0, 0.0)
+    return np.cumprod(1.0 + daily) - 1.0
+
+
+def performance_payload(
+    dates: np.ndarray, values: np.ndarray, invested: np.ndarray, flows: np.ndarray
+) -> Dict[str, List]:
+    """Serialize daily series into the performance response shape"""
+    return {
+        "dates": [str(day) for day in dates],
+        "values": np.round(values, 2).tolist(),
+        "invested": np.round(invested, 2).tolist(),
+        "cash_flows": np.round(flows, 2).tolist(),
+        "returns": np.round(time_weighted_returns(values, flows) * 100, 4).tolist(),
+    }
+
+
+def build_date_axis(series: Sequence[Sequence[Bar]], start: Optional[date]) -> np.ndarray:
+    """Sorted union of trading days across all series, from `start` onwards"""
+    if not any(series):
+        return np.array([], dtype="datetime64[D]")
+    days = np.unique(np.concatenate([
+        np.array([bar.day for bar in bars], dtype="datetime64[D]") for bars in series if bars
+    ]))
+    if start is not None:
+        days = days[days >= np.datetime64(start, "D")]
+    return days
+
+
+def portfolio_performance(
+    transactions: Sequence[Transaction],
+    start: Optional[date],
+    store: HistoryStore,
+    split_factors: Optional[Mapping[str, SplitFactors]] = None,
+) -> Dict[str, List]:
+    """Gap-fill closes for every traded symbol from `start` and run compute_performance"""
+    if not transactions:
+        return performance_payload(np.array([], dtype="datetime64[D]"), np.zeros(0), np.zeros(0), np.zeros(0))
+
+    # Full history starts at the first trade rather than the first listed day
+    start = start or min(transaction.transaction_date for transaction in transactions).date()
+    symbols = sorted({transaction.symbol for transaction in transactions})
+
+    series = []
+    for symbol in symbols:
+        try:
+            store.ensure_range(symbol, start)
+        except Exception:
+            # Serve whatever is already stored if the provider is unavailable
+            pass
+        series.append(store.get_bars(symbol, start))
+
+    dates = build_date_axis(series, start)
+    closes = align_closes(dates, series)
+    return compute_performance(dates, symbols, transactions, closes, split_factors)
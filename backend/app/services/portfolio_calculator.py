@@ -1,57 +1,123 @@
-from typing import List, Dict
+import logging
+from typing import Iterable, List, Dict, Optional
 from decimal import Decimal
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from ..models import Portfolio, Position, Transaction, TransactionType
-from ..schemas import PortfolioWithStats
+from ..core.config import settings
+from ..models import Portfolio, Position, PositionLotState, Transaction
+from ..schemas import PortfolioValuation, PortfolioWithStats, PositionLots, PositionValuation, TaxLot
+from .corporate_actions import corporate_actions
+from .history_store import period_start
+from .lots import CENT, CostBasisMethod, LotBook
 from .market_data import market_service
+from .performance import portfolio_performance
+from .price_refresher import price_refresher
+from .snapshots import snapshot_service
+from .valuation import from_cents, from_percentage, total_holdings, value_holdings
+
+logger = logging.getLogger(__name__)
 
 
 class PortfolioCalculatorService:
     """Service for calculating portfolio metrics and statistics"""
 
-    def calculate_position_from_transactions(self, transactions: List[Transaction]) -> Dict:
-        """Calculate current position from list of transactions"""
-        if not transactions:
-            return {
-                "quantity": Decimal('0'),
-                "average_price": Decimal('0'),
-                "total_invested": Decimal('0')
-            }
-
-        total_quantity = Decimal('0')
-        total_invested = Decimal('0')
+    def _apply(self, book: LotBook, transaction: Transaction):
+        unmatched = book.apply(transaction)
+        if unmatched:
+            logger.warning(
+                "Sell transaction %s of %s exceeds the open quantity by %s",
+                transaction.id, transaction.symbol, Decimal(unmatched).scaleb(-4)
+            )
 
+    def replay_lots(self, transactions: List[Transaction], method: Optional[str] = None) -> LotBook:
+        """Build the lot book of one symbol from its transactions in (transaction_date, id) order"""
+        book = LotBook(method or settings.COST_BASIS_METHOD)
         for transaction in transactions:
-            if transaction.transaction_type == TransactionType.BUY:
-                total_quantity += transaction.quantity
-                total_invested += transaction.total_amount
-            elif transaction.transaction_type == TransactionType.SELL:
-                # Calculate average price before selling
-                if total_quantity > 0:
-                    avg_price = total_invested / total_quantity
-                    sell_cost = transaction.quantity * avg_price
-                    total_invested -= sell_cost
-                total_quantity -= transaction.quantity
-
-        # Prevent negative quantities due to data inconsistencies
-        if total_quantity < 0:
-            total_quantity = Decimal('0')
-            total_invested = Decimal('0')
-
-        average_price = total_invested / total_quantity if total_quantity > 0 else Decimal('0')
+            self._apply(book, transaction)
+        return book
 
+    def _position_data(self, book: LotBook) -> Dict:
         return {
-            "quantity": total_quantity,
-            "average_price": average_price,
-            "total_invested": total_invested
+            "quantity": book.total_quantity,
+            "average_price": book.average_price,
+            "total_invested": book.total_invested
         }
 
+    def calculate_position_from_transactions(self, transactions: List[Transaction]) -> Dict:
+        """Calculate current position from list of transactions"""
+        return self._position_data(self.replay_lots(transactions))
+
+    def _save_position(
+        self,
+        db: Session,
+        portfolio_id: int,
+        symbol: str,
+        position: Optional[Position],
+        position_data: Dict,
+        latest_transaction: Transaction,
+    ):
+        """Create, update or remove a position row from calculated position data"""
+        if position_data["quantity"] > 0:
+            # Update or create position
+            if position:
+                position.quantity = position_data["quantity"]
+                position.average_price = position_data["average_price"]
+                position.total_invested = position_data["total_invested"]
+            else:
+                # Get company name from latest transaction
+                position = Position(
+                    symbol=symbol,
+                    company_name=latest_transaction.company_name,
+                    market=latest_transaction.market,
+                    quantity=position_data["quantity"],
+                    average_price=position_data["average_price"],
+                    total_invested=position_data["total_invested"],
+                    portfolio_id=portfolio_id
+                )
+                db.add(position)
+        else:
+            # Remove position if quantity is 0
+            if position:
+                db.delete(position)
+
+    def _save_lots(
+        self,
+        db: Session,
+        portfolio_id: int,
+        symbol: str,
+        state: Optional[PositionLotState],
+        book: LotBook,
+        latest_transaction: Transaction,
+    ):
+        """Persist the lot book so the next transaction is matched without a replay"""
+        if state is None:
+            state = PositionLotState(portfolio_id=portfolio_id, symbol=symbol)
+            db.add(state)
+        state.cost_basis_method = book.method.value
+        state.book = book.dumps()
+        state.last_transaction_date = latest_transaction.transaction_date
+        state.last_transaction_id = latest_transaction.id
+
+    def _save_symbol(
+        self,
+        db: Session,
+        portfolio_id: int,
+        symbol: str,
+        position: Optional[Position],
+        state: Optional[PositionLotState],
+        book: LotBook,
+        latest_transaction: Transaction,
+    ):
+        self._save_position(db, portfolio_id, symbol, position, self._position_data(book), latest_transaction)
+        self._save_lots(db, portfolio_id, symbol, state, book, latest_transaction)
+
     def update_portfolio_positions(self, db: Session, portfolio_id: int):
         """Update all positions for a portfolio based on transactions"""
         # Get all transactions for this portfolio
         transactions = db.query(Transaction).filter(
             Transaction.portfolio_id == portfolio_id
-        ).order_by(Transaction.transaction_date).all()
+        ).order_by(Transaction.transaction_date, Transaction.id).all()
 
         # Group transactions by symbol
         transactions_by_symbol = {}
@@ -60,46 +126,211 @@ class PortfolioCalculatorService:
                 transactions_by_symbol[transaction.symbol] = []
             transactions_by_symbol[transaction.symbol].append(transaction)
 
+        # Load existing positions and lot states in one query each
+        positions = {
+            position.symbol: position
+            for position in db.query(Position).filter(Position.portfolio_id == portfolio_id)
+        }
+        states = {
+            state.symbol: state
+            for state in db.query(PositionLotState).filter(PositionLotState.portfolio_id == portfolio_id)
+        }
+
         # Update or create positions
         for symbol, symbol_transactions in transactions_by_symbol.items():
-            position_data = self.calculate_position_from_transactions(symbol_transactions)
-            
-            # Get existing position
+            self._save_symbol(
+                db, portfolio_id, symbol, positions.get(symbol), states.get(symbol),
+                self.replay_lots(symbol_transactions), symbol_transactions[-1]
+            )
+
+        db.commit()
+
+    def update_symbol_positions(self, db: Session, portfolio_id: int, symbols: Iterable[str]):
+        """Replay only the given symbols of a portfolio, e.g. after a back-dated edit or delete"""
+        symbols = set(symbols)
+        self._replay_symbols(db, portfolio_id, symbols)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another writer stored the lot state of a new symbol first; replay on top of it
+            db.rollback()
+            self._replay_symbols(db, portfolio_id, symbols)
+            db.commit()
+
+    def _replay_symbols(self, db: Session, portfolio_id: int, symbols: Iterable[str]):
+        for symbol in symbols:
+            transactions = db.query(Transaction).filter(
+                Transaction.portfolio_id == portfolio_id,
+                Transaction.symbol == symbol
+            ).order_by(Transaction.transaction_date, Transaction.id).all()
+
             position = db.query(Position).filter(
                 Position.portfolio_id == portfolio_id,
                 Position.symbol == symbol
             ).first()
+            state = db.query(PositionLotState).filter(
+                PositionLotState.portfolio_id == portfolio_id,
+                PositionLotState.symbol == symbol
+            ).with_for_update().first()
 
-            if position_data["quantity"] > 0:
-                # Update or create position
-                if position:
-                    position.quantity = position_data["quantity"]
-                    position.average_price = position_data["average_price"]
-                    position.total_invested = position_data["total_invested"]
-                else:
-                    # Get company name from latest transaction
-                    latest_transaction = symbol_transactions[-1]
-                    position = Position(
-                        symbol=symbol,
-                        company_name=latest_transaction.company_name,
-                        market=latest_transaction.market,
-                        quantity=position_data["quantity"],
-                        average_price=position_data["average_price"],
-                        total_invested=position_data["total_invested"],
-                        portfolio_id=portfolio_id
-                    )
-                    db.add(position)
-            else:
-                # Remove position if quantity is 0
+            if not transactions:
                 if position:
                     db.delete(position)
+                if state:
+                    db.delete(state)
+                continue
+
+            self._save_symbol(
+                db, portfolio_id, symbol, position, state, self.replay_lots(transactions), transactions[-1]
+            )
+
+    def apply_new_transaction(self, db: Session, transaction: Transaction):
+        """Update the position for a newly inserted transaction
+
+        When the transaction is the only one after the stored lot state, it is matched
+        against the stored open lots. A back-dated transaction, a missing lot state, a
+        changed cost basis method or a concurrent write replays only that symbol.
+        """
+        state = db.query(PositionLotState).filter(
+            PositionLotState.portfolio_id == transaction.portfolio_id,
+            PositionLotState.symbol == transaction.symbol
+        ).with_for_update().populate_existing().first()
 
+        if (
+            state is None
+            or state.cost_basis_method != CostBasisMethod(settings.COST_BASIS_METHOD).value
+            or (transaction.transaction_date, transaction.id)
+            <= (state.last_transaction_date, state.last_transaction_id)
+            or self._has_later_transactions(db, state, transaction)
+        ):
+            self.update_symbol_positions(db, transaction.portfolio_id, [transaction.symbol])
+            return
+
+        book = LotBook.loads(state.cost_basis_method, state.book)
+        self._apply(book, transaction)
+
+        # Save only if no other writer moved the stored cursor since it was read
+        claimed = db.execute(
+            update(PositionLotState)
+            .where(
+                PositionLotState.id == state.id,
+                PositionLotState.last_transaction_date == state.last_transaction_date,
+                PositionLotState.last_transaction_id == state.last_transaction_id
+            )
+            .values(
+                book=book.dumps(),
+                last_transaction_date=transaction.transaction_date,
+                last_transaction_id=transaction.id
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.rollback()
+            self.update_symbol_positions(db, transaction.portfolio_id, [transaction.symbol])
+            return
+
+        db.expire(state)
+        position = db.query(Position).filter(
+            Position.portfolio_id == transaction.portfolio_id,
+            Position.symbol == transaction.symbol
+        ).populate_existing().first()
+        self._save_position(
+            db, transaction.portfolio_id, transaction.symbol, position, self._position_data(book), transaction
+        )
         db.commit()
 
-    def calculate_portfolio_stats(self, portfolio: Portfolio) -> PortfolioWithStats:
+    def _has_later_transactions(self, db: Session, state: PositionLotState, transaction: Transaction) -> bool:
+        """Whether a transaction other than `transaction` sorts after the stored cursor"""
+        return db.query(
+            db.query(Transaction).filter(
+                Transaction.portfolio_id == state.portfolio_id,
+                Transaction.symbol == state.symbol,
+                Transaction.id != transaction.id,
+                or_(
+                    Transaction.transaction_date > state.last_transaction_date,
+                    and_(
+                        Transaction.transaction_date == state.last_transaction_date,
+                        Transaction.id > state.last_transaction_id
+                    )
+                )
+            ).exists()
+        ).scalar()
+
+    def get_position_lots(
+        self, db: Session, portfolio_id: int, symbol: str, current_price: Optional[Decimal] = None
+    ) -> Optional[PositionLots]:
+        """Open tax lots with realized and unrealized P&L, or None if the symbol was never traded"""
+        state = db.query(PositionLotState).filter(
+            PositionLotState.portfolio_id == portfolio_id,
+            PositionLotState.symbol == symbol
+        ).first()
+        if state is None or state.cost_basis_method != CostBasisMethod(settings.COST_BASIS_METHOD).value:
+            # Older data or a changed method: rebuild and keep the result
+            self.update_symbol_positions(db, portfolio_id, [symbol])
+            state = db.query(PositionLotState).filter(
+                PositionLotState.portfolio_id == portfolio_id,
+                PositionLotState.symbol == symbol
+            ).first()
+            if state is None:
+                return None
+
+        book = LotBook.loads(state.cost_basis_method, state.book)
+        lots = []
+        for quantity, cost, unit_cost, acquired, transaction_id in book.open_lots():
+            unrealized = None
+            if current_price is not None:
+                unrealized = (quantity * current_price).quantize(CENT) - cost
+            lots.append(TaxLot(
+                quantity=quantity,
+                cost=cost,
+                unit_cost=unit_cost,
+                acquired_date=acquired,
+                transaction_id=transaction_id,
+                unrealized_pnl=unrealized,
+            ))
+
+        unrealized_pnl = None
+        if current_price is not None:
+            unrealized_pnl = (book.total_quantity * current_price).quantize(CENT) - book.total_invested
+        return PositionLots(
+            symbol=symbol,
+            cost_basis_method=book.method.value,
+            quantity=book.total_quantity,
+            average_price=book.average_price,
+            total_invested=book.total_invested,
+            realized_pnl=book.realized_pnl,
+            dividends=book.dividends_received,
+            current_price=current_price,
+            unrealized_pnl=unrealized_pnl,
+            lots=lots,
+        )
+
+    def calculate_portfolio_stats(
+        self, portfolio: Portfolio, current_prices: Optional[Dict[str, Optional[Decimal]]] = None
+    ) -> PortfolioWithStats:
         """Calculate portfolio statistics with current market values"""
-        if not portfolio.positions:
-            return PortfolioWithStats(
+        return self.calculate_portfolios_stats([portfolio], current_prices)[0]
+
+    def calculate_portfolios_stats(
+        self, portfolios: List[Portfolio], current_prices: Optional[Dict[str, Optional[Decimal]]] = None
+    ) -> List[PortfolioWithStats]:
+        """Calculate stats for many portfolios from one shared price lookup"""
+        # Price the union of symbols once and share it across portfolios
+        if current_prices is None:
+            symbols = list(dict.fromkeys(
+                position.symbol for portfolio in portfolios for position in portfolio.positions
+            ))
+            current_prices = price_refresher.get_prices(symbols) if symbols else {}
+
+        stats = []
+        for portfolio in portfolios:
+            positions = portfolio.positions
+            total_value, total_invested, total_pnl, total_pnl_percentage = total_holdings(
+                [position.quantity for position in positions],
+                [current_prices.get(position.symbol) for position in positions],
+                [position.total_invested for position in positions],
+            )
+            stats.append(PortfolioWithStats(
                 id=portfolio.id,
                 name=portfolio.name,
                 description=portfolio.description,
@@ -107,69 +338,88 @@ class PortfolioCalculatorService:
                 owner_id=portfolio.owner_id,
                 created_at=portfolio.created_at,
                 updated_at=portfolio.updated_at,
-                total_value=Decimal('0'),
-                total_invested=Decimal('0'),
-                total_pnl=Decimal('0'),
-                total_pnl_percentage=Decimal('0'),
-                positions_count=0,
-                positions=[]
+                total_value=total_value,
+                total_invested=total_invested,
+                total_pnl=total_pnl,
+                total_pnl_percentage=total_pnl_percentage,
+                positions_count=len(positions),
+                positions=positions
+            ))
+        return stats
+
+    def calculate_positions_valuation(
+        self, portfolio: Portfolio, current_prices: Optional[Dict[str, Optional[Decimal]]] = None
+    ) -> PortfolioValuation:
+        """Price, value, P&L and weight of every position from one batched price lookup"""
+        positions = portfolio.positions
+        if current_prices is None:
+            symbols = [position.symbol for position in positions]
+            current_prices = price_refresher.get_prices(symbols) if symbols else {}
+        prices = [current_prices.get(position.symbol) for position in positions]
+
+        valuation = value_holdings(
+            [position.quantity for position in positions],
+            prices,
+            [position.total_invested for position in positions],
+        )
+
+        position_valuations = []
+        for index, (position, price) in enumerate(zip(positions, prices)):
+            position_valuation = PositionValuation(
+                symbol=position.symbol,
+                company_name=position.company_name,
+                market=position.market,
+                quantity=position.quantity,
+                average_price=position.average_price,
+                total_invested=position.total_invested,
+                current_price=price,
             )
+            # Without a price value, P&L and weight stay unknown rather than a 100% loss
+            if valuation.priced[index]:
+                position_valuation.current_value = from_cents(valuation.value[index])
+                position_valuation.pnl = from_cents(valuation.pnl[index])
+                position_valuation.pnl_percentage = from_percentage(valuation.pnl_percentage[index])
+                position_valuation.weight = from_percentage(valuation.weight[index])
+            position_valuations.append(position_valuation)
 
-        # Get current prices for all symbols
-        symbols = [pos.symbol for pos in portfolio.positions]
-        current_prices = market_service.get_current_prices(symbols)
-
-        total_value = Decimal('0')
-        total_invested = Decimal('0')
-
-        for position in portfolio.positions:
-            current_price = current_prices.get(position.symbol, Decimal('0'))
-            position_value = position.quantity * (current_price or Decimal('0'))
-            
-            total_value += position_value
-            total_invested += position.total_invested
-
-        total_pnl = total_value - total_invested
-        total_pnl_percentage = (total_pnl / total_invested * 100) if total_invested > 0 else Decimal('0')
-
-        return PortfolioWithStats(
-            id=portfolio.id,
-            name=portfolio.name,
-            description=portfolio.description,
-            is_default=portfolio.is_default,
-            owner_id=portfolio.owner_id,
-            created_at=portfolio.created_at,
-            updated_at=portfolio.updated_at,
-            total_value=total_value,
-            total_invested=total_invested,
-            total_pnl=total_pnl,
-            total_pnl_percentage=total_pnl_percentage,
-            positions_count=len(portfolio.positions),
-            positions=portfolio.positions
+        return PortfolioValuation(
+            portfolio_id=portfolio.id,
+            total_value=from_cents(valuation.total_value[0]),
+            total_invested=from_cents(valuation.total_invested[0]),
+            total_pnl=from_cents(valuation.total_pnl[0]),
+            total_pnl_percentage=from_percentage(valuation.total_pnl_percentage[0]),
+            positions=position_valuations,
         )
 
-    def calculate_position_pnl(self, position: Position, current_price: Decimal) -> Dict:
-        """Calculate P&L for a specific position"""
-        current_value = position.quantity * current_price
-        pnl = current_value - position.total_invested
-        pnl_percentage = (pnl / position.total_invested * 100) if position.total_invested > 0 else Decimal('0')
+    def calculate_position_pnl(self, position: Position, current_price: Optional[Decimal]) -> Dict:
+        """Calculate P&L for a specific position; unknown without a price"""
+        if current_price is None:
+            return {"current_price": None, "current_value": None, "pnl": None, "pnl_percentage": None}
+        valuation = value_holdings([position.quantity], [current_price], [position.total_invested])
 
         return {
             "current_price": current_price,
-            "current_value": current_value,
-            "pnl": pnl,
-            "pnl_percentage": pnl_percentage
+            "current_value": from_cents(valuation.value[0]),
+            "pnl": from_cents(valuation.pnl[0]),
+            "pnl_percentage": from_percentage(valuation.pnl_percentage[0])
         }
 
-    def get_portfolio_performance_history(self, portfolio_id: int, period: str = "1y") -> Dict:
+    def get_portfolio_performance_history(self, db: Session, portfolio_id: int, period: str = "1y") -> Dict:
         """Get portfolio performance history over time"""
-        # This would require storing daily portfolio values
-        # For now, return placeholder structure
-        return {
-            "dates": [],
-            "values": [],
-            "returns": []
-        }
+        start = period_start(period)
+
+        # Materialized snapshots answer with a single range scan
+        history = snapshot_service.get_performance(db, portfolio_id, start)
+        if history is not None:
+            return history
+
+        transactions = db.query(Transaction).filter(
+            Transaction.portfolio_id == portfolio_id
+        ).order_by(Transaction.transaction_date, Transaction.id).all()
+        split_factors = corporate_actions.split_factors(
+            db, portfolio_id, {transaction.symbol for transaction in transactions}
+        )
+        return portfolio_performance(transactions, start, market_service.history_store, split_factors)
 
 
 # Global instance
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import Position
+from .market_data import MarketDataService, market_service
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSnapshot:
+    """Immutable view of the latest refreshed prices"""
+
+    __slots__ = ("prices", "fetched_at", "version")
+
+    def __init__(self, prices: Mapping[str, Decimal], fetched_at: Mapping[str, float], version: int):
+        self.prices = MappingProxyType(dict(prices))
+        self.fetched_at = MappingProxyType(dict(fetched_at))
+        self.version = version
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[Decimal]:
+        """Return a price, or None if missing or older than max_age seconds"""
+        price = self.prices.get(symbol)
+        if price is None:
+            return None
+        if max_age is not None and time.time() - self.fetched_at[symbol] > max_age:
+            return None
+        return price
+
+
+class PriceRefreshScheduler:
+    """Periodically refreshes prices for every held symbol and publishes snapshots"""
+
+    def __init__(
+        self,
+        service: MarketDataService,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.service = service
+        self.session_factory = session_factory
+        self._snapshot = PriceSnapshot({}, {}, 0)
+        self._tasks: List[asyncio.Task] = []
+        self._publish_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> PriceSnapshot:
+        return self._snapshot
+
+    def held_symbols(self) -> Dict[str, List[str]]:
+        """Distinct symbols across all portfolios, grouped by market"""
+        db = self.session_factory()
+        try:
+            rows = db.query(Position.symbol, Position.market).distinct().all()
+        finally:
+            db.close()
+
+        by_market: Dict[str, List[str]] = {}
+        for symbol, market in rows:
+            by_market.setdefault(market, []).append(symbol)
+        return by_market
+
+    def publish(self, prices: Dict[str, Optional[Decimal]]):
+        """Swap in a new snapshot with the given prices merged over the current one"""
+        now = time.time()
+        # Market loops publish from executor threads; readers never take this lock
+        with self._publish_lock:
+            current = self._snapshot
+            merged = dict(current.prices)
+            fetched_at = dict(current.fetched_at)
+            moved = False
+            for symbol, price in prices.items():
+                if price is not None:
+                    moved = moved or merged.get(symbol) != price
+                    merged[symbol] = price
+                    fetched_at[symbol] = now
+            # The version only moves with prices, so it can stamp cached responses
+            version = current.version + 1 if moved else current.version
+            self._snapshot = PriceSnapshot(merged, fetched_at, version)
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
+        """Read prices from the snapshot, fetching only symbols it cannot serve"""
+        snapshot = self._snapshot
+        max_age = settings.PRICE_SNAPSHOT_MAX_AGE_SECONDS
+        prices = {symbol: snapshot.get(symbol, max_age) for symbol in symbols}
+        missing = [symbol for symbol, price in prices.items() if price is None]
+        if missing:
+            prices.update(self.service.get_current_prices(missing))
+        return prices
+
+    async def get_prices_async(self, symbols: List[str]) -> Dict[str, Optional[Decimal]]:
+        """Async get_prices: snapshot reads stay on the loop, misses go to the market data executor"""
+        snapshot = self._snapshot
+        max_age = settings.PRICE_SNAPSHOT_MAX_AGE_SECONDS
+        prices = {symbol: snapshot.get(symbol, max_age) for symbol in symbols}
+        missing = [symbol for symbol, price in prices.items() if price is None]
+        if missing:
+            prices.update(await self.service.get_current_prices_async(missing))
+        return prices
+
+    def refresh_market(self, market: str) -> int:
+        """Refresh every held symbol of a market; returns the number of symbols priced"""
+        symbols = self.held_symbols().get(market, [])
+        if not symbols:
+            return 0
+        prices = self.service.refresh_prices(symbols)
+        self.publish(prices)
+        return sum(1 for price in prices.values() if price is not None)
+
+    def _interval_for(self, market: str) -> float:
+        return settings.PRICE_REFRESH_INTERVAL_SECONDS.get(
+            market, settings.PRICE_REFRESH_DEFAULT_INTERVAL_SECONDS
+        )
+
+    def _with_jitter(self, delay: float) -> float:
+        jitter = settings.PRICE_REFRESH_JITTER
+        return max(0.0, delay * random.uniform(1 - jitter, 1 + jitter))
+
+    async def _run_market(self, market: str):
+        failures = 0
+        while True:
+            interval = self._interval_for(market)
+            try:
+                await self.service.run_in_executor(self.refresh_market, market, timeout=interval)
+                failures = 0
+                delay = interval
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failures += 1
+                delay = min(interval * 2 ** failures, settings.PRICE_REFRESH_MAX_BACKOFF_SECONDS)
+                logger.exception("Price refresh failed for market %s (attempt %d)", market, failures)
+            await asyncio.sleep(self._with_jitter(delay))
+
+    def start(self, markets: Optional[List[str]] = None):
+        """Start one refresh loop per market on the running event loop"""
+        if self._tasks:
+            return
+        markets = markets or list(settings.PRICE_REFRESH_INTERVAL_SECONDS)
+        self._tasks = [asyncio.create_task(self._run_market(market)) for market in markets]
+
+    async def stop(self):
+        """Cancel the refresh loops"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Global instance
+price_refresher = PriceRefreshScheduler(market_service)
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class _Flight:
+    """In-flight upstream load that concurrent callers can wait on"""
+
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class QuoteCache:
+    """Thread-safe TTL + LRU cache with single-flight loading"""
+
+    def __init__(self, max_entries: int = 5000, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.loads = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        # Caller must hold self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any, ttl: float):
+        # Caller must hold self._lock
+        if ttl <= 0:
+            return
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value) for a key, counting a hit or miss"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return found, value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """Store a value for `ttl` seconds"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key: Hashable):
+        """Drop a single key"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: float,
+        cache_if: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """Return a cached value or load it once, coalescing concurrent callers"""
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.loads += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and cache_if(flight.value):
+                    self._store(key, flight.value, ttl)
+                self._flights.pop(key, None)
+            flight.event.set()
+        return flight.value
+
+    def get_many_or_load(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[List[Hashable]], Dict[Hashable, Any]],
+        ttl_for: Callable[[Hashable], float],
+        cache_if: Callable[[Any], bool] = lambda value: True,
+    ) -> Dict[Hashable, Any]:
+        """Batch variant of get_or_load: one loader call for all keys not cached or in flight"""
+        results: Dict[Hashable, Any] = {}
+        owned: Dict[Hashable, _Flight] = {}
+        waiting: Dict[Hashable, _Flight] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                found, value = self._lookup(key)
+                if found:
+                    self.hits += 1
+                    results[key] = value
+                    continue
+                self.misses += 1
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                    owned[key] = flight
+                else:
+                    self.coalesced += 1
+                    waiting[key] = flight
+            if owned:
+                self.loads += 1
+
+        if owned:
+            error: Optional[BaseException] = None
+            loaded: Dict[Hashable, Any] = {}
+            try:
+                loaded = loader(list(owned))
+            except BaseException as exc:
+                error = exc
+            finally:
+                with self._lock:
+                    for key, flight in owned.items():
+                        flight.error = error
+                        flight.value = loaded.get(key)
+                        if error is None and cache_if(flight.value):
+                            self._store(key, flight.value, ttl_for(key))
+                        self._flights.pop(key, None)
+                for flight in owned.values():
+                    flight.event.set()
+            if error is not None:
+                raise error
+            for key, flight in owned.items():
+                results[key] = flight.value
+
+        for key, flight in waiting.items():
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            results[key] = flight.value
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+                "upstream_loads": self.loads,
+                "in_flight": len(self._flights),
+            }
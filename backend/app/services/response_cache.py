@@ -0,0 +1,56 @@
+import time
+from typing import Hashable, Optional, Tuple
+
+from ..core.config import settings
+from .price_refresher import PriceRefreshScheduler, price_refresher
+from .quote_cache import QuoteCache
+from .versions import PortfolioVersions, portfolio_versions
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches `etag`"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class PortfolioResponseCache:
+    """Serialized portfolio responses keyed by ETag
+
+    An ETag combines the portfolio's write stamp with the price snapshot version,
+    so a response stays valid until either changes. The price part also rolls over
+    every RESPONSE_CACHE_MAX_AGE_SECONDS, since symbols missing from the snapshot are
+    priced from the quote cache. Entries remember their owner, which lets a
+    request be answered before its ownership check hits the database.
+    """
+
+    def __init__(self, versions: PortfolioVersions, refresher: PriceRefreshScheduler, max_entries: int):
+        self.versions = versions
+        self.refresher = refresher
+        self.cache = QuoteCache(max_entries=max_entries)
+
+    def etag(self, kind: str, portfolio_id: int, variant: str = "") -> str:
+        """Strong ETag for a portfolio resource; reads only in-memory (or Redis) stamps"""
+        bucket = int(time.time() // settings.RESPONSE_CACHE_MAX_AGE_SECONDS)
+        prices = f"{self.versions.boot_id}.{self.refresher.snapshot.version}.{bucket}"
+        return f'"{kind}-{portfolio_id}-{self.versions.get(portfolio_id)}-{prices}{variant}"'
+
+    def get(self, key: Hashable, etag: str, owner_id: int) -> Tuple[bool, Optional[bytes]]:
+        """(owner verified, body) for a cached response with this exact ETag"""
+        found, entry = self.cache.get(key)
+        if not found or entry[0] != etag or entry[1] != owner_id:
+            return False, None
+        return True, entry[2]
+
+    def set(self, key: Hashable, etag: str, owner_id: int, body: bytes):
+        self.cache.set(key, (etag, owner_id, body), settings.RESPONSE_CACHE_MAX_AGE_SECONDS)
+
+
+# Global instance
+portfolio_response_cache = PortfolioResponseCache(
+    portfolio_versions, price_refresher, settings.RESPONSE_CACHE_MAX_ENTRIES
+)
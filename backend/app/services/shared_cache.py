@@ -0,0 +1,214 @@
+import json
+import time
+import uuid
+import zlib
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from ..core.config import settings
+
+try:
+    import redis
+except ImportError:  # Optional dependency, see the "redis" extra
+    redis = None
+
+
+_COMPRESS_THRESHOLD = 1024
+
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a cache value into a compact tagged byte string"""
+    if isinstance(value, Decimal):
+        return b"d" + str(value).encode("ascii")
+    payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(payload) > _COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(payload)
+    return b"j" + payload
+
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of encode_value"""
+    tag, body = data[:1], data[1:]
+    if tag == b"d":
+        return Decimal(body.decode("ascii"))
+    if tag == b"z":
+        body = zlib.decompress(body)
+    return json.loads(body)
+
+
+class SharedCache:
+    """Cross-process cache tier; this base class is the no-op used without Redis"""
+
+    enabled = False
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {}
+
+    def set_many(self, items: Dict[str, Tuple[Any, int]]) -> bool:
+        """Store values with TTLs in seconds; False when nothing was stored"""
+        return False
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any, ttl: int) -> bool:
+        return self.set_many({key: (value, ttl)})
+
+    def pop(self, key: str) -> Optional[Any]:
+        """Read and delete a key in one step, so only one worker ever gets its value"""
+        return None
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        """Claim the upstream fetch for a key; always granted without a shared tier"""
+        return True
+
+    def release_lock(self, key: str):
+        pass
+
+    def held_locks(self, keys: Iterable[str]) -> Set[str]:
+        """Keys whose upstream fetch another worker has claimed and not yet released"""
+        return set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local", "enabled": False}
+
+
+class RedisSharedCache(SharedCache):
+    """Redis-backed shared tier that degrades to a no-op while Redis is unreachable"""
+
+    enabled = True
+
+    def __init__(self, client, prefix: str = "pt:", retry_after: float = 30.0):
+        self.client = client
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        # Token of each lock this instance holds, so release never deletes another worker's lock
+        self._lock_tokens: Dict[str, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self):
+        self.errors += 1
+        self._down_until = time.monotonic() + self.retry_after
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys or not self._available():
+            return {}
+        try:
+            raw_values = self.client.mget([self.prefix + key for key in keys])
+        except Exception:
+            self._mark_down()
+            return {}
+
+        values = {}
+        for key, raw in zip(keys, raw_values):
+            if raw is None:
+                self.misses += 1
+                continue
+            try:
+                values[key] = decode_value(raw)
+                self.hits += 1
+            except Exception:
+                self.misses += 1
+        return values
+
+    def set_many(self, items: Dict[str, Tuple[Any, int]]) -> bool:
+        if not items or not self._available():
+            return False
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, (value, ttl) in items.items():
+                pipe.set(self.prefix + key, encode_value(value), ex=max(1, int(ttl)))
+            pipe.execute()
+        except Exception:
+            self._mark_down()
+            return False
+        return True
+
+    def pop(self, key: str) -> Optional[Any]:
+        if not self._available():
+            return None
+        try:
+            raw = self.client.getdel(self.prefix + key)
+        except Exception:
+            self._mark_down()
+            return None
+        if raw is None:
+            return None
+        try:
+            return decode_value(raw)
+        except Exception:
+            return None
+
+    def _lock_name(self, key: str) -> str:
+        return f"{self.prefix}lock:{key}"
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        if not self._available():
+            return True
+        token = uuid.uuid4().hex.encode("ascii")
+        try:
+            acquired = bool(self.client.set(self._lock_name(key), token, nx=True, px=max(1, int(ttl * 1000))))
+        except Exception:
+            self._mark_down()
+            return True
+        if acquired:
+            self._lock_tokens[key] = token
+        return acquired
+
+    def release_lock(self, key: str):
+        token = self._lock_tokens.pop(key, None)
+        if token is None or not self._available():
+            return
+        name = self._lock_name(key)
+        try:
+            # Compare and delete in one transaction: once our lock expired, another worker may hold it
+            with self.client.pipeline() as pipe:
+                pipe.watch(name)
+                if pipe.get(name) == token:
+                    pipe.multi()
+                    pipe.delete(name)
+                    pipe.execute()
+        except redis.WatchError:
+            pass
+        except Exception:
+            self._mark_down()
+
+    def held_locks(self, keys: Iterable[str]) -> Set[str]:
+        keys = list(keys)
+        if not keys or not self._available():
+            return set()
+        try:
+            raw_values = self.client.mget([self._lock_name(key) for key in keys])
+        except Exception:
+            self._mark_down()
+            return set()
+        return {key for key, raw in zip(keys, raw_values) if raw is not None}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "enabled": True,
+            "available": self._available(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+def get_shared_cache() -> SharedCache:
+    """Build the shared cache tier from settings, falling back to in-process only"""
+    if not settings.REDIS_URL or redis is None:
+        return SharedCache()
+    client = redis.Redis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+    )
+    return RedisSharedCache(client, prefix=settings.SHARED_CACHE_PREFIX)
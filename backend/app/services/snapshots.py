@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import Portfolio, PortfolioDailySnapshot, SnapshotJobRun, Transaction, TransactionType
+from .corporate_actions import corporate_actions
+from .market_data import market_service
+from .performance import performance_payload, portfolio_performance
+
+logger = logging.getLogger(__name__)
+
+
+def market_close_day(now: Optional[datetime] = None) -> date:
+    """Date of the latest market close in MARKET_TIMEZONE, whatever the server's timezone"""
+    local = (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(settings.MARKET_TIMEZONE))
+    if local.hour < settings.MARKET_CLOSE_HOUR:
+        return local.date() - timedelta(days=1)
+    return local.date()
+
+
+class SnapshotService:
+    """Materializes one value/invested/pnl/cash-flow row per portfolio per trading day"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, db: Session, portfolio_id: int, from_date: date):
+        """Flag snapshots on or after a back-dated change; the caller commits"""
+        first_day = db.query(func.min(PortfolioDailySnapshot.snapshot_date)).filter(
+            PortfolioDailySnapshot.portfolio_id == portfolio_id
+        ).scalar()
+        if first_day is not None and from_date < first_day:
+            # The change predates every snapshot, so the whole series is rebuilt
+            db.execute(delete(PortfolioDailySnapshot).where(PortfolioDailySnapshot.portfolio_id == portfolio_id))
+            return
+        db.execute(
+            update(PortfolioDailySnapshot)
+            .where(
+                PortfolioDailySnapshot.portfolio_id == portfolio_id,
+                PortfolioDailySnapshot.snapshot_date >= from_date,
+            )
+            .values(is_dirty=True)
+        )
+
+    def restated_from(
+        self, db: Session, portfolio_id: int, symbol: str, transaction_type: TransactionType, day: date
+    ) -> date:
+        """First day a write changes: a split restates every earlier holding of its symbol"""
+        if transaction_type != TransactionType.SPLIT:
+            return day
+        first_trade = db.query(func.min(Transaction.transaction_date)).filter(
+            Transaction.portfolio_id == portfolio_id,
+            Transaction.symbol == symbol
+        ).scalar()
+        return min(day, first_trade.date()) if first_trade is not None else day
+
+    def mark_restated(
+        self, db: Session, portfolio_id: int, symbol: str, transaction_type: TransactionType, day: date
+    ):
+        """mark_dirty from the first day a transaction write changes; the caller commits"""
+        self.mark_dirty(db, portfolio_id, self.restated_from(db, portfolio_id, symbol, transaction_type, day))
+
+    def restate_symbol(self, symbol: str):
+        """Mark snapshots dirty from the first trade of `symbol` in every portfolio that traded it
+
+        Registered with the history store, which calls it when the symbol's stored closes
+        were replaced on a new split or dividend basis.
+        """
+        db = SessionLocal()
+        try:
+            first_trades = db.query(Transaction.portfolio_id, func.min(Transaction.transaction_date)).filter(
+                Transaction.symbol == symbol
+            ).group_by(Transaction.portfolio_id).all()
+            for portfolio_id, first_trade in first_trades:
+                self.mark_dirty(db, portfolio_id, first_trade.date())
+            db.commit()
+        finally:
+            db.close()
+
+    def _recompute_from(self, db: Session, portfolio_id: int, first_trade: date) -> Optional[date]:
+        """First day that needs (re)computing: earliest dirty day or the last snapshot day"""
+        last_day, dirty_from = db.query(
+            func.max(PortfolioDailySnapshot.snapshot_date),
+            func.min(PortfolioDailySnapshot.snapshot_date).filter(PortfolioDailySnapshot.is_dirty.is_(True)),
+        ).filter(PortfolioDailySnapshot.portfolio_id == portfolio_id).one()
+
+        if last_day is None:
+            return first_trade
+        # The last row is redone in case it was written from an intraday close
+        start = last_day
+        if dirty_from is not None:
+            start = min(start, dirty_from)
+        return start
+
+    def refresh_portfolio(self, db: Session, portfolio_id: int, today: Optional[date] = None) -> int:
+        """Recompute dirty and missing days for one portfolio; returns rows written"""
+        today = today or market_close_day()
+        transactions = db.query(Transaction).filter(
+            Transaction.portfolio_id == portfolio_id
+        ).order_by(Transaction.transaction_date, Transaction.id).all()
+
+        if not transactions:
+            db.execute(delete(PortfolioDailySnapshot).where(PortfolioDailySnapshot.portfolio_id == portfolio_id))
+            db.commit()
+            return 0
+
+        start = self._recompute_from(db, portfolio_id, transactions[0].transaction_date.date())
+        if start > today:
+            return 0
+
+        split_factors = corporate_actions.split_factors(
+            db, portfolio_id, {transaction.symbol for transaction in transactions}
+        )
+        series = portfolio_performance(transactions, start, market_service.history_store, split_factors)
+        rows = [
+            {
+                "portfolio_id": portfolio_id,
+                "snapshot_date": date.fromisoformat(day),
+                "value": Decimal(str(value)),
+                "invested": Decimal(str(invested)),
+                "pnl": Decimal(str(value)) - Decimal(str(invested)),
+                "cash_flow": Decimal(str(cash_flow)),
+                "is_dirty": False,
+            }
+            for day, value, invested, cash_flow in zip(
+                series["dates"], series["values"], series["invested"], series["cash_flows"]
+            )
+            if day <= today.isoformat()
+        ]
+
+        db.execute(
+            delete(PortfolioDailySnapshot).where(
+                PortfolioDailySnapshot.portfolio_id == portfolio_id,
+                PortfolioDailySnapshot.snapshot_date >= start,
+            )
+        )
+        if rows:
+            # executemany bulk insert, no ORM identity map
+            db.execute(insert(PortfolioDailySnapshot), rows)
+        db.commit()
+        return len(rows)
+
+    def run_end_of_day(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Refresh snapshots for every portfolio"""
+        db = SessionLocal()
+        stats = {"portfolios": 0, "rows": 0, "failed": 0}
+        try:
+            portfolio_ids = [portfolio_id for (portfolio_id,) in db.query(Portfolio.id)]
+            for portfolio_id in portfolio_ids:
+                try:
+                    stats["rows"] += self.refresh_portfolio(db, portfolio_id, today)
+                    stats["portfolios"] += 1
+                except Exception:
+                    db.rollback()
+                    stats["failed"] += 1
+                    logger.exception("Snapshot refresh failed for portfolio %s", portfolio_id)
+        finally:
+            db.close()
+        return stats
+
+    def claim_run(self, db: Session, run_date: date) -> bool:
+        """Claim the end-of-day run for `run_date`; False when another worker already has it"""
+        db.add(SnapshotJobRun(run_date=run_date))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    def run_scheduled(self, run_date: date) -> Optional[Dict[str, int]]:
+        """run_end_of_day once across all workers; None when another worker claimed `run_date`"""
+        db = SessionLocal()
+        try:
+            claimed = self.claim_run(db, run_date)
+        finally:
+            db.close()
+        if not claimed:
+            return None
+        return self.run_end_of_day(run_date)
+
+    def get_performance(self, db: Session, portfolio_id: int, start: Optional[date]) -> Optional[Dict[str, List]]:
+        """Serve performance from snapshots with one indexed range scan, or None if not materialized"""
+        query = db.query(
+            PortfolioDailySnapshot.snapshot_date,
+            PortfolioDailySnapshot.value,
+            PortfolioDailySnapshot.invested,
+            PortfolioDailySnapshot.cash_flow,
+            PortfolioDailySnapshot.is_dirty,
+        ).filter(PortfolioDailySnapshot.portfolio_id == portfolio_id)
+        if start is not None:
+            query = query.filter(PortfolioDailySnapshot.snapshot_date >= start)
+        rows = query.order_by(PortfolioDailySnapshot.snapshot_date).all()
+
+        if not rows or any(row.is_dirty for row in rows):
+            return None
+        if (market_close_day() - rows[-1].snapshot_date).days > settings.SNAPSHOT_MAX_LAG_DAYS:
+            return None
+
+        return performance_payload(
+            np.array([row.snapshot_date for row in rows], dtype="datetime64[D]"),
+            np.array([float(row.value) for row in rows]),
+            np.array([float(row.invested) for row in rows]),
+            np.array([float(row.cash_flow) for row in rows]),
+        )
+
+    async def run_daily(self):
+        """Run the end-of-day job every day at SNAPSHOT_JOB_HOUR_UTC, in whichever worker claims it first"""
+        while True:
+            now = datetime.now(timezone.utc)
+            next_run = now.replace(hour=settings.SNAPSHOT_JOB_HOUR_UTC, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            run_date = market_close_day(next_run)
+            try:
+                stats = await asyncio.to_thread(self.run_scheduled, run_date)
+                if stats is None:
+                    logger.info("Portfolio snapshots for %s run by another worker", run_date)
+                else:
+                    logger.info("Portfolio snapshots refreshed: %s", stats)
+            except Exception:
+                logger.exception("End-of-day snapshot job failed")
+
+    def start(self):
+        """Schedule the daily job on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_daily())
+
+    async def stop(self):
+        """Cancel the daily job and wait for it to unwind"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+# Global instance
+snapshot_service = SnapshotService()
+market_service.history_store.add_rebase_listener(snapshot_service.restate_symbol)
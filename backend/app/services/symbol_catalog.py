@@ -0,0 +1,161 @@
+import csv
+import gzip
+import io
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "symbols.csv")
+
+
+class SymbolInfo(NamedTuple):
+    symbol: str
+    name: str
+    market: str
+    currency: str
+    sector: str
+    lot_size: int
+
+
+class _Dictionary:
+    """Maps repeated strings (markets, currencies, sectors) to small integer codes"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _open_catalog(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+
+class SymbolCatalog:
+    """Reference data for every listed instrument, loaded on first use
+
+    Rows are held column-wise: tickers in one sorted list for bisect lookups,
+    names in a single UTF-8 blob with offsets, repeated strings as array codes,
+    so each instrument costs roughly a hundred bytes instead of a dict per row.
+    The source is a CSV (optionally gzip-compressed) with
+    symbol,name,market,currency,sector,lot_size,popular columns.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or DEFAULT_CATALOG_PATH
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        rows: List[Tuple[str, str, str, str, str, int, bool]] = []
+        with _open_catalog(self.path) as catalog:
+            for row in csv.DictReader(catalog):
+                symbol = row["symbol"].strip().upper()
+                if not symbol:
+                    continue
+                rows.append((
+                    symbol,
+                    (row.get("name") or symbol).strip(),
+                    (row.get("market") or "").strip().upper(),
+                    (row.get("currency") or "").strip().upper(),
+                    (row.get("sector") or "").strip(),
+                    int(row.get("lot_size") or 1),
+                    (row.get("popular") or "").strip() in ("1", "true", "yes"),
+                ))
+
+        # Popular symbols keep catalog order; everything else is sorted for bisect
+        popular: Dict[str, List[str]] = {}
+        for symbol, _, market, _, _, _, is_popular in rows:
+            if is_popular:
+                popular.setdefault(market, []).append(symbol)
+        rows.sort(key=lambda row: row[0])
+
+        markets, currencies, sectors = _Dictionary(), _Dictionary(), _Dictionary()
+        names = bytearray()
+        name_offsets = array("I", [0])
+        market_codes, currency_codes, sector_codes = array("B"), array("B"), array("H")
+        lot_sizes = array("I")
+        symbols: List[str] = []
+        for symbol, name, market, currency, sector, lot_size, _ in rows:
+            if symbols and symbols[-1] == symbol:
+                continue
+            symbols.append(symbol)
+            names += name.encode("utf-8")
+            name_offsets.append(len(names))
+            market_codes.append(markets.encode(market))
+            currency_codes.append(currencies.encode(currency))
+            sector_codes.append(sectors.encode(sector))
+            lot_sizes.append(lot_size)
+
+        self._symbols = symbols
+        self._names = bytes(names)
+        self._name_offsets = name_offsets
+        self._markets, self._market_codes = markets.values, market_codes
+        self._currencies, self._currency_codes = currencies.values, currency_codes
+        self._sectors, self._sector_codes = sectors.values, sector_codes
+        self._lot_sizes = lot_sizes
+        self._popular = popular
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+
+    def _index(self, symbol: str) -> Optional[int]:
+        self._ensure_loaded()
+        symbol = symbol.upper()
+        position = bisect_left(self._symbols, symbol)
+        if position < len(self._symbols) and self._symbols[position] == symbol:
+            return position
+        return None
+
+    def _name(self, index: int) -> str:
+        return self._names[self._name_offsets[index]:self._name_offsets[index + 1]].decode("utf-8")
+
+    def _info(self, index: int) -> SymbolInfo:
+        return SymbolInfo(
+            self._symbols[index],
+            self._name(index),
+            self._markets[self._market_codes[index]],
+            self._currencies[self._currency_codes[index]],
+            self._sectors[self._sector_codes[index]],
+            self._lot_sizes[index],
+        )
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self._index(symbol) is not None
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        """Reference data for a symbol, or None if it is not listed"""
+        index = self._index(symbol)
+        return None if index is None else self._info(index)
+
+    def markets(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._markets)
+
+    def popular(self, market: str) -> Dict[str, str]:
+        """Popular symbols of a market mapped to company names, in catalog order"""
+        self._ensure_loaded()
+        return {symbol: self._name(self._index(symbol)) for symbol in self._popular.get(market, [])}
+
+    def entries(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield (symbol, name, market) for every instrument"""
+        self._ensure_loaded()
+        for index, symbol in enumerate(self._symbols):
+            yield symbol, self._name(index), self._markets[self._market_codes[index]]
@@ -0,0 +1,130 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN = re.compile(r"[A-Z0-9]+")
+
+# Ranking tiers, best first
+_EXACT, _TICKER_PREFIX, _NAME_PREFIX, _NAME_SUBSTRING = range(4)
+
+
+def fold(text: str) -> str:
+    """Uppercase and strip accents so "Itaú" and "ITAU" compare equal"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).upper()
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _key(market: str, text: str) -> str:
+    return f"{market}|{text}"
+
+
+def _prefix_range(keys: List[str], prefix: str) -> Tuple[int, int]:
+    """Index range of the sorted `keys` that start with `prefix`"""
+    low = bisect_left(keys, prefix)
+    # U+FFFF sorts after every character that can follow the prefix
+    high = bisect_left(keys, prefix + "\uffff", low)
+    return low, high
+
+
+class SymbolSearchIndex:
+    """In-memory autocomplete index over a symbol catalog
+
+    Built once; every lookup is a bisect over sorted keys or a set intersection
+    of trigram posting lists, so cost does not grow with a linear scan of the catalog.
+    Keys are namespaced by market so a search never walks another market's entries.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str]]):
+        self.symbols: List[str] = []
+        folded_names: List[str] = []
+
+        ticker_keys: List[Tuple[str, int]] = []
+        token_keys: List[Tuple[str, int]] = []
+        self._trigram_postings: Dict[str, List[int]] = {}
+
+        for entry_id, (symbol, name, market) in enumerate(entries):
+            self.symbols.append(symbol)
+
+            ticker = fold(symbol)
+            ticker_keys.append((_key(market, ticker), entry_id))
+            base = ticker.split(".", 1)[0]
+            if base != ticker:
+                # "PETR4" finds "PETR4.SA"
+                ticker_keys.append((_key(market, base), entry_id))
+
+            folded = " ".join(_TOKEN.findall(fold(name)))
+            folded_names.append(folded)
+            for token in set(folded.split()):
+                token_keys.append((_key(market, token), entry_id))
+            for gram in set().union(*(_trigrams(token) for token in folded.split())):
+                self._trigram_postings.setdefault(_key(market, gram), []).append(entry_id)
+
+        ticker_keys.sort()
+        token_keys.sort()
+        self._ticker_keys = [key for key, _ in ticker_keys]
+        self._ticker_ids = [entry_id for _, entry_id in ticker_keys]
+        self._token_keys = [key for key, _ in token_keys]
+        self._token_ids = [entry_id for _, entry_id in token_keys]
+        self._folded_names = folded_names
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _ticker_matches(self, market: str, query: str, ranks: Dict[int, int], max_candidates: int):
+        query = _key(market, query)
+        low, high = _prefix_range(self._ticker_keys, query)
+        for position in range(low, min(high, low + max_candidates)):
+            entry_id = self._ticker_ids[position]
+            tier = _EXACT if self._ticker_keys[position] == query else _TICKER_PREFIX
+            if tier < ranks.get(entry_id, _NAME_SUBSTRING + 1):
+                ranks[entry_id] = tier
+
+    def _token_prefix_ids(self, market: str, token: str, max_candidates: int) -> Set[int]:
+        low, high = _prefix_range(self._token_keys, _key(market, token))
+        return set(self._token_ids[low:min(high, low + max_candidates)])
+
+    def _name_matches(self, market: str, tokens: List[str], ranks: Dict[int, int], max_candidates: int):
+        # Every query word must prefix some word of the name
+        matched: Optional[Set[int]] = None
+        for token in sorted(tokens, key=len, reverse=True):
+            ids = self._token_prefix_ids(market, token, max_candidates)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return
+        for entry_id in matched:
+            ranks.setdefault(entry_id, _NAME_PREFIX)
+
+    def _substring_matches(self, market: str, text: str, ranks: Dict[int, int], max_candidates: int):
+        postings = [self._trigram_postings.get(_key(market, gram)) for gram in _trigrams(text)]
+        if not postings or any(posting is None for posting in postings):
+            return
+        # The rarest trigram bounds the candidates; confirm each with a real substring check
+        found = 0
+        for entry_id in min(postings, key=len):
+            if text in self._folded_names[entry_id] and entry_id not in ranks:
+                ranks[entry_id] = _NAME_SUBSTRING
+                found += 1
+                if found >= max_candidates:
+                    return
+
+    def search(self, market: str, query: str, limit: int = 20, max_candidates: int = 200) -> List[str]:
+        """Ranked symbols: exact ticker, ticker prefix, name word prefix, then name substring"""
+        folded = fold(query).strip()
+        tokens = _TOKEN.findall(folded)
+        if not tokens or limit <= 0:
+            return []
+
+        ranks: Dict[int, int] = {}
+        self._ticker_matches(market, folded.replace(" ", ""), ranks, max_candidates)
+        self._name_matches(market, tokens, ranks, max_candidates)
+        # Infix matches inside a single word ("BRAS" in "PETROBRAS")
+        if len(ranks) < limit and len(tokens) == 1 and len(tokens[0]) >= 3:
+            self._substring_matches(market, tokens[0], ranks, limit - len(ranks))
+
+        best = sorted(ranks, key=lambda entry_id: (ranks[entry_id], len(self.symbols[entry_id]), self.symbols[entry_id]))
+        return [self.symbols[entry_id] for entry_id in best[:limit]]
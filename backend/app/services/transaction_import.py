@@ -0,0 +1,253 @@
+import codecs
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import Transaction, TransactionType
+from ..schemas.transaction import TransactionBase
+from .corporate_actions import mark_splits_changed
+from .market_data import market_for_symbol, market_service
+from .portfolio_calculator import portfolio_calculator
+from .snapshots import snapshot_service
+from .versions import mark_changed
+
+
+_CSV_ALIASES = {
+    "date": "transaction_date",
+    "type": "transaction_type",
+    "name": "company_name",
+    "ticker": "symbol",
+}
+
+_OFX_TRADES = {
+    "BUYSTOCK": TransactionType.BUY,
+    "BUYMF": TransactionType.BUY,
+    "BUYOTHER": TransactionType.BUY,
+    "SELLSTOCK": TransactionType.SELL,
+    "SELLMF": TransactionType.SELL,
+    "SELLOTHER": TransactionType.SELL,
+}
+
+_OFX_TAG = re.compile(r"<(/?)([A-Z0-9.]+)>([^<]*)")
+
+
+def _csv_rows(stream: IO[bytes]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (line number, row) pairs, decoding the upload incrementally"""
+    text = codecs.getreader("utf-8-sig")(stream)
+    reader = csv.DictReader(text)
+    for row in reader:
+        normalized = {}
+        for key, value in row.items():
+            if key is None:
+                continue
+            key = key.strip().lower()
+            normalized[_CSV_ALIASES.get(key, key)] = (value or "").strip()
+        yield reader.line_num, normalized
+
+
+def _ofx_tokens(stream: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[Tuple[bool, str, str]]:
+    """Yield (is_closing, tag, value) from an OFX (SGML or XML) file in fixed-size chunks"""
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk.decode("latin-1")
+        # Keep the trailing, possibly incomplete, element for the next chunk
+        cut = pending.rfind("<")
+        complete, pending = pending[:cut], pending[cut:]
+        for match in _OFX_TAG.finditer(complete):
+            yield match.group(1) == "/", match.group(2), match.group(3).strip()
+    for match in _OFX_TAG.finditer(pending):
+        yield match.group(1) == "/", match.group(2), match.group(3).strip()
+
+
+def _parse_ofx_date(value: str) -> str:
+    digits = value[:14]
+    if len(digits) >= 14:
+        return datetime.strptime(digits, "%Y%m%d%H%M%S").isoformat()
+    return datetime.strptime(value[:8], "%Y%m%d").isoformat()
+
+
+def _ofx_securities(stream: IO[bytes]) -> Dict[str, str]:
+    """First pass: map security ids (CUSIP/ISIN) to tickers from SECLIST"""
+    tickers: Dict[str, str] = {}
+    unique_id: Optional[str] = None
+    for closing, tag, value in _ofx_tokens(stream):
+        if closing:
+            if tag in ("STOCKINFO", "MFINFO", "OTHERINFO", "SECINFO"):
+                unique_id = None
+            continue
+        if tag == "UNIQUEID":
+            unique_id = value
+        elif tag == "TICKER" and unique_id:
+            tickers[unique_id] = value
+    return tickers
+
+
+def _ofx_rows(stream: IO[bytes]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (trade number, row) pairs from OFX investment transactions"""
+    tickers = _ofx_securities(stream)
+    stream.seek(0)
+
+    current: Optional[Dict[str, str]] = None
+    index = 0
+    fees = Decimal("0")
+    for closing, tag, value in _ofx_tokens(stream):
+        if tag in _OFX_TRADES:
+            if not closing:
+                current = {"transaction_type": _OFX_TRADES[tag].value}
+                fees = Decimal("0")
+            elif current is not None:
+                index += 1
+                current["fees"] = str(fees)
+                yield index, current
+                current = None
+            continue
+        if current is None or closing:
+            continue
+        if tag == "DTTRADE":
+            try:
+                current["transaction_date"] = _parse_ofx_date(value)
+            except ValueError:
+                # Left unset so the row is reported by validation
+                pass
+        elif tag == "UNIQUEID":
+            current["symbol"] = tickers.get(value, value)
+        elif tag == "UNITS":
+            current["quantity"] = value.lstrip("-")
+        elif tag == "UNITPRICE":
+            current["price"] = value
+        elif tag in ("COMMISSION", "FEES", "TAXES"):
+            try:
+                fees += abs(Decimal(value))
+            except InvalidOperation:
+                pass
+        elif tag == "MEMO":
+            current["notes"] = value
+
+
+class TransactionImporter:
+    """Streams CSV/OFX uploads into batched transaction inserts"""
+
+    def __init__(self, chunk_size: Optional[int] = None, max_errors: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.max_errors = max_errors or settings.IMPORT_MAX_ERRORS
+
+    def _rows(self, stream: IO[bytes], file_format: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+        if file_format == "csv":
+            return _csv_rows(stream)
+        if file_format == "ofx":
+            return _ofx_rows(stream)
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+    def _validate(self, row: Dict[str, str]) -> TransactionBase:
+        data = {key: value for key, value in row.items() if value != ""}
+        if "transaction_type" in data:
+            data["transaction_type"] = data["transaction_type"].lower()
+        if "symbol" in data:
+            data["symbol"] = data["symbol"].upper()
+            data.setdefault("market", market_for_symbol(data["symbol"]))
+        return TransactionBase(**data)
+
+    def _company_names(self, stream: IO[bytes], file_format: str) -> Dict[str, Optional[str]]:
+        """First pass: resolve every symbol without a company name, before anything is written"""
+        symbols = {
+            row["symbol"].upper()
+            for _, row in self._rows(stream, file_format)
+            if row.get("symbol") and not row.get("company_name")
+        }
+        stream.seek(0)
+        symbols = sorted(symbols)
+        return dict(zip(symbols, market_service.executor.map(market_service.get_company_name, symbols)))
+
+    def import_file(self, db: Session, portfolio_id: int, stream: IO[bytes], file_format: str) -> Dict:
+        """Import a whole file with one position recompute at the end
+
+        Upstream name lookups run in a pass of their own, so the write transaction
+        (the database lock on SQLite) is never held across provider calls.
+        """
+        report = {"imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+        company_names = self._company_names(stream, file_format)
+        symbols = set()
+        split_symbols = set()
+        earliest: Optional[date] = None
+
+        def record_error(line: int, message: str):
+            report["failed"] += 1
+            if len(report["errors"]) < self.max_errors:
+                report["errors"].append({"row": line, "error": message})
+            else:
+                report["errors_truncated"] = True
+
+        chunk: List[Tuple[int, TransactionBase]] = []
+
+        def flush():
+            nonlocal earliest
+            rows = []
+            for line, item in chunk:
+                if item.transaction_type == TransactionType.SPLIT and item.quantity <= 0:
+                    record_error(line, "Split ratio (quantity) must be positive")
+                    continue
+                if not item.company_name:
+                    # Normally resolved by the first pass; once per symbol otherwise
+                    if item.symbol not in company_names:
+                        company_names[item.symbol] = market_service.get_company_name(item.symbol)
+                    if company_names[item.symbol] is None:
+                        record_error(line, f"Invalid symbol: {item.symbol}")
+                        continue
+                    item.company_name = company_names[item.symbol]
+
+                rows.append({
+                    **item.dict(),
+                    "total_amount": item.quantity * item.price,
+                    "portfolio_id": portfolio_id,
+                })
+                symbols.add(item.symbol)
+                if item.transaction_type == TransactionType.SPLIT:
+                    split_symbols.add(item.symbol)
+                trade_day = item.transaction_date.date()
+                earliest = trade_day if earliest is None else min(earliest, trade_day)
+
+            if rows:
+                # Single executemany per chunk
+                db.execute(insert(Transaction), rows)
+                report["imported"] += len(rows)
+            chunk.clear()
+
+        for line, row in self._rows(stream, file_format):
+            try:
+                chunk.append((line, self._validate(row)))
+            except ValidationError as exc:
+                record_error(line, "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                    for error in exc.errors()
+                ))
+                continue
+            if len(chunk) >= self.chunk_size:
+                flush()
+        flush()
+
+        for symbol in split_symbols:
+            earliest = snapshot_service.restated_from(db, portfolio_id, symbol, TransactionType.SPLIT, earliest)
+        if earliest is not None:
+            snapshot_service.mark_dirty(db, portfolio_id, earliest)
+            mark_changed(db, portfolio_id)
+            mark_splits_changed(db, portfolio_id, split_symbols)
+        db.commit()
+
+        if symbols:
+            portfolio_calculator.update_symbol_positions(db, portfolio_id, symbols)
+
+        return report
+
+
+# Global instance
+transaction_importer = TransactionImporter()
@@ -0,0 +1,178 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUANTITY_SCALE = 10_000  # positions.quantity is Numeric(10, 4)
+PRICE_SCALE = 1_000_000  # prices are carried to the micro-unit, finer than any tick size
+CENTS = 100
+PERCENT_SCALE = 10_000  # pnl percentages carry 4 decimals
+
+# Both partial products (quantity * integer price, quantity * price fraction) must fit in int64
+_MAX_PRODUCT = 9 * 10 ** 18
+
+
+class Valuation(NamedTuple):
+    """Fixed-point results: money in cents, percentages in 1/10000 of a percent
+
+    Lines where `priced` is False have no known price; their value, pnl, pnl% and
+    weight are placeholders that callers report as unknown.
+    """
+
+    priced: np.ndarray
+    value: np.ndarray
+    pnl: np.ndarray
+    pnl_percentage: np.ndarray
+    weight: np.ndarray
+    total_value: np.ndarray
+    total_invested: np.ndarray
+    total_pnl: np.ndarray
+    total_pnl_percentage: np.ndarray
+
+
+ONE_CENT = Decimal("0.01")
+ONE_PERCENT_UNIT = Decimal(1).scaleb(-4)
+
+
+def to_fixed(values: Iterable[Optional[Decimal]], scale: int, count: int = -1) -> np.ndarray:
+    """Scale decimals to int64 fixed-point; None becomes 0
+
+    Goes through float64, which is exact here: quantities have at most 10 significant
+    digits and prices are rounded to the micro-unit.
+    """
+    floats = np.fromiter((0.0 if value is None else float(value) for value in values), dtype=np.float64, count=count)
+    return np.rint(floats * scale).astype(np.int64)
+
+
+def from_cents(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def from_percentage(value) -> Decimal:
+    return Decimal(int(value)).scaleb(-4)
+
+
+def _round_half_even(quotient: np.ndarray, remainder: np.ndarray, divisor) -> np.ndarray:
+    """Round quotient + remainder / divisor (0 <= remainder < divisor) to the nearest even integer on ties"""
+    twice = 2 * remainder
+    up = (twice > divisor) | ((twice == divisor) & (quotient % 2 == 1))
+    return quotient + up
+
+
+def _percentage(pnl: np.ndarray, invested: np.ndarray) -> np.ndarray:
+    """pnl / invested * 100 in 1/PERCENT_SCALE units, 0 where nothing is invested
+
+    A ratio rather than money, so float64 is precise enough and cannot overflow.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(invested > 0, pnl / np.where(invested > 0, invested, 1), 0.0)
+    return np.rint(ratio * (100 * PERCENT_SCALE)).astype(np.int64)
+
+
+def value_positions(
+    quantity: np.ndarray,
+    price: np.ndarray,
+    invested: np.ndarray,
+    groups: Optional[np.ndarray] = None,
+    group_count: int = 1,
+    priced: Optional[np.ndarray] = None,
+) -> Valuation:
+    """Value, pnl, pnl% and weight per position, and totals per group (portfolio), in one vectorized pass
+
+    `quantity` is in 1/QUANTITY_SCALE units, `price` in 1/PRICE_SCALE units and
+    `invested` in cents. Each position value is rounded half-even to the cent and
+    totals are sums of those rounded values, so totals always foot to the lines.
+    Positions outside the `priced` mask count towards total invested only: they
+    are left out of total value, total pnl and the weight denominator.
+    """
+    if priced is None:
+        priced = np.ones(quantity.size, dtype=bool)
+
+    # quantity * price split so no intermediate leaves int64:
+    # whole = quantity * integer price   (1e-4 currency units)
+    # fraction = quantity * price fraction (1e-10 currency units)
+    whole_price, fraction_price = np.divmod(price, PRICE_SCALE)
+    bound = np.abs(quantity).astype(np.float64) * np.maximum(whole_price, PRICE_SCALE)
+    if bound.size and bound.max() >= _MAX_PRODUCT:
+        raise OverflowError("Position outside the fixed-point valuation range")
+    whole = quantity * whole_price
+    fraction = quantity * fraction_price
+
+    # value (1e-10 units) = whole * 1e6 + fraction; cents = value / 1e8
+    whole_cents, whole_rest = np.divmod(whole, 100)
+    quotient, remainder = np.divmod(whole_rest * PRICE_SCALE + fraction, 10 ** 8)
+    value = np.where(priced, _round_half_even(whole_cents + quotient, remainder, 10 ** 8), 0)
+
+    pnl = value - invested
+    pnl_percentage = _percentage(pnl, invested)
+
+    if groups is None:
+        groups = np.zeros(quantity.size, dtype=np.intp)
+    total_value = np.zeros(group_count, dtype=np.int64)
+    total_invested = np.zeros(group_count, dtype=np.int64)
+    priced_invested = np.zeros(group_count, dtype=np.int64)
+    np.add.at(total_value, groups, value)
+    np.add.at(total_invested, groups, invested)
+    np.add.at(priced_invested, groups, np.where(priced, invested, 0))
+    total_pnl = total_value - priced_invested
+
+    return Valuation(
+        priced=priced,
+        value=value,
+        pnl=pnl,
+        pnl_percentage=pnl_percentage,
+        weight=_percentage(value, total_value[groups]),
+        total_value=total_value,
+        total_invested=total_invested,
+        total_pnl=total_pnl,
+        total_pnl_percentage=_percentage(total_pnl, priced_invested),
+    )
+
+
+def value_holdings(
+    quantities: Sequence[Decimal],
+    prices: Sequence[Optional[Decimal]],
+    invested: Sequence[Decimal],
+    groups: Optional[Sequence[int]] = None,
+    group_count: int = 1,
+) -> Valuation:
+    """value_positions over Decimal inputs; a missing price leaves the position unpriced"""
+    count = len(quantities)
+    return value_positions(
+        to_fixed(quantities, QUANTITY_SCALE, count),
+        to_fixed(prices, PRICE_SCALE, count),
+        to_fixed(invested, CENTS, count),
+        None if groups is None else np.asarray(groups, dtype=np.intp),
+        group_count,
+        np.fromiter((price is not None for price in prices), dtype=bool, count=count),
+    )
+
+
+def total_holdings(
+    quantities: Sequence[Decimal],
+    prices: Sequence[Optional[Decimal]],
+    invested: Sequence[Decimal],
+) -> Tuple[Decimal, Decimal, Decimal, Decimal]:
+    """Total value, invested, pnl and pnl% of one portfolio, summed in Decimal
+
+    Rounds each line half-even to the cent like value_positions, so both report the
+    same cents, and like it leaves unpriced positions out of value and pnl. For
+    totals over ORM rows this is cheaper than the kernel: building its arrays costs
+    a float(Decimal) per field, more than the Decimal sum it replaces.
+    """
+    total_value = Decimal(0)
+    total_invested = Decimal(0)
+    priced_invested = Decimal(0)
+    for quantity, price, line_invested in zip(quantities, prices, invested):
+        if price is not None:
+            total_value += (quantity * price).quantize(ONE_CENT, ROUND_HALF_EVEN)
+            priced_invested += line_invested
+        total_invested += line_invested
+    total_invested = total_invested.quantize(ONE_CENT, ROUND_HALF_EVEN)
+    total_value = total_value.quantize(ONE_CENT)
+    total_pnl = total_value - priced_invested.quantize(ONE_CENT, ROUND_HALF_EVEN)
+    if priced_invested > 0:
+        total_pnl_percentage = (total_pnl * 100 / priced_invested).quantize(ONE_PERCENT_UNIT, ROUND_HALF_EVEN)
+    else:
+        total_pnl_percentage = Decimal(0).scaleb(-4)
+    return total_value, total_invested, total_pnl, total_pnl_percentage
@@ -0,0 +1,140 @@
+import itertools
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models import Portfolio, Position, Transaction, User
+from .market_data import market_service
+from .shared_cache import SharedCache
+
+# Long enough to outlive any cached response; an expired stamp is simply re-issued
+VERSION_TTL_SECONDS = 7 * 24 * 3600
+
+
+class PortfolioVersions:
+    """Version stamps bumped whenever a committed session wrote a portfolio, its positions or transactions
+
+    Stamps are opaque strings, unique per process and write, so two workers can never
+    issue the same stamp for different data. With Redis configured they are shared,
+    so every worker sees a write made by any other.
+    """
+
+    def __init__(self, shared_cache: SharedCache):
+        self.shared_cache = shared_cache
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._counter = itertools.count(1)
+        self._local: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Set[int]], None]] = []
+
+    def _new_stamp(self) -> str:
+        return f"{self.boot_id}.{next(self._counter)}"
+
+    def _key(self, portfolio_id: int) -> str:
+        return f"version:portfolio:{portfolio_id}"
+
+    def get(self, portfolio_id: int) -> str:
+        """Current stamp of a portfolio; no database access"""
+        if self.shared_cache.enabled:
+            stamp = self.shared_cache.get(self._key(portfolio_id))
+            if stamp is not None:
+                return stamp
+        with self._lock:
+            stamp = self._local.get(portfolio_id)
+            if stamp is None:
+                stamp = self._local[portfolio_id] = self._new_stamp()
+        if self.shared_cache.enabled:
+            self.shared_cache.set(self._key(portfolio_id), stamp, VERSION_TTL_SECONDS)
+        return stamp
+
+    def get_many(self, portfolio_ids: Iterable[int]) -> Dict[int, str]:
+        """Current stamps of several portfolios in one shared-tier round trip"""
+        portfolio_ids = list(portfolio_ids)
+        stamps: Dict[int, str] = {}
+        if self.shared_cache.enabled and portfolio_ids:
+            shared = self.shared_cache.get_many([self._key(portfolio_id) for portfolio_id in portfolio_ids])
+            stamps = {
+                portfolio_id: shared[self._key(portfolio_id)]
+                for portfolio_id in portfolio_ids if self._key(portfolio_id) in shared
+            }
+        for portfolio_id in portfolio_ids:
+            if portfolio_id not in stamps:
+                stamps[portfolio_id] = self.get(portfolio_id)
+        return stamps
+
+    def bump(self, portfolio_ids: Iterable[int]):
+        """Issue new stamps and notify listeners"""
+        portfolio_ids = set(portfolio_ids)
+        stamps = {}
+        with self._lock:
+            for portfolio_id in portfolio_ids:
+                stamps[portfolio_id] = self._local[portfolio_id] = self._new_stamp()
+        if self.shared_cache.enabled:
+            self.shared_cache.set_many({
+                self._key(portfolio_id): (stamp, VERSION_TTL_SECONDS) for portfolio_id, stamp in stamps.items()
+            })
+        for listener in self._listeners:
+            listener(portfolio_ids)
+
+    def add_listener(self, listener: Callable[[Set[int]], None]):
+        """Call `listener` with the ids of portfolios changed by each commit"""
+        self._listeners.append(listener)
+
+
+class UserVersions(PortfolioVersions):
+    """The same stamps per user, bumped when a committed session updated or deleted that user"""
+
+    def _key(self, user_id: int) -> str:
+        return f"version:user:{user_id}"
+
+
+def _changed_portfolio_id(instance) -> Optional[int]:
+    if isinstance(instance, Portfolio):
+        return instance.id
+    if isinstance(instance, (Position, Transaction)):
+        return instance.portfolio_id
+    return None
+
+
+def _collect_changes(session: Session, flush_context):
+    changed = session.info.setdefault("changed_portfolios", set())
+    changed_users = session.info.setdefault("changed_users", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        portfolio_id = _changed_portfolio_id(instance)
+        if portfolio_id is not None:
+            changed.add(portfolio_id)
+        elif isinstance(instance, User) and instance not in session.new:
+            changed_users.add(instance.id)
+
+
+def _publish_changes(session: Session):
+    changed = session.info.pop("changed_portfolios", None)
+    if changed:
+        portfolio_versions.bump(changed)
+    changed_users = session.info.pop("changed_users", None)
+    if changed_users:
+        user_versions.bump(changed_users)
+
+
+def _discard_changes(session: Session):
+    session.info.pop("changed_portfolios", None)
+    session.info.pop("changed_users", None)
+
+
+# Bulk insert()/update() statements bypass the unit of work; their callers use mark_changed
+event.listen(Session, "after_flush", _collect_changes)
+event.listen(Session, "after_commit", _publish_changes)
+event.listen(Session, "after_rollback", _discard_changes)
+
+
+def mark_changed(db: Session, portfolio_id: int):
+    """Record a write made with a bulk statement, published when `db` commits"""
+    db.info.setdefault("changed_portfolios", set()).add(portfolio_id)
+
+
+# Global instances
+portfolio_versions = PortfolioVersions(market_service.shared_cache)
+user_versions = UserVersions(market_service.shared_cache)
@@ -0,0 +1,138 @@
+"""HTTP load test of the request-path endpoints against a local uvicorn worker
+
+    cd backend && python benchmarks/load_test.py [--clients 50 200] [--requests 10] [--port 8765] [--baseline REF]
+
+Starts one uvicorn worker on a temporary SQLite database with the fake market data
+provider, seeds a user, a portfolio and 50 transactions, then has N concurrent
+clients each send a fixed number of requests per endpoint. Extra settings pass
+through the environment, e.g. DB_POOL_SIZE=5 python benchmarks/load_test.py.
+
+--baseline runs the same load against another git revision, checked out in a
+temporary worktree, after the working tree; e.g. the commit before the move to
+AsyncSession compares the sync get_db request path with the async one.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parents[1]
+TRANSACTIONS = 50
+
+
+async def wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen):
+    for _ in range(150):
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            await client.get("/health")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+async def seed(client: httpx.AsyncClient) -> tuple:
+    account = {"email": "load@example.com", "username": "load", "password": "secret"}
+    response = await client.post("/api/v1/auth/register", json=account)
+    response.raise_for_status()
+    response = await client.post("/api/v1/auth/login", data={"username": "load", "password": "secret"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    portfolio_id = (await client.post("/api/v1/portfolios/", json={"name": "Load"}, headers=headers)).json()["id"]
+    for index in range(TRANSACTIONS):
+        response = await client.post("/api/v1/transactions/", headers=headers, json={
+            "portfolio_id": portfolio_id,
+            "symbol": "AAPL",
+            "company_name": "Apple",
+            "market": "US",
+            "transaction_type": "buy",
+            "quantity": "1",
+            "price": "100",
+            "transaction_date": f"2024-01-{1 + index % 28:02d}T00:00:00",
+        })
+        response.raise_for_status()
+    return headers, portfolio_id
+
+
+async def measure(client: httpx.AsyncClient, path: str, headers: dict, clients: int, requests: int) -> float:
+    async def session(count: int):
+        for _ in range(count):
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+
+    await session(5)  # warm up caches and the pool
+    started = time.perf_counter()
+    await asyncio.gather(*(session(requests) for _ in range(clients)))
+    return clients * requests / (time.perf_counter() - started)
+
+
+async def run(args, tree: str, base_url: str, server: subprocess.Popen):
+    limits = httpx.Limits(max_connections=max(args.clients) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await wait_until_up(client, server)
+        headers, portfolio_id = await seed(client)
+        paths = {
+            "GET /transactions": f"/api/v1/transactions/?portfolio_id={portfolio_id}&limit=20",
+            "GET /portfolios/{id}": f"/api/v1/portfolios/{portfolio_id}",
+            "GET /portfolios": "/api/v1/portfolios/",
+        }
+        for name, path in paths.items():
+            for clients in args.clients:
+                rate = await measure(client, path, headers, clients, args.requests)
+                print(f"{tree:<10} {name:<22} {clients:>7} {rate:>8.0f}", flush=True)
+
+
+def serve(args, tree: str, backend: Path):
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{directory}/load.db",
+            "HISTORY_DB_PATH": f"{directory}/history.db",
+            "HISTORY_PROVIDER": "fixtures",
+            "HISTORY_FIXTURES_DIR": directory,
+            "MARKET_DATA_PROVIDER": "fake",
+            "PRICE_REFRESH_ENABLED": "false",
+            "SNAPSHOT_JOB_ENABLED": "false",
+        }
+        command = [
+            sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning",
+            # Outlast the queueing at high concurrency, so no idle pooled connection is closed under a request
+            "--timeout-keep-alive", "120",
+        ]
+        server = subprocess.Popen(command, cwd=backend, env=env)
+        try:
+            asyncio.run(run(args, tree, f"http://127.0.0.1:{args.port}", server))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--requests", type=int, default=10, help="requests per client and endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--baseline", metavar="REF", help="also load test this git revision")
+    args = parser.parse_args()
+
+    print(f"{'tree':<10} {'endpoint':<22} {'clients':>7} {'req/s':>8}", flush=True)
+    serve(args, "working", BACKEND)
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as directory:
+            checkout = Path(directory) / "baseline"
+            git = ["git", "-C", str(BACKEND), "worktree"]
+            subprocess.run([*git, "add", "--quiet", "--detach", str(checkout), args.baseline], check=True)
+            try:
+                serve(args, args.baseline, checkout / BACKEND.name)
+            finally:
+                subprocess.run([*git, "remove", "--force", str(checkout)], check=True)
+
+
+if __name__ == "__main__":
+    main()
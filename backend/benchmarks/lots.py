@@ -0,0 +1,84 @@
+"""Replay and incremental update cost of lot books on a synthetic 100k-trade ledger
+
+    cd backend && python benchmarks/lots.py [trades]
+
+For each cost basis method, times a full replay of the ledger, then one incremental
+sell the way a new transaction is applied: load the stored book, match, store.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.models import TransactionType  # noqa: E402
+from app.services.lots import CostBasisMethod, LotBook  # noqa: E402
+
+
+def ledger(count: int, seed: int = 7):
+    """Mostly buys with smaller sells, so roughly a tenth of the buys stay open"""
+    rng = random.Random(seed)
+    start = datetime(2000, 1, 3)
+    transactions = []
+    for index in range(count):
+        is_buy = index % 10 < 6
+        quantity = Decimal(rng.randint(10_000, 1_000_000) if is_buy else rng.randint(10_000, 800_000)).scaleb(-4)
+        price = Decimal(rng.randint(1_000, 50_000)).scaleb(-2)
+        transactions.append(SimpleNamespace(
+            id=index + 1,
+            transaction_type=TransactionType.BUY if is_buy else TransactionType.SELL,
+            quantity=quantity,
+            total_amount=(quantity * price).quantize(Decimal("0.01")),
+            transaction_date=start + timedelta(hours=index),
+        ))
+    return transactions
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def replay(method: str, transactions) -> LotBook:
+    book = LotBook(method)
+    for transaction in transactions:
+        book.apply(transaction)
+    return book
+
+
+def main(count: int):
+    transactions = ledger(count)
+    sell = SimpleNamespace(
+        id=count + 1,
+        transaction_type=TransactionType.SELL,
+        quantity=Decimal("150"),
+        total_amount=Decimal("15000.00"),
+        transaction_date=transactions[-1].transaction_date + timedelta(hours=1),
+    )
+
+    print(f"{count} trades")
+    print(f"{'method':>8} {'open lots':>10} {'replay ms':>10} {'stored KiB':>11} {'incremental ms':>15}")
+    for method in CostBasisMethod:
+        book, replay_ms = timed(lambda: replay(method.value, transactions))
+        stored = book.dumps()
+
+        def incremental():
+            updated = LotBook.loads(method.value, stored)
+            updated.apply(sell)
+            return updated.dumps()
+
+        _, incremental_ms = timed(incremental)
+        assert LotBook.loads(method.value, stored).dumps() == stored
+        print(
+            f"{method.value:>8} {len(book.lots):>10} {replay_ms:>10.1f} "
+            f"{len(stored) / 1024:>11.1f} {incremental_ms:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,123 @@
+"""Mixed read/write load on a file SQLite database: rollback journal vs the configured WAL pragmas
+
+    cd backend && python benchmarks/sqlite_concurrency.py [--seconds 5] [--readers 8] [--writers 4]
+
+Each configuration runs in its own process, since settings are read when the app is
+imported. Writers insert one transaction per commit; readers run an indexed
+per-symbol aggregate, like a position replay.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+CONFIGURATIONS = {
+    # SQLite defaults: readers wait while a writer holds the database
+    "rollback": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+    },
+    # The shipped settings
+    "wal": {},
+}
+
+SYMBOLS = 200
+INSERT = (
+    "INSERT INTO transactions (symbol, market, transaction_type, quantity, price, total_amount, "
+    "transaction_date, portfolio_id) VALUES (:symbol, 'US', 'BUY', 1, 1, 1, '2024-01-01', 1)"
+)
+AGGREGATE = (
+    "SELECT symbol, sum(quantity) FROM transactions WHERE portfolio_id = 1 AND symbol = :symbol GROUP BY symbol"
+)
+
+
+def percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    return sorted(samples)[int(len(samples) * fraction)] * 1000
+
+
+def run(name: str, args):
+    sys.path.insert(0, str(BACKEND))
+    from sqlalchemy import text
+
+    from app import models  # noqa: F401  (registers the tables)
+    from app.core.database import Base, engine
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, email, username, hashed_password, is_active) VALUES (1, 'a', 'a', 'x', 1)"
+        ))
+        conn.execute(text("INSERT INTO portfolios (id, name, owner_id, is_default) VALUES (1, 'p', 1, 0)"))
+        conn.execute(text(INSERT), [{"symbol": f"S{index % SYMBOLS}"} for index in range(args.rows)])
+
+    deadline = time.monotonic() + args.seconds
+    latencies = {"reads": [], "writes": []}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(kind: str):
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    if kind == "writes":
+                        conn.execute(text(INSERT), {"symbol": "W"})
+                    else:
+                        conn.execute(text(AGGREGATE), {"symbol": f"S{rng.randrange(SYMBOLS)}"}).all()
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+                continue
+            with lock:
+                latencies[kind].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=("writes",)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=("reads",)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reads, writes = latencies["reads"], latencies["writes"]
+    print(
+        f"{name:>9} {len(reads) / args.seconds:>8.0f} {percentile(reads, 0.99):>11.1f} "
+        f"{len(writes) / args.seconds:>9.0f} {percentile(writes, 0.99):>12.1f} {len(errors):>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20_000, help="transactions loaded before the run")
+    parser.add_argument("--configuration", choices=CONFIGURATIONS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.configuration:
+        run(args.configuration, args)
+        return
+
+    print(f"{'':>9} {'reads/s':>8} {'read p99 ms':>11} {'writes/s':>9} {'write p99 ms':>12} {'errors':>7}", flush=True)
+    for name, overrides in CONFIGURATIONS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, **overrides, "DATABASE_URL": f"sqlite:///{directory}/bench.db"}
+            subprocess.run(
+                [sys.executable, __file__, "--configuration", name, *sys.argv[1:]], env=env, check=True
+            )
+
+
+if __name__ == "__main__":
+    main()
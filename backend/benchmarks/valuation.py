@@ -0,0 +1,63 @@
+"""Compare portfolio totals from the Decimal loop with the int64 valuation kernel
+
+    cd backend && python benchmarks/valuation.py [positions ...]
+
+Times total_holdings over Decimal attributes (the listing path), value_holdings over
+the same Decimals (the kernel plus conversion) and value_positions over prebuilt
+arrays (the kernel alone), and checks all three report the same cents.
+"""
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.valuation import (  # noqa: E402
+    CENTS, PRICE_SCALE, QUANTITY_SCALE, from_cents, to_fixed, total_holdings, value_holdings, value_positions
+)
+
+
+def positions(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    quantities = [Decimal(rng.randint(1, 5_000_000)).scaleb(-4) for _ in range(count)]
+    prices = [Decimal(rng.randint(100, 50_000_000)).scaleb(-4) for _ in range(count)]
+    invested = [Decimal(rng.randint(100, 10 ** 9)).scaleb(-2) for _ in range(count)]
+    return quantities, prices, invested
+
+
+def best_of(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(sizes):
+    print(f"{'positions':>10} {'decimal ms':>11} {'kernel ms':>10} {'arrays ms':>10}")
+    for count in sizes:
+        quantities, prices, invested = positions(count)
+        arrays = (
+            to_fixed(quantities, QUANTITY_SCALE, count),
+            to_fixed(prices, PRICE_SCALE, count),
+            to_fixed(invested, CENTS, count),
+        )
+
+        decimal_total = total_holdings(quantities, prices, invested)[0]
+        kernel_total = from_cents(value_holdings(quantities, prices, invested).total_value[0])
+        arrays_total = from_cents(value_positions(*arrays).total_value[0])
+        assert decimal_total == kernel_total == arrays_total, (decimal_total, kernel_total, arrays_total)
+
+        print(
+            f"{count:>10} "
+            f"{best_of(lambda: total_holdings(quantities, prices, invested)):>11.2f} "
+            f"{best_of(lambda: value_holdings(quantities, prices, invested)):>10.2f} "
+            f"{best_of(lambda: value_positions(*arrays)):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [50, 1_000, 10_000, 200_000])
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import uuid
+
+# Settings are read on first import of the app, so point it at throwaway storage first
+_data_dir = tempfile.mkdtemp(prefix="portfolio-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_data_dir}/app.db",
+    "ASYNC_DATABASE_URL": "",
+    "HISTORY_DB_PATH": f"{_data_dir}/history.db",
+    "HISTORY_PROVIDER": "fixtures",
+    "HISTORY_FIXTURES_DIR": _data_dir,
+    "MARKET_DATA_PROVIDER": "fake",
+    "REDIS_URL": "",
+    "PRICE_REFRESH_ENABLED": "false",
+    "SNAPSHOT_JOB_ENABLED": "false",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Register a fresh user and return its bearer headers"""
+    username = f"user-{uuid.uuid4().hex[:8]}"
+    response = client.post(
+        "/api/v1/auth/register",
+        json={"email": f"{username}@example.com", "username": username, "password": "secret"},
+    )
+    assert response.status_code == 200, response.text
+    token = client.post("/api/v1/auth/login", data={"username": username, "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
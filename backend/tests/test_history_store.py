@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.services.history_store import Bar, HistoryProvider, HistoryStore
+
+
+def daily_bars(first: date, last: date, close: float = 100.0):
+    days = (first + timedelta(days=offset) for offset in range((last - first).days + 1))
+    return [Bar(day.isoformat(), close, close, close, close + index, 1000) for index, day in enumerate(days)]
+
+
+class FlakyProvider(HistoryProvider):
+    """Serves fixed bars, or nothing while `down` like yfinance on a network error"""
+
+    name = "flaky"
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.down = False
+        self.calls = 0
+
+    def fetch_bars(self, symbol, start, end):
+        self.calls += 1
+        if self.down:
+            return []
+        return [
+            bar for bar in self.bars
+            if (start is None or bar.day >= start.isoformat()) and bar.day <= end.isoformat()
+        ]
+
+
+@pytest.fixture
+def provider():
+    today = date.today()
+    return FlakyProvider(daily_bars(today - timedelta(days=90), today))
+
+
+@pytest.fixture
+def store(tmp_path, provider):
+    return HistoryStore(str(tmp_path / "history.db"), provider, refresh_seconds=3600)
+
+
+def test_failed_first_fetch_is_retried(store, provider):
+    provider.down = True
+    assert store.get_series("X", "1mo") is None
+    
+    provider.down = False
+    series = store.get_series("X", "1mo")
+    assert series is not None
+    assert series["dates"][-1] == date.today().isoformat()
+
+
+def test_failed_backfill_does_not_extend_coverage(store, provider):
+    today = date.today()
+    store.ensure_range("X", today - timedelta(days=10))
+    
+    provider.down = True
+    store.ensure_range("X", today - timedelta(days=60))
+    assert store.get_bars("X")[0].day == (today - timedelta(days=10)).isoformat()
+    
+    provider.down = False
+    store.ensure_range("X", today - timedelta(days=60))
+    assert store.get_bars("X")[0].day == (today - timedelta(days=60)).isoformat()
+
+
+def test_failed_trailing_fetch_does_not_extend_coverage(store, provider):
+    today = date.today()
+    store.ensure_range("X", today - timedelta(days=30), today - timedelta(days=5))
+    
+    provider.down = True
+    # Failing backfill and trailing fetches in one call
+    store.ensure_range("X", today - timedelta(days=40))
+    assert store.get_bars("X")[-1].day == (today - timedelta(days=5)).isoformat()
+    
+    provider.down = False
+    store.ensure_range("X", today - timedelta(days=30))
+    assert store.get_bars("X")[-1].day == today.isoformat()
+
+
+def test_covered_range_is_served_from_disk(store, provider):
+    start = date.today() - timedelta(days=30)
+    store.ensure_range("X", start)
+    calls = provider.calls
+    
+    store.ensure_range("X", start)
+    assert provider.calls == calls
+
+
+def test_adjusted_history_is_refetched_whole(store, provider):
+    today = date.today()
+    store.ensure_range("X", today - timedelta(days=30))
+    
+    # A 2-for-1 split: the provider now serves every past close halved
+    provider.bars = [bar._replace(close=bar.close / 2) for bar in provider.bars]
+    store.ensure_range("X", today - timedelta(days=30), today + timedelta(days=1))
+    
+    stored = {bar.day: bar.close for bar in store.get_bars("X")}
+    assert stored == {bar.day: bar.close for bar in provider.bars if bar.day >= min(stored)}
+
+
+def test_recorded_split_rechecks_basis_and_notifies(store, provider):
+    today = date.today()
+    rebased = []
+    store.add_rebase_listener(rebased.append)
+    store.ensure_range("X", today - timedelta(days=30))
+    
+    provider.bars = [bar._replace(close=bar.close / 2) for bar in provider.bars]
+    # Within the refresh window nothing is fetched until a split is recorded
+    store.ensure_range("X", today - timedelta(days=30))
+    assert rebased == []
+    
+    store.expire(["X"])
+    store.ensure_range("X", today - timedelta(days=30))
+    assert rebased == ["X"]
+    assert store.get_bars("X")[0].close == provider.bars[60].close
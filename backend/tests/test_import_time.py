@@ -0,0 +1,34 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous next to the ~1.6 s measured locally, so only a heavy new import fails it
+IMPORT_BUDGET_SECONDS = 3.0
+DEFERRED_MODULES = ("yfinance", "pandas")
+
+PROBE = (
+    "import sys, app.main; "
+    f"print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+)
+
+
+def test_app_import_defers_market_data_libraries():
+    # The environment conftest set up, so the import touches the same throwaway storage
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=Path(__file__).resolve().parents[1],
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == ""
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative = {
+        match.group(2).strip(): int(match.group(1))
+        for match in re.finditer(r"^import time:\s+\d+ \|\s+(\d+) \| (.+)$", result.stderr, re.MULTILINE)
+    }
+    assert cumulative["app.main"] / 1_000_000 < IMPORT_BUDGET_SECONDS
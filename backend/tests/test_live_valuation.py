@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.services.live_valuation import LiveValuationHub, StreamTickets
+from app.services.market_data import market_service
+from app.services.shared_cache import RedisSharedCache, SharedCache
+from app.services.versions import PortfolioVersions
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class NoPrices:
+    def get_prices(self, symbols):
+        return {}
+
+
+def create_portfolio(client, headers) -> int:
+    response = client.post("/api/v1/portfolios/", json={"name": "Live"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_ticket_is_single_use_and_scoped_to_its_portfolio():
+    server = fakeredis.FakeServer()
+    issuer = StreamTickets(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    other_worker = StreamTickets(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+
+    ticket = issuer.issue(7, 1)
+    assert other_worker.redeem(ticket, 1) == 7
+    assert issuer.redeem(ticket, 1) is None
+
+    ticket = issuer.issue(7, 1)
+    assert issuer.redeem(ticket, 2) is None
+    assert issuer.redeem(ticket, 1) is None
+
+
+def test_ticket_without_shared_tier():
+    tickets = StreamTickets(SharedCache())
+
+    ticket = tickets.issue(7, 1)
+    assert tickets.redeem(ticket, 1) == 7
+    assert tickets.redeem(ticket, 1) is None
+
+
+def test_ticket_survives_an_unreachable_shared_tier():
+    server = fakeredis.FakeServer()
+    tickets = StreamTickets(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    server.connected = False
+
+    ticket = tickets.issue(7, 1)
+    assert tickets.redeem(ticket, 1) == 7
+    assert tickets.redeem(ticket, 1) is None
+
+
+def test_stream_rejects_query_tokens_and_foreign_tickets(client, auth_headers):
+    portfolio_id = create_portfolio(client, auth_headers)
+    token = auth_headers["Authorization"].split()[1]
+
+    assert client.get(f"/api/v1/portfolios/{portfolio_id}/stream", params={"token": token}).status_code == 401
+
+    response = client.post(f"/api/v1/portfolios/{portfolio_id}/stream/ticket", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    ticket = response.json()["ticket"]
+    assert client.get(f"/api/v1/portfolios/{portfolio_id + 1}/stream", params={"ticket": ticket}).status_code == 401
+    assert client.get(f"/api/v1/portfolios/{portfolio_id}/stream", params={"ticket": ticket}).status_code == 401
+
+
+def test_ticket_requires_ownership(client, auth_headers):
+    portfolio_id = create_portfolio(client, auth_headers)
+    username = "intruder"
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": f"{username}@example.com", "username": username, "password": "secret"},
+    )
+    token = client.post("/api/v1/auth/login", data={"username": username, "password": "secret"}).json()["access_token"]
+
+    response = client.post(
+        f"/api/v1/portfolios/{portfolio_id}/stream/ticket", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 404
+
+
+def test_hub_sees_writes_from_another_worker():
+    server = fakeredis.FakeServer()
+    versions = PortfolioVersions(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    other_worker = PortfolioVersions(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    hub = LiveValuationHub(market_service, NoPrices(), versions)
+
+    async def run():
+        subscription = await hub.subscribe(424242)
+        # Drive the ticks by hand rather than racing the poller
+        await hub.stop()
+        try:
+            subscription.changed.clear()
+            await hub.tick()
+            assert not subscription.changed.is_set()
+
+            other_worker.bump([424242])
+            await hub.tick()
+            assert subscription.changed.is_set()
+        finally:
+            hub.unsubscribe(subscription)
+
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+import base64
+import struct
+
+from app.services.lots import LOT_FIELDS, CostBasisMethod, LotBook
+
+
+def test_stored_book_is_little_endian_int64():
+    book = LotBook(CostBasisMethod.FIFO.value, [(10_000, 1_500_000, 738_000, 3)], realized=-5, dividends=7)
+
+    raw = base64.b64decode(book.dumps())
+
+    assert struct.unpack(f"<{2 + LOT_FIELDS}q", raw) == (-5, 7, 10_000, 1_500_000, 738_000, 3)
+
+
+def test_stored_book_round_trips():
+    book = LotBook(CostBasisMethod.LIFO.value)
+    book.buy(20_000, 3_000_000, 738_000, 1)
+    book.buy(10_000, 2_000_000, 738_001, 2)
+    book.sell(15_000, 4_000_000)
+
+    loaded = LotBook.loads(book.method.value, book.dumps())
+
+    assert list(loaded.lots) == list(book.lots)
+    assert (loaded.quantity, loaded.cost, loaded.realized) == (book.quantity, book.cost, book.realized)
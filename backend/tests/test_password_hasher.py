@@ -0,0 +1,18 @@
+import asyncio
+
+from app.core.security import PasswordHasher
+
+
+def test_pool_does_not_fork_the_app_and_hashes():
+    hasher = PasswordHasher(max_workers=2, max_queue=4)
+    try:
+        hasher.start()
+        assert hasher._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+        
+        async def round_trip():
+            hashed = await hasher.hash("secret")
+            return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+        
+        assert asyncio.run(round_trip()) == (True, False)
+    finally:
+        hasher.shutdown()
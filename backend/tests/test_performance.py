@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.models import TransactionType
+from app.services.corporate_actions import SplitFactors
+from app.services.performance import compute_performance
+
+DAYS = [date(2026, 1, 5) + timedelta(days=offset) for offset in range(8)]
+# Unadjusted closes; AAA splits 2:1 on the fifth day
+RAW_CLOSES = {
+    "AAA": [100.0, 104.0, 97.0, 99.0, 50.0, 48.5, 52.0, 53.0],
+    "BBB": [20.0, 20.5, 21.0, 19.0, 19.5, 20.0, 18.0, 18.5],
+}
+SPLITS = {"AAA": [(DAYS[4], 2)]}
+
+
+def trade(symbol, transaction_type, quantity, amount, day):
+    return SimpleNamespace(
+        symbol=symbol, transaction_type=transaction_type, quantity=Decimal(quantity),
+        total_amount=Decimal(amount), transaction_date=datetime.combine(DAYS[day], datetime.min.time()),
+    )
+
+
+TRANSACTIONS = [
+    trade("AAA", TransactionType.BUY, 10, 1000, 0),
+    trade("BBB", TransactionType.BUY, 50, 1025, 1),
+    trade("AAA", TransactionType.BUY, 5, 485, 2),
+    trade("BBB", TransactionType.DIVIDEND, 0, 12, 3),
+    trade("AAA", TransactionType.SPLIT, 2, 0, 4),
+    trade("AAA", TransactionType.SELL, 10, 485, 5),
+    trade("BBB", TransactionType.SELL, 20, 360, 6),
+]
+
+
+def per_day_loop():
+    """The straightforward replay the engine replaced: unadjusted closes, shares multiplied on the split day"""
+    holdings = {symbol: 0.0 for symbol in RAW_CLOSES}
+    values, flows = [], []
+    for index, day in enumerate(DAYS):
+        for symbol, splits in SPLITS.items():
+            for split_day, ratio in splits:
+                if split_day == day:
+                    holdings[symbol] *= ratio
+        flow = 0.0
+        for transaction in TRANSACTIONS:
+            if transaction.transaction_date.date() != day:
+                continue
+            sign = {TransactionType.BUY: 1, TransactionType.SELL: -1}.get(transaction.transaction_type)
+            if sign is None:
+                continue
+            holdings[transaction.symbol] += sign * float(transaction.quantity)
+            flow += sign * float(transaction.total_amount)
+        values.append(sum(holdings[symbol] * RAW_CLOSES[symbol][index] for symbol in holdings))
+        flows.append(flow)
+
+    returns, growth, previous = [], 1.0, values[0] - flows[0]
+    for value, flow in zip(values, flows):
+        if previous > 0:
+            growth *= (value - flow) / previous
+        returns.append((growth - 1) * 100)
+        previous = value
+    return values, returns
+
+
+def max_drawdown(returns):
+    growth = 1 + np.array(returns) / 100
+    return float(np.max(1 - growth / np.maximum.accumulate(growth)))
+
+
+def test_engine_matches_the_per_day_loop():
+    symbols = sorted(RAW_CLOSES)
+    factors = {
+        symbol: SplitFactors([(day, Decimal(ratio)) for day, ratio in splits]) for symbol, splits in SPLITS.items()
+    }
+    # The engine reads split-adjusted closes, as the history store serves them
+    adjusted = {
+        symbol: [close / float(factors[symbol].factor(day)) if symbol in factors else close
+                 for day, close in zip(DAYS, raw)]
+        for symbol, raw in RAW_CLOSES.items()
+    }
+    closes = np.array([adjusted[symbol] for symbol in symbols]).T
+
+    result = compute_performance(np.array(DAYS, dtype="datetime64[D]"), symbols, TRANSACTIONS, closes, factors)
+    values, returns = per_day_loop()
+
+    assert result["values"] == pytest.approx(values, abs=0.01)
+    assert result["returns"] == pytest.approx(returns, abs=1e-4)
+    assert max_drawdown(result["returns"]) == pytest.approx(max_drawdown(returns), abs=1e-6)
+    assert max_drawdown(returns) > 0
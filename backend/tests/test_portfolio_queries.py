@@ -0,0 +1,61 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import async_engine, engine
+from app.services.market_data import market_service
+
+
+@contextmanager
+def count_statements():
+    statements = []
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in (engine, async_engine.sync_engine):
+            event.remove(target, "before_cursor_execute", record)
+
+
+def create_portfolios(client, headers, count):
+    # Symbols unique to this run, so no earlier test has them cached
+    tag = uuid.uuid4().hex[:4].upper()
+    shared = f"S{tag}"
+    for index in range(count):
+        portfolio_id = client.post("/api/v1/portfolios/", json={"name": f"P{index}"}, headers=headers).json()["id"]
+        for symbol in (shared, f"X{tag}{index}"):
+            response = client.post("/api/v1/transactions/", headers=headers, json={
+                "portfolio_id": portfolio_id, "symbol": symbol, "company_name": symbol, "market": "US",
+                "transaction_type": "buy", "quantity": "2", "price": "10",
+                "transaction_date": "2024-01-02T00:00:00",
+            })
+            assert response.status_code == 200, response.text
+    return {shared, *(f"X{tag}{index}" for index in range(count))}
+
+
+@pytest.mark.parametrize("count", [1, 3, 10])
+def test_list_portfolios_query_and_quote_counts(client, auth_headers, count):
+    symbols = create_portfolios(client, auth_headers, count)
+    # Warm the principal cache so only the listing itself is counted
+    client.get("/api/v1/auth/me", headers=auth_headers)
+    provider = market_service.provider
+    calls, requested = provider.calls, provider.symbols_requested
+    
+    with count_statements() as statements:
+        response = client.get("/api/v1/portfolios/", headers=auth_headers)
+    
+    assert response.status_code == 200
+    assert len(response.json()) == count
+    assert all(portfolio["positions_count"] == 2 for portfolio in response.json())
+    # Portfolios, then every portfolio's positions in one selectin query
+    assert len(statements) == 2, statements
+    # The union of symbols is priced in a single upstream call
+    assert provider.calls - calls == 1
+    assert provider.symbols_requested - requested == len(symbols)
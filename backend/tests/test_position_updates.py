@@ -0,0 +1,96 @@
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import Position, PositionLotState, Transaction, TransactionType
+from app.services.lots import LotBook
+from app.services.portfolio_calculator import PortfolioCalculatorService
+
+
+def memory_sessions():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def trade(db, transaction_type, quantity, price, day):
+    transaction = Transaction(
+        portfolio_id=1, symbol="X", market="US", transaction_type=transaction_type,
+        quantity=Decimal(quantity), price=Decimal(price), total_amount=Decimal(quantity * price),
+        transaction_date=datetime(2026, 1, day),
+    )
+    db.add(transaction)
+    db.commit()
+    return transaction
+
+
+def interleave(monkeypatch, calculator, step):
+    """Run `step` after the next apply_new_transaction has loaded the lot state, before it saves"""
+    apply = calculator._apply
+
+    def interleaved(book, transaction):
+        monkeypatch.setattr(calculator, "_apply", apply)
+        step()
+        apply(book, transaction)
+
+    monkeypatch.setattr(calculator, "_apply", interleaved)
+
+
+def test_concurrent_buys_are_not_lost(monkeypatch):
+    Session = memory_sessions()
+    calculator = PortfolioCalculatorService()
+    first, second = Session(), Session()
+    calculator.apply_new_transaction(first, trade(first, TransactionType.BUY, 1, 10, 5))
+
+    interleave(monkeypatch, calculator, lambda: calculator.apply_new_transaction(
+        first, trade(first, TransactionType.BUY, 2, 10, 6)
+    ))
+    calculator.apply_new_transaction(second, trade(second, TransactionType.BUY, 3, 10, 7))
+    assert first.query(Position.quantity).scalar() == 6
+
+    calculator.apply_new_transaction(first, trade(first, TransactionType.BUY, 1, 10, 8))
+    assert first.query(Position.quantity).scalar() == 7
+
+
+def assert_lots_match_replay(db, calculator):
+    transactions = db.query(Transaction).order_by(Transaction.transaction_date, Transaction.id).all()
+    replayed = calculator.replay_lots(transactions)
+    stored = LotBook.loads(replayed.method.value, db.query(PositionLotState.book).scalar())
+    
+    assert list(stored.lots) == list(replayed.lots)
+    assert stored.realized_pnl == replayed.realized_pnl
+
+
+def test_concurrent_sells_keep_lots_and_realized_pnl(monkeypatch):
+    Session = memory_sessions()
+    calculator = PortfolioCalculatorService()
+    first, second = Session(), Session()
+    calculator.apply_new_transaction(first, trade(first, TransactionType.BUY, 10, 10, 5))
+    calculator.apply_new_transaction(first, trade(first, TransactionType.BUY, 10, 12, 6))
+    
+    interleave(monkeypatch, calculator, lambda: calculator.apply_new_transaction(
+        first, trade(first, TransactionType.SELL, 4, 15, 7)
+    ))
+    calculator.apply_new_transaction(second, trade(second, TransactionType.SELL, 8, 20, 8))
+    
+    assert first.query(Position.quantity).scalar() == 8
+    assert_lots_match_replay(first, calculator)
+
+
+def test_concurrent_first_trades_share_one_lot_state(monkeypatch):
+    Session = memory_sessions()
+    calculator = PortfolioCalculatorService()
+    first, second = Session(), Session()
+    
+    interleave(monkeypatch, calculator, lambda: calculator.apply_new_transaction(
+        first, trade(first, TransactionType.BUY, 2, 10, 5)
+    ))
+    calculator.apply_new_transaction(second, trade(second, TransactionType.BUY, 3, 12, 6))
+    
+    assert first.query(PositionLotState).count() == 1
+    assert first.query(Position.quantity).all() == [(5,)]
+    assert_lots_match_replay(first, calculator)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from sqlalchemy import inspect, update
+
+from app.api.deps import authenticate_token, principal_cache
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.models import User
+from app.services.shared_cache import RedisSharedCache
+from app.services.versions import UserVersions, user_versions
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def deactivate(user_id: int):
+    # A bulk statement, like a commit in another worker: no ORM hooks fire in this process
+    with SessionLocal() as db:
+        db.execute(update(User).where(User.id == user_id).values(is_active=False))
+        db.commit()
+
+
+def test_principal_is_detached_on_miss_and_hit(client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    
+    async def authenticate_twice():
+        async with AsyncSessionLocal() as db:
+            return await authenticate_token(db, token), await authenticate_token(db, token)
+    
+    for user in asyncio.run(authenticate_twice()):
+        assert inspect(user).session is None
+
+
+def test_update_in_this_worker_drops_cached_principal(client, auth_headers):
+    user_id = client.get("/api/v1/auth/me", headers=auth_headers).json()["id"]
+    
+    with SessionLocal() as db:
+        db.get(User, user_id).is_active = False
+        db.commit()
+    
+    assert client.get("/api/v1/auth/me", headers=auth_headers).status_code == 400
+
+
+def test_deactivation_in_another_worker_drops_cached_principal(client, auth_headers, monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(user_versions, "shared_cache", RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    other_worker = UserVersions(RedisSharedCache(fakeredis.FakeRedis(server=server)))
+    user_id = client.get("/api/v1/auth/me", headers=auth_headers).json()["id"]
+    assert client.get("/api/v1/auth/me", headers=auth_headers).status_code == 200
+    
+    deactivate(user_id)
+    other_worker.bump([user_id])
+    
+    assert client.get("/api/v1/auth/me", headers=auth_headers).status_code == 400
+
+
+def test_update_committed_during_lookup_is_not_cached(client, auth_headers, monkeypatch):
+    token = auth_headers["Authorization"].split()[1]
+    user_id = client.get("/api/v1/auth/me", headers=auth_headers).json()["id"]
+    principal_cache.invalidate(token)
+    
+    async def authenticate_racing_update():
+        async with AsyncSessionLocal() as db:
+            execute = db.execute
+            
+            async def racing_execute(*args, **kwargs):
+                # The users row is read, then another request commits a deactivation
+                result = await execute(*args, **kwargs)
+                deactivate(user_id)
+                user_versions.bump([user_id])
+                return result
+            
+            monkeypatch.setattr(db, "execute", racing_execute)
+            return await authenticate_token(db, token)
+    
+    assert asyncio.run(authenticate_racing_update()).is_active
+    assert client.get("/api/v1/auth/me", headers=auth_headers).status_code == 400
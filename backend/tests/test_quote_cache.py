@@ -0,0 +1,30 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.market_data import MarketDataService
+from app.services.quote_providers import FakeQuoteProvider
+from app.services.shared_cache import SharedCache
+
+CALLERS = 16
+
+
+def test_concurrent_misses_make_one_provider_call():
+    # Slow enough that every caller misses while the first fetch is still in flight
+    provider = FakeQuoteProvider(latency=0.3)
+    service = MarketDataService(provider=provider, shared_cache=SharedCache())
+    barrier = threading.Barrier(CALLERS)
+
+    def price():
+        barrier.wait()
+        return service.get_current_prices(["AAPL"])["AAPL"]
+
+    try:
+        with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+            prices = list(pool.map(lambda _: price(), range(CALLERS)))
+    finally:
+        service.shutdown()
+
+    assert provider.calls == 1
+    assert provider.symbols_requested == 1
+    assert len(set(prices)) == 1 and prices[0] is not None
+    assert service.cache.stats()["coalesced"] == CALLERS - 1
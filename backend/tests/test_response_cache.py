@@ -0,0 +1,42 @@
+import pytest
+
+from app.core.config import settings
+from app.services.response_cache import portfolio_response_cache
+
+
+def buy(client, headers, portfolio_id, quantity):
+    response = client.post("/api/v1/transactions/", headers=headers, json={
+        "portfolio_id": portfolio_id, "symbol": "AAPL", "company_name": "Apple", "market": "US",
+        "transaction_type": "buy", "quantity": quantity, "price": "100",
+        "transaction_date": "2024-02-01T00:00:00",
+    })
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("resource", ["", "/positions/valuation"])
+def test_if_none_match_and_writes(client, auth_headers, monkeypatch, resource):
+    # Keep the price part of the ETag from rolling over mid-test
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_MAX_AGE_SECONDS", 10 ** 9)
+    portfolio_id = client.post("/api/v1/portfolios/", json={"name": "ETag"}, headers=auth_headers).json()["id"]
+    buy(client, auth_headers, portfolio_id, "1")
+    path = f"/api/v1/portfolios/{portfolio_id}{resource}"
+
+    first = client.get(path, headers=auth_headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+
+    # From the response cache, then with it cold
+    for cached in (True, False):
+        if not cached:
+            portfolio_response_cache.cache.clear()
+        not_modified = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+
+    buy(client, auth_headers, portfolio_id, "2")
+
+    changed = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.content != first.content
@@ -0,0 +1,116 @@
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+
+from app.core.config import settings
+from app.services.market_data import market_service
+from app.services.shared_cache import RedisSharedCache, decode_value, encode_value
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def cache(server):
+    return RedisSharedCache(fakeredis.FakeRedis(server=server), prefix="test:")
+
+
+@pytest.mark.parametrize("value", [
+    Decimal("123.4500"),
+    {"AAPL": "190.12", "names": ["Apple Inc."]},
+    ["x" * 2000],  # Above the compression threshold
+])
+def test_encode_decode_round_trip(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_large_values_are_compressed():
+    assert encode_value(["x" * 2000]).startswith(b"z")
+
+
+def test_set_many_get_many_round_trip(cache):
+    cache.set_many({"price:AAPL": (Decimal("190.12"), 60), "name:AAPL": ("Apple Inc.", 60)})
+    
+    assert cache.get_many(["price:AAPL", "name:AAPL", "price:MSFT"]) == {
+        "price:AAPL": Decimal("190.12"),
+        "name:AAPL": "Apple Inc.",
+    }
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_keys_are_prefixed_with_ttl(cache, server):
+    cache.set("price:AAPL", Decimal("1"), 60)
+    
+    client = fakeredis.FakeRedis(server=server)
+    assert client.exists("test:price:AAPL")
+    assert 0 < client.ttl("test:price:AAPL") <= 60
+
+
+def test_lock_contention(cache, server):
+    other = RedisSharedCache(fakeredis.FakeRedis(server=server), prefix="test:")
+    
+    assert cache.acquire_lock("quote:AAPL", ttl=5)
+    assert not other.acquire_lock("quote:AAPL", ttl=5)
+    
+    cache.release_lock("quote:AAPL")
+    assert other.acquire_lock("quote:AAPL", ttl=5)
+
+
+def test_release_keeps_a_lock_taken_after_expiry(cache, server):
+    other = RedisSharedCache(fakeredis.FakeRedis(server=server), prefix="test:")
+    assert cache.acquire_lock("quote:AAPL", ttl=5)
+    # Our lock expired and another worker claimed the key
+    fakeredis.FakeRedis(server=server).delete("test:lock:quote:AAPL")
+    assert other.acquire_lock("quote:AAPL", ttl=5)
+    
+    cache.release_lock("quote:AAPL")
+    
+    assert cache.held_locks(["quote:AAPL"]) == {"quote:AAPL"}
+    other.release_lock("quote:AAPL")
+    assert cache.held_locks(["quote:AAPL"]) == set()
+
+
+def test_waiters_stop_when_the_owner_caches_nothing(server, monkeypatch):
+    owner = RedisSharedCache(fakeredis.FakeRedis(server=server), prefix="test:")
+    waiter = RedisSharedCache(fakeredis.FakeRedis(server=server), prefix="test:")
+    monkeypatch.setattr(market_service, "shared_cache", waiter)
+    monkeypatch.setattr(settings, "SHARED_CACHE_LOCK_SECONDS", 30.0)
+    assert owner.acquire_lock("quote:NONE", ttl=30)
+    # The owner's upstream fetch returns nothing, so it releases without storing a value
+    threading.Timer(0.2, owner.release_lock, args=("quote:NONE",)).start()
+    
+    started = time.monotonic()
+    values = market_service._shared_fetch_many("quote", ["NONE"], lambda symbols: {"NONE": None}, lambda symbol: 60)
+    
+    assert values == {"NONE": None}
+    assert time.monotonic() - started < 5
+
+
+def test_falls_back_while_redis_is_down(cache, server):
+    cache.set("price:AAPL", Decimal("1"), 60)
+    server.connected = False
+    
+    assert cache.get_many(["price:AAPL"]) == {}
+    assert cache.stats()["available"] is False
+    assert cache.stats()["errors"] == 1
+    # Writes are dropped and locks granted so callers fetch upstream themselves
+    cache.set("price:MSFT", Decimal("2"), 60)
+    assert cache.acquire_lock("quote:AAPL", ttl=5)
+
+
+def test_retries_after_backoff(cache, server):
+    server.connected = False
+    cache.get_many(["price:AAPL"])
+    server.connected = True
+    
+    assert cache.get_many(["price:AAPL"]) == {}
+    cache._down_until = 0.0
+    cache.set("price:AAPL", Decimal("1"), 60)
+    assert cache.get_many(["price:AAPL"]) == {"price:AAPL": Decimal("1")}
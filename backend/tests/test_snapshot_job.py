@@ -0,0 +1,69 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import PortfolioDailySnapshot, SnapshotJobRun, Transaction, TransactionType
+from app.services import snapshots
+from app.services.snapshots import SnapshotService, market_close_day
+
+
+def memory_sessions():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def test_only_one_worker_claims_a_day():
+    Session = memory_sessions()
+    service = SnapshotService()
+    
+    first, second = Session(), Session()
+    assert service.claim_run(first, date(2026, 1, 5))
+    assert not service.claim_run(second, date(2026, 1, 5))
+    assert service.claim_run(second, date(2026, 1, 6))
+    assert second.query(SnapshotJobRun).count() == 2
+
+
+def test_rebased_symbol_restates_portfolios_from_first_trade(monkeypatch):
+    Session = memory_sessions()
+    monkeypatch.setattr(snapshots, "SessionLocal", Session)
+    db = Session()
+    for portfolio_id, symbol, traded_at in ((1, "X", datetime(2026, 1, 7)), (2, "Y", datetime(2026, 1, 5))):
+        db.add(Transaction(
+            portfolio_id=portfolio_id, symbol=symbol, market="US", transaction_type=TransactionType.BUY,
+            quantity=Decimal(1), price=Decimal(10), total_amount=Decimal(10), transaction_date=traded_at,
+        ))
+        for snapshot_day in (5, 6, 7, 8):
+            db.add(PortfolioDailySnapshot(portfolio_id=portfolio_id, snapshot_date=date(2026, 1, snapshot_day)))
+    db.commit()
+    
+    SnapshotService().restate_symbol("X")
+    
+    dirty = db.query(PortfolioDailySnapshot.portfolio_id, PortfolioDailySnapshot.snapshot_date).filter(
+        PortfolioDailySnapshot.is_dirty.is_(True)
+    ).order_by(PortfolioDailySnapshot.snapshot_date).all()
+    assert dirty == [(1, date(2026, 1, 7)), (1, date(2026, 1, 8))]
+
+
+def test_run_day_follows_the_market_close():
+    # 02:00 UTC is still the previous evening in New York
+    assert market_close_day(datetime(2026, 1, 6, 2, tzinfo=timezone.utc)) == date(2026, 1, 5)
+    # Before the close the latest close is the previous day's
+    assert market_close_day(datetime(2026, 1, 6, 15, tzinfo=timezone.utc)) == date(2026, 1, 5)
+    assert market_close_day(datetime(2026, 1, 6, 22, tzinfo=timezone.utc)) == date(2026, 1, 6)
+
+
+def test_scheduled_run_refreshes_up_to_its_run_date(monkeypatch):
+    Session = memory_sessions()
+    monkeypatch.setattr(snapshots, "SessionLocal", Session)
+    service = SnapshotService()
+    days = []
+    monkeypatch.setattr(service, "run_end_of_day", lambda today=None: days.append(today) or {})
+    
+    service.run_scheduled(date(2026, 1, 5))
+    
+    assert days == [date(2026, 1, 5)]
@@ -0,0 +1,29 @@
+from app.services.symbol_search import SymbolSearchIndex
+
+ENTRIES = [
+    ("PETR4.SA", "Petrobras PN", "BR"),
+    ("BRFS3.SA", "BRF Brasil Foods", "BR"),
+    ("BRASX", "Unrelated Holdings", "BR"),
+    ("VALE3.SA", "Vale", "BR"),
+    ("BRAS", "Bras Exact", "BR"),
+    ("BRAS3.SA", "Another Holdings", "BR"),
+    ("BSBR", "Banco Santander Brasil", "US"),
+]
+
+
+def test_exact_then_prefix_then_substring():
+    index = SymbolSearchIndex(ENTRIES)
+
+    assert index.search("BR", "bras") == [
+        "BRAS",  # exact ticker
+        "BRASX", "BRAS3.SA",  # ticker prefix, shorter first
+        "BRFS3.SA",  # name word prefix ("Brasil")
+        "PETR4.SA",  # name substring ("Petrobras")
+    ]
+
+
+def test_search_stays_in_its_market_and_respects_limit():
+    index = SymbolSearchIndex(ENTRIES)
+
+    assert index.search("US", "bras") == ["BSBR"]
+    assert index.search("BR", "bras", limit=2) == ["BRAS", "BRASX"]
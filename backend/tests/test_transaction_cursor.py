@@ -0,0 +1,61 @@
+import base64
+import json
+
+
+def create_transactions(client, headers, count):
+    portfolio_id = client.post("/api/v1/portfolios/", json={"name": "Paging"}, headers=headers).json()["id"]
+    for index in range(count):
+        response = client.post("/api/v1/transactions/", headers=headers, json={
+            "portfolio_id": portfolio_id, "symbol": "AAPL", "company_name": "Apple", "market": "US",
+            "transaction_type": "buy", "quantity": "1", "price": str(100 + index),
+            # Every row shares one timestamp, so only the id orders them
+            "transaction_date": "2024-03-01T00:00:00",
+        })
+        assert response.status_code == 200, response.text
+    return portfolio_id
+
+
+def test_cursor_pages_through_equal_timestamps(client, auth_headers):
+    portfolio_id = create_transactions(client, auth_headers, 7)
+
+    pages, cursor = [], None
+    while True:
+        params = {"portfolio_id": portfolio_id, "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/transactions/", params=params, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        pages.append([transaction["id"] for transaction in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    everything = client.get(
+        "/api/v1/transactions/", params={"portfolio_id": portfolio_id}, headers=auth_headers
+    ).json()
+    assert [len(page) for page in pages] == [3, 3, 1]
+    # No duplicates or gaps, newest id first
+    assert [row_id for page in pages for row_id in page] == [transaction["id"] for transaction in everything]
+    assert [transaction["id"] for transaction in everything] == sorted(
+        (transaction["id"] for transaction in everything), reverse=True
+    )
+
+
+def test_bad_or_tampered_cursor_is_rejected(client, auth_headers):
+    portfolio_id = create_transactions(client, auth_headers, 2)
+    params = {"portfolio_id": portfolio_id, "limit": 1}
+    cursor = client.get("/api/v1/transactions/", params=params, headers=auth_headers).headers["X-Next-Cursor"]
+
+    data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    signature, (transaction_date, transaction_id) = data[:16], json.loads(data[16:])
+    tampered = base64.urlsafe_b64encode(
+        signature + json.dumps([transaction_date, transaction_id + 1]).encode()
+    ).decode()
+    unsigned = base64.urlsafe_b64encode(json.dumps([transaction_date, transaction_id]).encode()).decode()
+
+    for bad in ("not-a-cursor", tampered, unsigned, cursor[:-2]):
+        response = client.get(
+            "/api/v1/transactions/", params={**params, "cursor": bad}, headers=auth_headers
+        )
+        assert response.status_code == 400, bad
+    assert client.get(
+        "/api/v1/transactions/", params={**params, "cursor": cursor}, headers=auth_headers
+    ).status_code == 200
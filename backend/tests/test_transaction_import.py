@@ -0,0 +1,70 @@
+import io
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.models import Transaction
+from app.services import corporate_actions
+from app.services.market_data import market_service
+from app.services.transaction_import import TransactionImporter
+
+CSV = b"""date,symbol,type,quantity,price,fees,name
+2024-04-01,AAPL,buy,2,101,1,
+2024-04-02,MSFT,buy,1,300,0,
+2024-04-03,PETR4.SA,buy,10,30,0,Petrobras
+2024-04-04,NOPE,buy,1,1,0,
+2024-04-05,aapl,sell,1,120,0,
+"""
+
+
+def test_company_names_are_resolved_before_any_insert(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    events = []
+    
+    def get_company_name(symbol):
+        events.append(("lookup", symbol))
+        return None if symbol == "NOPE" else f"{symbol} Inc."
+    
+    execute = db.execute
+    
+    def tracked_execute(statement, *args, **kwargs):
+        if statement.is_insert:
+            events.append(("insert", None))
+        return execute(statement, *args, **kwargs)
+    
+    monkeypatch.setattr(market_service, "get_company_name", get_company_name)
+    monkeypatch.setattr(db, "execute", tracked_execute)
+    
+    report = TransactionImporter(chunk_size=2).import_file(db, 1, io.BytesIO(CSV), "csv")
+    
+    assert report["imported"] == 4
+    assert report["errors"] == [{"row": 5, "error": "Invalid symbol: NOPE"}]
+    kinds = [kind for kind, _ in events]
+    assert kinds.index("insert") > max(index for index, kind in enumerate(kinds) if kind == "lookup")
+    # One lookup per distinct symbol without a name
+    assert sorted(symbol for kind, symbol in events if kind == "lookup") == ["AAPL", "MSFT", "NOPE"]
+    assert db.query(Transaction).filter(Transaction.symbol == "AAPL").first().company_name == "AAPL Inc."
+
+
+def test_only_split_symbols_are_invalidated(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    invalidated = []
+    
+    monkeypatch.setattr(market_service, "get_company_name", lambda symbol: symbol)
+    monkeypatch.setattr(corporate_actions.corporate_actions, "invalidate", invalidated.append)
+    
+    report = TransactionImporter().import_file(db, 1, io.BytesIO(
+        b"date,symbol,type,quantity,price,fees,name\n"
+        b"2024-04-01,AAPL,buy,2,101,0,\n"
+        b"2024-04-02,MSFT,buy,1,300,0,\n"
+        b"2024-04-03,AAPL,split,4,0,0,\n"
+    ), "csv")
+    
+    assert report["imported"] == 3
+    assert invalidated == [{(1, "AAPL")}]
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from app.services.live_valuation import LiveSubscription, live_valuation_hub
+from app.services.portfolio_calculator import portfolio_calculator
+from app.services.valuation import total_holdings
+
+
+def position(symbol: str, quantity: str, invested: str):
+    return SimpleNamespace(
+        symbol=symbol,
+        company_name=None,
+        market="US",
+        quantity=Decimal(quantity),
+        average_price=Decimal(invested) / Decimal(quantity),
+        total_invested=Decimal(invested),
+    )
+
+
+PORTFOLIO = SimpleNamespace(id=1, positions=[position("AAA", "10", "1000.00"), position("BBB", "5", "500.00")])
+PRICES = {"AAA": Decimal("120.00"), "BBB": None}
+
+
+def test_unpriced_position_has_no_value_pnl_or_weight():
+    valuation = portfolio_calculator.calculate_positions_valuation(PORTFOLIO, PRICES)
+    priced, unpriced = valuation.positions
+
+    assert (unpriced.current_value, unpriced.pnl, unpriced.pnl_percentage, unpriced.weight) == (None,) * 4
+    assert priced.current_value == Decimal("1200.00")
+    assert priced.weight == Decimal("100")
+    assert valuation.total_value == Decimal("1200.00")
+    assert valuation.total_invested == Decimal("1500.00")
+    assert valuation.total_pnl == Decimal("200.00")
+    assert valuation.total_pnl_percentage == Decimal("20")
+
+
+def test_listing_totals_match_the_kernel():
+    valuation = portfolio_calculator.calculate_positions_valuation(PORTFOLIO, PRICES)
+    totals = total_holdings(
+        [holding.quantity for holding in PORTFOLIO.positions],
+        [PRICES[holding.symbol] for holding in PORTFOLIO.positions],
+        [holding.total_invested for holding in PORTFOLIO.positions],
+    )
+
+    assert totals == (
+        valuation.total_value, valuation.total_invested, valuation.total_pnl, valuation.total_pnl_percentage
+    )
+
+
+def test_stream_reports_unpriced_position_as_unknown(monkeypatch):
+    subscription = LiveSubscription.__new__(LiveSubscription)
+    subscription.portfolio_id = 1
+    subscription.positions = {
+        holding.symbol: (holding.quantity, holding.total_invested) for holding in PORTFOLIO.positions
+    }
+    monkeypatch.setattr(live_valuation_hub, "_prices", dict(PRICES))
+
+    valuation = live_valuation_hub.valuation(subscription)
+
+    unpriced = valuation["positions"]["BBB"]
+    assert [unpriced[key] for key in ("current_value", "pnl", "pnl_percentage", "weight")] == [None] * 4
+    assert valuation["positions"]["AAA"]["weight"] == "100.0000"
+    assert valuation["total_pnl"] == "200.00"